@@ -0,0 +1,245 @@
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import metrics
+
+# Threads for handlers that may block (process scans, screenshots); callers wait up to the action's timeout
+ACTION_WORKERS = int(os.getenv('ASSISTANT_ACTION_WORKERS', '4'))
+DEFAULT_TIMEOUT = 10.0
+# Not an action: the command parsers use it for "answer this with the model"
+GENERAL_QUERY = 'general_query'
+
+
+class Param:
+    """One action parameter: missing values take `default`, values outside `choices` too"""
+
+    def __init__(self, name, default='', choices=None):
+        self.name = name
+        self.default = default
+        self.choices = tuple(choices) if choices else None
+
+    def coerce(self, value):
+        if value is None:
+            return self.default
+        value = str(value).strip()
+        if self.choices and value.lower() not in self.choices:
+            return self.default
+        return value.lower() if self.choices else value
+
+    def describe(self):
+        if self.choices:
+            return f"{self.name} = {', '.join(self.choices[:-1])} or {self.choices[-1]}"
+        return self.name
+
+
+class Action:
+    """How to run one action: handler, parameter schema, confirmation policy and timeout
+
+    `handler` is a callable or a string resolved on first use: 'controller.<method>'
+    for a SystemController method, or 'module:function' for anything else, so
+    registering an action never imports what it needs. Handlers get the
+    parameters as keyword arguments and return the text to show and speak.
+    Asynchronous handlers run on the action pool and the caller waits at most
+    `timeout` seconds for them.
+    """
+
+    def __init__(self, name, handler, params=(), confirm=False, asynchronous=False,
+                 timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.params = tuple(params)
+        self.confirm = confirm
+        self.asynchronous = asynchronous
+        self.timeout = timeout
+        self._spec = handler
+        self._handler = handler if callable(handler) else None
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+
+    @property
+    def handler(self):
+        if self._handler is None:
+            self._handler = _resolve(self._spec)
+        return self._handler
+
+    def bind(self, parameters):
+        """Keyword arguments for the handler, validated against the schema"""
+        parameters = parameters or {}
+        return {param.name: param.coerce(parameters.get(param.name)) for param in self.params}
+
+    def get_stats(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'avg_ms': round(self.total_ms / self.calls, 1) if self.calls else None,
+            'loaded': self._handler is not None,
+        }
+
+
+def _resolve(spec):
+    if spec.startswith('controller.'):
+        return getattr(get_controller(), spec[len('controller.'):])
+    module, _, attribute = spec.partition(':')
+    return getattr(importlib.import_module(module), attribute)
+
+
+class ActionRegistry:
+    """Action name -> descriptor, shared by every entry point"""
+
+    def __init__(self, workers=ACTION_WORKERS):
+        self._actions = {}
+        self._lock = threading.Lock()
+        self._workers = workers
+        self._pool = None
+
+    def register(self, name, handler, params=(), confirm=False, asynchronous=False, timeout=DEFAULT_TIMEOUT):
+        """Add (or replace) an action; returns its descriptor"""
+        action = Action(name, handler, params, confirm, asynchronous, timeout)
+        self._actions[name] = action
+        return action
+
+    def get(self, name):
+        return self._actions.get(name)
+
+    def names(self):
+        return list(self._actions)
+
+    def needs_confirmation(self, command_data):
+        """True if the action's policy, or the parser, asks for the user to confirm first"""
+        action = self._actions.get(command_data.get('action'))
+        return bool(command_data.get('confirmation_needed')) or (action is not None and action.confirm)
+
+    def confirmation_prompt(self, command_data):
+        return f"Are you sure you want to {command_data.get('action', '').replace('_', ' ')}? Say yes to confirm."
+
+    def dispatch(self, command_data, confirmed=False):
+        """Run a parsed command; returns its result text, or None for general queries and unknown actions
+
+        A command that needs confirmation is not run unless `confirmed` is set;
+        the question to ask the user is returned instead.
+        """
+        action = self._actions.get(command_data.get('action'))
+        if action is None:
+            return None
+        if not confirmed and self.needs_confirmation(command_data):
+            return self.confirmation_prompt(command_data)
+        kwargs = action.bind(command_data.get('parameters'))
+        started = time.perf_counter()
+        failed = timed_out = False
+        try:
+            with metrics.stage('execute'):
+                if not action.asynchronous:
+                    return action.handler(**kwargs)
+                future = self._executor().submit(action.handler, **kwargs)
+                try:
+                    return future.result(timeout=action.timeout)
+                except FutureTimeout:
+                    # The handler keeps running in the background; the user hears back now
+                    timed_out = True
+                    return f"Still working on {action.name.replace('_', ' ')}; it is taking longer than expected"
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                action.calls += 1
+                action.errors += failed
+                action.timeouts += timed_out
+                action.total_ms += elapsed * 1000
+            metrics.observe_action(action.name, elapsed, 'timeout' if timed_out else None)
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='action')
+        return self._pool
+
+    def describe(self, all_params=True):
+        """Action list for parser prompts, e.g. 'open_app (app_name), ..., restart'
+
+        With `all_params` off only constrained parameters are spelled out.
+        """
+        parts = []
+        for action in self._actions.values():
+            params = [p for p in action.params if all_params or p.choices]
+            if not params:
+                parts.append(action.name)
+            elif all_params:
+                parts.append(f"{action.name} ({', '.join(p.describe() for p in params)})")
+            else:
+                parts.append(f"{action.name} (parameters: {', '.join(p.describe() for p in params)})")
+        return ', '.join(parts)
+
+    def parameter_names(self):
+        """Every parameter name used by any action, in registration order"""
+        names = []
+        for action in self._actions.values():
+            for param in action.params:
+                if param.name not in names:
+                    names.append(param.name)
+        return names
+
+    def confirmed_actions(self):
+        return [name for name, action in self._actions.items() if action.confirm]
+
+    def get_stats(self):
+        with self._lock:
+            return {name: action.get_stats() for name, action in self._actions.items()}
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def set_controller(controller):
+    """Use an existing SystemController (entry points that already run one for telemetry)"""
+    global _controller
+    _controller = controller
+
+
+def get_controller():
+    """The shared SystemController, created on first use"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                from system_controller import SystemController
+                _controller = SystemController()
+    return _controller
+
+
+def system_info_summary():
+    info = get_controller().get_system_info()
+    return f"CPU: {info['cpu_usage']}, Memory: {info['memory_usage']}"
+
+
+registry = ActionRegistry()
+register = registry.register
+dispatch = registry.dispatch
+needs_confirmation = registry.needs_confirmation
+confirmation_prompt = registry.confirmation_prompt
+
+register('open_app', 'controller.open_application', [Param('app_name')])
+register('open_website', 'controller.open_website', [Param('url')])
+register('search_google', 'controller.search_google', [Param('query')])
+register('create_folder', 'controller.create_folder', [Param('path')])
+register('create_file', 'controller.create_file', [Param('path')])
+register('take_screenshot', 'controller.take_screenshot', asynchronous=True)
+register('close_app', 'controller.close_application', [Param('app_name')], asynchronous=True)
+register('system_info', system_info_summary)
+register('top_processes', 'controller.describe_top_processes',
+         [Param('sort', 'cpu', choices=('cpu', 'memory', 'io', 'threads'))], asynchronous=True, timeout=5)
+register('lock_screen', 'controller.lock_screen')
+register('shutdown', 'controller.shutdown_system', confirm=True)
+register('restart', 'controller.restart_system', confirm=True)
+
+
+def get_stats():
+    return registry.get_stats()
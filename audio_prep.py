@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import speech_recognition as sr
+
+import metrics
+import vad
+
+# Recognizers work at 16 kHz; anything above only makes the upload bigger
+TARGET_RATE = 16000
+# Peak level after gain normalisation (fraction of full scale), and the most a quiet capture is boosted
+TARGET_PEAK = 0.7
+MAX_GAIN = 8.0
+# Encode captures as FLAC up front (set ASSISTANT_FLAC=0 to leave encoding to the recognizer)
+ENCODE_FLAC = os.getenv('ASSISTANT_FLAC', '1') != '0'
+PREP_WORKERS = int(os.getenv('ASSISTANT_PREP_WORKERS', '2'))
+# Low-pass filter length used before downsampling (odd, in taps)
+_FILTER_TAPS = 63
+
+
+class PreparedAudio(sr.AudioData):
+    """16 kHz mono 16-bit audio whose FLAC encoding was done ahead of time
+
+    `get_flac_data` hands back the stored encoding when the caller asks for
+    the format it is already in, which is what the Google recognizer asks for,
+    so the upload is never encoded twice.
+    """
+
+    def __init__(self, frame_data, sample_rate, sample_width, flac_data=None):
+        super().__init__(frame_data, sample_rate, sample_width)
+        self.flac_data = flac_data
+
+    def get_flac_data(self, convert_rate=None, convert_width=None):
+        if (self.flac_data is not None and convert_rate in (None, self.sample_rate)
+                and convert_width in (None, self.sample_width)):
+            return self.flac_data
+        return super().get_flac_data(convert_rate, convert_width)
+
+
+def resample(samples, rate, target=TARGET_RATE):
+    """Float samples at `rate` converted to `target` (low-pass filtered first when downsampling)"""
+    if rate == target or not len(samples):
+        return samples
+    if target < rate:
+        # Windowed-sinc low-pass at the new Nyquist frequency to keep aliasing out
+        cutoff = target / rate / 2
+        n = np.arange(_FILTER_TAPS) - (_FILTER_TAPS - 1) / 2
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(_FILTER_TAPS)
+        samples = np.convolve(samples, kernel / kernel.sum(), mode='same')
+    count = int(len(samples) * target / rate)
+    positions = np.arange(count) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples)
+
+
+def normalize(samples, peak=TARGET_PEAK, max_gain=MAX_GAIN):
+    """Scale so the loudest sample sits at `peak` of full scale, boosting by at most `max_gain`"""
+    loudest = float(np.max(np.abs(samples))) if len(samples) else 0.0
+    if not loudest:
+        return samples
+    return samples * min(peak * 32767 / loudest, max_gain)
+
+
+class AudioPreprocessor:
+    """Turns raw captures into compact recognizer uploads on a small worker pool
+
+    Each capture goes through voice-activity detection, is resampled to
+    16 kHz, gain normalised and, when `encode_flac` is set, FLAC encoded,
+    all on one of `workers` threads. Callers get a Future and can keep
+    capturing in the meantime. Upload size and encode time are recorded for
+    every utterance.
+    """
+
+    def __init__(self, workers=PREP_WORKERS, encode_flac=ENCODE_FLAC):
+        self.encode_flac = encode_flac
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-prep')
+        self._lock = threading.Lock()
+        self.stats = {'utterances': 0, 'rejected': 0, 'bytes_captured': 0, 'bytes_uploaded': 0,
+                      'total_ms': 0.0, 'last_upload_bytes': None, 'last_encode_ms': None}
+
+    def submit(self, audio):
+        """Prepare `audio` in the background; the Future gives PreparedAudio, or None for non-speech"""
+        return self._pool.submit(self.prepare, audio)
+
+    def prepare(self, audio):
+        """Prepare `audio` on the calling thread"""
+        with metrics.stage('prep'):
+            return self._prepare(audio)
+
+    def _prepare(self, audio):
+        started = time.perf_counter()
+        captured = len(audio.frame_data)
+        audio = vad.filter_speech(audio)
+        if audio is None:
+            with self._lock:
+                self.stats['rejected'] += 1
+                self.stats['bytes_captured'] += captured
+            return None
+        pcm = audio.frame_data if audio.sample_width == 2 else audio.get_raw_data(convert_width=2)
+        samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+        samples = normalize(resample(samples, audio.sample_rate))
+        frame_data = np.clip(np.round(samples), -32768, 32767).astype('<i2').tobytes()
+        prepared = PreparedAudio(frame_data, TARGET_RATE, 2)
+        if self.encode_flac:
+            try:
+                prepared.flac_data = sr.AudioData.get_flac_data(prepared)
+            except Exception as e:
+                # No usable FLAC encoder on this host; the recognizer gets raw PCM to encode itself
+                print(f"Warning: FLAC encoding failed, sending raw audio: {e}")
+                self.encode_flac = False
+        upload = len(prepared.flac_data) if prepared.flac_data is not None else len(frame_data)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.stats['utterances'] += 1
+            self.stats['bytes_captured'] += captured
+            self.stats['bytes_uploaded'] += upload
+            self.stats['total_ms'] += elapsed_ms
+            self.stats['last_upload_bytes'] = upload
+            self.stats['last_encode_ms'] = round(elapsed_ms, 2)
+        return prepared
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total_ms = stats.pop('total_ms')
+        stats['avg_encode_ms'] = round(total_ms / stats['utterances'], 2) if stats['utterances'] else None
+        stats['avg_upload_bytes'] = stats['bytes_uploaded'] // stats['utterances'] if stats['utterances'] else None
+        stats['flac'] = self.encode_flac
+        return stats
+
+
+preprocessor = AudioPreprocessor()
+
+
+def submit(audio):
+    return preprocessor.submit(audio)
+
+
+def prepare(audio):
+    return preprocessor.prepare(audio)
+
+
+def get_stats():
+    return preprocessor.get_stats()
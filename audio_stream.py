@@ -0,0 +1,302 @@
+import queue
+import threading
+import time
+
+import numpy as np
+import speech_recognition as sr
+
+SAMPLE_WIDTH = 2  # 16-bit signed little-endian PCM
+
+
+class Segment:
+    """One utterance cut from a stream; `view` borrows a pooled buffer until `release()`"""
+
+    def __init__(self, segmenter, buffer, length):
+        self.sample_rate = segmenter.sample_rate
+        self.sample_width = SAMPLE_WIDTH
+        self.view = memoryview(buffer)[:length]
+        self._segmenter = segmenter
+        self._buffer = buffer
+
+    @property
+    def duration(self):
+        return len(self.view) / (self.sample_rate * SAMPLE_WIDTH)
+
+    def release(self):
+        """Hand the buffer back for reuse; the view must not be used afterwards"""
+        if self._buffer is None:
+            return
+        self.view.release()
+        self._segmenter._give_back(self._buffer)
+        self._buffer = None
+
+
+class AudioSegmenter:
+    """Cuts a live PCM stream into utterances using frame energy
+
+    Incoming chunks of any size are split into fixed frames without
+    concatenating them: whole frames are read through memoryview slices of the
+    chunk and only a partial trailing frame is carried over. A short ring keeps
+    the frames just before speech starts (pre-roll). Speech is written straight
+    into one of `buffers` preallocated utterance buffers, each holding at most
+    `max_seconds` of audio; an utterance ends after `silence_ms` of quiet or
+    when its buffer is full. If every buffer is still held by a consumer the
+    utterance is dropped, so memory per stream stays fixed. The threshold
+    follows the background noise level while nobody is speaking.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, max_seconds=15, buffers=2,
+                 energy_threshold=300, dynamic_ratio=1.5, silence_ms=700, min_speech_ms=250,
+                 pre_roll_ms=300):
+        self.sample_rate = sample_rate
+        self.frame_bytes = int(sample_rate * frame_ms / 1000) * SAMPLE_WIDTH
+        self.capacity = int(sample_rate * max_seconds) * SAMPLE_WIDTH
+        self.energy_threshold = float(energy_threshold)
+        self.dynamic_ratio = dynamic_ratio
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.pre_roll_frames = max(0, pre_roll_ms // frame_ms)
+
+        self._lock = threading.Lock()
+        self._free = [bytearray(self.capacity) for _ in range(buffers)]
+        self._carry = bytearray(self.frame_bytes)
+        self._carry_length = 0
+        self._ring = bytearray(self.frame_bytes * self.pre_roll_frames)
+        self._ring_index = 0
+        self._ring_filled = 0
+
+        self._buffer = None
+        self._length = 0
+        self._speech_frames = 0
+        self._quiet_frames = 0
+        self.stats = {'bytes_in': 0, 'segments': 0, 'discarded': 0, 'dropped': 0, 'truncated': 0}
+
+    def feed(self, chunk):
+        """Add raw PCM bytes; returns the list of utterances completed by this chunk"""
+        segments = []
+        view = memoryview(chunk).cast('B')
+        with self._lock:
+            self.stats['bytes_in'] += len(view)
+            offset = 0
+            if self._carry_length:
+                take = min(self.frame_bytes - self._carry_length, len(view))
+                self._carry[self._carry_length:self._carry_length + take] = view[:take]
+                self._carry_length += take
+                offset = take
+                if self._carry_length == self.frame_bytes:
+                    self._carry_length = 0
+                    self._frame(self._carry, segments)
+            end = offset + (len(view) - offset) // self.frame_bytes * self.frame_bytes
+            for start in range(offset, end, self.frame_bytes):
+                self._frame(view[start:start + self.frame_bytes], segments)
+            rest = len(view) - end
+            if rest:
+                self._carry[:rest] = view[end:]
+                self._carry_length = rest
+        return segments
+
+    def flush(self):
+        """End the current utterance, if any (e.g. when the client stops streaming)"""
+        segments = []
+        with self._lock:
+            self._carry_length = 0
+            if self._buffer is not None:
+                self._finish(segments)
+        return segments
+
+    def calibrate(self, pcm):
+        """Set the threshold from a sample of background noise; it keeps adapting afterwards"""
+        samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+        frames = len(samples) // (self.frame_bytes // SAMPLE_WIDTH)
+        if not frames:
+            return self.energy_threshold
+        framed = samples[:frames * (self.frame_bytes // SAMPLE_WIDTH)].reshape(frames, -1)
+        energy = float(np.median(np.sqrt(np.mean(framed * framed, axis=1))))
+        with self._lock:
+            self.energy_threshold = max(50.0, energy * self.dynamic_ratio)
+        return self.energy_threshold
+
+    def _frame(self, frame, segments):
+        samples = np.frombuffer(frame, dtype='<i2').astype(np.float32)
+        energy = float(np.sqrt(np.mean(samples * samples)))
+        loud = energy > self.energy_threshold
+
+        if self._buffer is None:
+            if not loud:
+                # Track the background level so the threshold suits the room
+                target = energy * self.dynamic_ratio
+                self.energy_threshold = max(50.0, 0.95 * self.energy_threshold + 0.05 * target)
+                self._remember(frame)
+                return
+            if not self._free:
+                self.stats['dropped'] += 1
+                self._remember(frame)
+                return
+            self._buffer = self._free.pop()
+            self._length = 0
+            self._speech_frames = 0
+            self._quiet_frames = 0
+            self._write_pre_roll()
+
+        self._write(frame)
+        if loud:
+            self._speech_frames += 1
+            self._quiet_frames = 0
+        else:
+            self._quiet_frames += 1
+        if self._quiet_frames >= self.silence_frames:
+            self._finish(segments)
+        elif self._length + self.frame_bytes > self.capacity:
+            self.stats['truncated'] += 1
+            self._finish(segments)
+
+    def _finish(self, segments):
+        buffer, length = self._buffer, self._length
+        self._buffer = None
+        self._length = 0
+        self._ring_filled = 0
+        if self._speech_frames < self.min_speech_frames:
+            self.stats['discarded'] += 1
+            self._free.append(buffer)
+            return
+        self.stats['segments'] += 1
+        segments.append(Segment(self, buffer, length))
+
+    def _write(self, frame):
+        end = self._length + len(frame)
+        self._buffer[self._length:end] = frame
+        self._length = end
+
+    def _remember(self, frame):
+        if not self._ring:
+            return
+        start = self._ring_index * self.frame_bytes
+        self._ring[start:start + self.frame_bytes] = frame
+        self._ring_index = (self._ring_index + 1) % self.pre_roll_frames
+        self._ring_filled = min(self._ring_filled + 1, self.pre_roll_frames)
+
+    def _write_pre_roll(self):
+        """Copy the remembered frames, oldest first, to the start of the utterance"""
+        ring = memoryview(self._ring)
+        first = (self._ring_index - self._ring_filled) % max(self.pre_roll_frames, 1)
+        for n in range(self._ring_filled):
+            start = ((first + n) % self.pre_roll_frames) * self.frame_bytes
+            self._write(ring[start:start + self.frame_bytes])
+        self._ring_filled = 0
+
+    def _give_back(self, buffer):
+        with self._lock:
+            self._free.append(buffer)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['energy_threshold'] = round(self.energy_threshold, 1)
+            stats['free_buffers'] = len(self._free)
+            stats['speaking'] = self._buffer is not None
+        return stats
+
+
+class MicrophoneStream:
+    """Keeps the microphone open and cuts phrases from it continuously
+
+    A reader thread opens the device once, measures the room for
+    `calibrate_seconds` the first time, and from then on feeds every chunk it
+    reads into an AudioSegmenter, whose threshold keeps following the noise
+    level. Nothing is lost between phrases: audio arriving while an earlier
+    phrase is being recognised is still segmented, and the pre-roll ring keeps
+    the start of each phrase. Finished phrases wait in a queue of `max_phrases`
+    (further ones are dropped) for `listen()`. If the device fails it is
+    reopened after `reopen_delay` seconds, without recalibrating.
+    """
+
+    def __init__(self, device_index=None, chunk=1024, calibrate_seconds=1.0, max_phrases=4,
+                 reopen_delay=1.0, max_seconds=10, silence_ms=1000, **segmenter_options):
+        self.device_index = device_index
+        self.chunk = chunk
+        self.calibrate_seconds = calibrate_seconds
+        self.reopen_delay = reopen_delay
+        self.segmenter_options = dict(segmenter_options, max_seconds=max_seconds, silence_ms=silence_ms)
+        self.segmenter = None
+        self._phrases = queue.Queue(maxsize=max_phrases)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'opened': 0, 'device_errors': 0, 'phrases': 0, 'dropped': 0,
+                      'calibrated_threshold': None, 'open_ms': None}
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stop.is_set()
+
+    def start(self):
+        """Open the device on a background thread (idempotent)"""
+        with self._lock:
+            if self.running:
+                return
+            # A fresh event per run, so a reader still closing the device cannot be revived
+            self._stop = stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(stop,), name='microphone', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Close the device and discard phrases nobody has collected"""
+        with self._lock:
+            self._stop.set()
+            self._thread = None
+        try:
+            while True:
+                self._phrases.get_nowait()
+        except queue.Empty:
+            pass
+
+    def listen(self, timeout=None):
+        """Next phrase as (sr.AudioData, started, ended) perf_counter times, or None on timeout"""
+        try:
+            return self._phrases.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _run(self, stop):
+        while not stop.is_set():
+            opening = time.perf_counter()
+            try:
+                with sr.Microphone(device_index=self.device_index, chunk_size=self.chunk) as source:
+                    self.stats['opened'] += 1
+                    self.stats['open_ms'] = round((time.perf_counter() - opening) * 1000, 1)
+                    if self.segmenter is None or self.segmenter.sample_rate != source.SAMPLE_RATE:
+                        self.segmenter = AudioSegmenter(source.SAMPLE_RATE, **self.segmenter_options)
+                        self._calibrate(source)
+                    while not stop.is_set():
+                        self._feed(source.stream.read(self.chunk))
+            except Exception as e:
+                self.stats['device_errors'] += 1
+                print(f"Warning: microphone error: {e}")
+                stop.wait(self.reopen_delay)
+
+    def _calibrate(self, source):
+        chunks = int(self.calibrate_seconds * source.SAMPLE_RATE / self.chunk)
+        if chunks <= 0:
+            return
+        ambient = b''.join(source.stream.read(self.chunk) for _ in range(chunks))
+        self.stats['calibrated_threshold'] = round(self.segmenter.calibrate(ambient), 1)
+
+    def _feed(self, chunk):
+        for segment in self.segmenter.feed(chunk):
+            ended = time.perf_counter()
+            # Copy out of the pooled buffer so the phrase can outlive it downstream
+            audio = sr.AudioData(bytes(segment.view), segment.sample_rate, segment.sample_width)
+            started = ended - segment.duration
+            segment.release()
+            try:
+                self._phrases.put_nowait((audio, started, ended))
+                self.stats['phrases'] += 1
+            except queue.Full:
+                self.stats['dropped'] += 1
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['running'] = self.running
+        stats['queued'] = self._phrases.qsize()
+        stats['segmenter'] = self.segmenter.get_stats() if self.segmenter is not None else None
+        return stats
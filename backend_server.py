@@ -1,24 +1,38 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 import threading
-import queue
-from openai import OpenAI
 import os
 import speech_recognition as sr
-import pyttsx3
+import hmac
 import json
-from system_controller import SystemController
-
-# Try to import api_data from apikey.py (local dev), otherwise use env var
-try:
-    from apikey import api_data
-except ImportError:
-    api_data = os.getenv('OPENAI_API_KEY')
+import math
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from urllib.parse import urlsplit
+from intent_router import parse_command_locally
+from response_cache import ResponseCache, collapse_whitespace
+from tts_pipeline import SpeechPipeline
+from voice_pipeline import StagePipeline
+from session_manager import SessionManager, SessionLimitError, SessionBusyError
+from audio_stream import AudioSegmenter, MicrophoneStream
+from startup import Subsystems, LAZY_START
+from event_bus import EventBus
+import llm_client
+import recognizers
+import actions
+import metrics
+import vad
+import audio_prep
 
 app = Flask(__name__, static_folder='frontend/dist/assets', template_folder='frontend/dist')
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Pin the Socket.IO async mode (threading, eventlet, gevent); by default Flask-SocketIO
+# probes for eventlet and gevent, which costs a few hundred ms of startup when installed
+SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE') or None
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=SOCKETIO_ASYNC_MODE)
 
 # Serve React App
 @app.route('/')
@@ -33,279 +47,897 @@ def serve_static(path):
 
 # Initialize
 Model = "gpt-4o"
-if not api_data:
+GENERAL_SYSTEM_PROMPT = "You are a helpful assistant"
+# Upper bound on buckets returned by /api/system-info/history
+MAX_HISTORY_POINTS = 5000
+# Upper bound on rows returned by /api/processes
+MAX_TOP_PROCESSES = 200
+# Sort keys for /api/processes, as declared by the top_processes action (importing
+# system_controller for them would load psutil and NumPy before the port is bound)
+PROCESS_SORT_KEYS = actions.registry.get('top_processes').params[0].choices
+# Stream general answers token by token (set ASSISTANT_STREAM=0 to send whole answers)
+STREAM_RESPONSES = os.getenv('ASSISTANT_STREAM', '1') != '0'
+# Parse and answer in one structured request instead of two (set ASSISTANT_FUSED=1);
+# saves a round trip on general questions, but fused answers are not streamed
+FUSED_RESPONSES = os.getenv('ASSISTANT_FUSED', '0') == '1'
+# Session admission, worker pool size and idle reaping
+MAX_SESSIONS = int(os.getenv('ASSISTANT_MAX_SESSIONS', '200'))
+SESSION_WORKERS = int(os.getenv('ASSISTANT_SESSION_WORKERS', '8'))
+SESSION_MAX_PENDING = int(os.getenv('ASSISTANT_SESSION_MAX_PENDING', '8'))
+SESSION_IDLE_TIMEOUT = float(os.getenv('ASSISTANT_SESSION_IDLE_TIMEOUT', '600'))
+# REST clients that send no X-Session-Token share this session
+DEFAULT_SESSION_KEY = 'default'
+# Text commands: batch size limit and how many batch items may wait in the session's queue at once
+MAX_BATCH_COMMANDS = int(os.getenv('ASSISTANT_MAX_BATCH_COMMANDS', '100'))
+MAX_BATCH_PARALLELISM = int(os.getenv('ASSISTANT_BATCH_PARALLELISM', '8'))
+# Browser audio streaming: accepted sample rates and the largest binary frame taken at once
+AUDIO_SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+MAX_AUDIO_CHUNK_BYTES = 64 * 1024
+# Text commands run actions on this machine, so they are only taken from loopback
+# callers; once this is set, any caller sending it as X-Command-Token is taken instead
+COMMAND_API_TOKEN = os.getenv('ASSISTANT_COMMAND_TOKEN') or None
+LOOPBACK_HOSTS = ('127.0.0.1', '::1', 'localhost')
+# How long /api/command waits for its result before answering 504
+COMMAND_TIMEOUT = float(os.getenv('ASSISTANT_COMMAND_TIMEOUT', '60'))
+if not llm_client.api_data:
     print("WARNING: No API Key found! Please set OPENAI_API_KEY environment variable.")
-    client = None
-else:
-    client = OpenAI(api_key=api_data)
-sys_controller = SystemController()
-
-# Global state
-assistant_state = {
-    'is_running': False,
-    'status': 'idle',
-    'system_info': {}
-}
+response_cache = ResponseCache()
 
-message_queue = queue.Queue()
+# The server has one microphone and one speaker; the session that started
+# listening owns them until it stops or goes away
+voice_owner = None
+voice_lock = threading.Lock()
 
 # Text-to-speech engine
-# Text-to-speech engine
-try:
+def create_tts_engine():
+    """Build the TTS engine (called on the speech thread; fails on headless hosts)"""
+    import pyttsx3
     engine = pyttsx3.init() # Let it pick default driver
     voices = engine.getProperty('voices')
     if voices:
         engine.setProperty('voice', voices[0].id)
-except Exception:
-    print("Warning: TTS engine could not be initialized (likely headless environment). Voice output disabled.")
-    engine = None
+    return engine
 
-def speak(text):
-    """Text to speech"""
-    if engine:
-        try:
-            engine.say(text)
-            engine.runAndWait()
-        except Exception as e:
-            print(f"TTS Error: {e}")
-    else:
-        # Fallback for logs or just skip
-        print(f"[TTS Placeholder]: {text}")
+tts = SpeechPipeline(create_tts_engine, autostart=False)
 
-def parse_command_locally(query):
-    """Parse common commands locally without API"""
-    query_lower = query.lower()
-    
-    # Open application commands
-    if "open" in query_lower or "launch" in query_lower or "start" in query_lower:
-        for app in ['chrome', 'calculator', 'notepad', 'paint', 'edge', 'explorer', 'vs code', 'word', 'excel']:
-            if app in query_lower:
-                return {"action": "open_app", "parameters": {"app_name": app}, "confirmation_needed": False}
-        
-        # Check for websites
-        if any(site in query_lower for site in ['youtube', 'google', 'facebook', 'twitter', 'instagram', '.com', '.org']):
-            words = query_lower.split()
-            for word in words:
-                if '.com' in word or '.org' in word or word in ['youtube', 'google', 'facebook']:
-                    return {"action": "open_website", "parameters": {"url": word}, "confirmation_needed": False}
-    
-    # Search commands
-    if "search" in query_lower or "google" in query_lower:
-        search_query = query_lower.replace("search for", "").replace("search", "").replace("google", "").strip()
-        return {"action": "search_google", "parameters": {"query": search_query}, "confirmation_needed": False}
-    
-    # Screenshot
-    if "screenshot" in query_lower or "capture screen" in query_lower:
-        return {"action": "take_screenshot", "parameters": {}, "confirmation_needed": False}
-    
-    # Close application
-    if "close" in query_lower or "exit" in query_lower:
-        for app in ['chrome', 'calculator', 'notepad', 'paint', 'edge']:
-            if app in query_lower:
-                return {"action": "close_app", "parameters": {"app_name": app}, "confirmation_needed": False}
-    
-    # System info
-    if "system" in query_lower and ("info" in query_lower or "status" in query_lower or "usage" in query_lower):
-        return {"action": "system_info", "parameters": {}, "confirmation_needed": False}
-    
-    # Lock screen
-    if "lock" in query_lower:
-        return {"action": "lock_screen", "parameters": {}, "confirmation_needed": False}
-    
-    # Shutdown/Restart
-    if "shutdown" in query_lower or "shut down" in query_lower:
-        return {"action": "shutdown", "parameters": {}, "confirmation_needed": True}
-    if "restart" in query_lower or "reboot" in query_lower:
-        return {"action": "restart", "parameters": {}, "confirmation_needed": True}
-    
+# Slow subsystems start in the background once the port is bound (or on first
+# use with ASSISTANT_LAZY_START=1); /api/status reports each one's readiness
+subsystems = Subsystems()
+
+def init_llm():
+    """Load the OpenAI client and open its pooled connection so the first command skips TLS setup"""
+    if not llm_client.api_data:
+        raise llm_client.LLMUnavailable('no API key configured')
+    llm_client.warm_up().join()
+    return llm_client.get_client()
+
+def init_tts():
+    """Start the speech thread and wait for its engine (driver load and voice enumeration)"""
+    tts.start()
+    tts.ready.wait()
+    if tts.engine_error:
+        raise RuntimeError(tts.engine_error)
+    return tts
+
+def init_system():
+    """The SystemController (psutil, telemetry history) with live telemetry pushed to clients"""
+    controller = actions.get_controller()
+    controller.telemetry.subscribe(push_system_info)
+    controller.telemetry.start()
+    return controller
+
+subsystems.add('llm', init_llm)
+subsystems.add('tts', init_tts)
+subsystems.add('recognizer', recognizers.get_recognizer)
+subsystems.add('system', init_system)
+
+def system_controller():
+    """The system controller, waiting for it on first use"""
+    return subsystems.get('system')
+
+def speak(session, text):
+    """Queue text for speech if the session uses the server's speaker; playback happens on the TTS thread"""
+    if session.local_audio:
+        return tts.say(text)
     return None
 
+# Per-session events go out as coalesced, sequence-numbered 'events' frames
+event_bus = EventBus(lambda room, frame: socketio.emit('events', frame, to=room))
+
+def emit_to(session, event, data):
+    """Queue an event for the connections of one session; it goes out with the session's next frame"""
+    event_bus.publish(session.room, event, data)
+
+def send_snapshot(session):
+    """Send the calling connection the session's state, to (re)start applying frames from"""
+    def send(snapshot):
+        if snapshot['status'] is None:
+            snapshot['status'] = {'status': session.state['status'], 'color': '#555555'}
+        snapshot['is_running'] = session.state['is_running']
+        emit('snapshot', snapshot)
+    event_bus.resync(session.room, send)
+
+def set_status(session, status, color):
+    session.state['status'] = status
+    emit_to(session, 'status_update', {'status': status, 'color': color})
+
+COMMAND_PARSER_PROMPT = f"""You are a command parser. Respond ONLY with JSON:
+{{"action": "action_name", "parameters": {{"param1": "value1"}}, "confirmation_needed": false}}
+
+Actions: {actions.registry.describe(all_params=False)}, {actions.GENERAL_QUERY}"""
+
+# Action names and parameters come from the shared action registry
+ACTIONS = actions.registry.names() + [actions.GENERAL_QUERY]
+COMMAND_PARAMETERS = actions.registry.parameter_names()
+
+FUSED_PROMPT = f"""You are a voice assistant that can control the user's computer.
+If the user asks for one of these actions, set "action" and its parameters and leave "answer" null:
+{actions.registry.describe()}.
+Set "confirmation_needed" to true for {' and '.join(actions.registry.confirmed_actions())}.
+Otherwise set "action" to general_query and put a short, helpful spoken answer in "answer"."""
+
+# Structured output: the reply is always one object matching this schema
+FUSED_RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'assistant_turn',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {
+                'action': {'type': 'string', 'enum': ACTIONS},
+                'parameters': {
+                    'type': 'object',
+                    'properties': {name: {'type': ['string', 'null']} for name in COMMAND_PARAMETERS},
+                    'required': COMMAND_PARAMETERS,
+                    'additionalProperties': False,
+                },
+                'confirmation_needed': {'type': 'boolean'},
+                'answer': {'type': ['string', 'null']},
+            },
+            'required': ['action', 'parameters', 'confirmation_needed', 'answer'],
+            'additionalProperties': False,
+        },
+    },
+}
+
+# Parsed commands are memoised across restarts and dropped whenever a parser prompt changes;
+# keyed on the utterance as said, since parameters are copied out of it
+command_cache = ResponseCache(table='backend_commands', ttl=None, max_disk_entries=2000,
+                              version=COMMAND_PARSER_PROMPT + FUSED_PROMPT, bypass_time_sensitive=False,
+                              normalize=collapse_whitespace)
+
 def parse_command_with_gpt(query):
     """Parse command using GPT"""
+    cached = command_cache.get(query, Model, COMMAND_PARSER_PROMPT)
+    if cached is not None:
+        return json.loads(cached)
     try:
-        system_prompt = """You are a command parser. Respond ONLY with JSON:
-{"action": "action_name", "parameters": {"param1": "value1"}, "confirmation_needed": false}
-
-Actions: open_app, open_website, search_google, create_folder, create_file, take_screenshot, close_app, system_info, lock_screen, shutdown, restart, general_query"""
-        
-        completion = client.chat.completions.create(
+        completion = llm_client.create_completion(
             model=Model,
             messages=[
-                {'role': "system", 'content': system_prompt},
+                {'role': "system", 'content': COMMAND_PARSER_PROMPT},
                 {'role': 'user', 'content': query}
             ],
-            max_tokens=150
+            max_tokens=150,
+            deadline=llm_client.COMMAND_DEADLINE
         )
         
         response = completion.choices[0].message.content
         command_data = json.loads(response)
+        command_cache.put(query, Model, COMMAND_PARSER_PROMPT, json.dumps(command_data))
         return command_data
     except Exception as e:
+        metrics.count_error('model_parse', e)
         return {"action": "general_query", "parameters": {}, "confirmation_needed": False}
 
-def execute_system_command(command_data):
-    """Execute system commands"""
-    action = command_data.get('action')
-    params = command_data.get('parameters', {})
-    
-    result = None
+def parse_fused_response(content):
+    """Split a fused reply into (command_data, answer), dropping unused parameters"""
+    data = json.loads(content)
+    command_data = {
+        'action': data.get('action', 'general_query'),
+        'parameters': {k: v for k, v in (data.get('parameters') or {}).items() if v is not None},
+        'confirmation_needed': bool(data.get('confirmation_needed')),
+    }
+    answer = data.get('answer') if command_data['action'] == 'general_query' else None
+    return command_data, answer
+
+def parse_and_answer_with_gpt(query):
+    """Parse a command and, for general questions, answer it in a single request
+
+    Returns (command_data, answer); answer is None for actions, or when it has to
+    be fetched separately because the fused request failed.
+    """
+    cached = command_cache.get(query, Model, FUSED_PROMPT)
+    if cached is not None:
+        command_data = json.loads(cached)
+        if command_data['action'] != 'general_query':
+            return command_data, None
+        answer = response_cache.get(query, Model, FUSED_PROMPT)
+        if answer is not None:
+            return command_data, answer
+    try:
+        completion = llm_client.create_completion(
+            model=Model,
+            messages=[
+                {'role': "system", 'content': FUSED_PROMPT},
+                {'role': 'user', 'content': query}
+            ],
+            response_format=FUSED_RESPONSE_FORMAT,
+            max_tokens=300
+        )
+        command_data, answer = parse_fused_response(completion.choices[0].message.content)
+    except Exception as e:
+        metrics.count_error('model_parse', e)
+        print(f"Warning: fused request failed ({e})")
+        return {"action": "general_query", "parameters": {}, "confirmation_needed": False}, None
+    command_cache.put(query, Model, FUSED_PROMPT, json.dumps(command_data))
+    response_cache.put(query, Model, FUSED_PROMPT, answer)
+    return command_data, answer
+
+def parse_query(query):
+    """Parse locally, falling back to the model; returns (command_data, answer, source)
+
+    answer is only set when a fused request already answered a general question.
+    """
+    with metrics.stage('local_parse'):
+        command_data = parse_command_locally(query)
+    if command_data is not None:
+        metrics.count_parse('local')
+        return command_data, None, 'local'
+    metrics.count_parse('model')
+    with metrics.stage('model_parse'):
+        if FUSED_RESPONSES:
+            command_data, answer = parse_and_answer_with_gpt(query)
+        else:
+            command_data, answer = parse_command_with_gpt(query), None
+    return command_data, answer, 'model'
+
+@metrics.timed('completion')
+def stream_general_answer(session, query, speech=None):
+    """Stream a general answer to the session as message_delta events and return the full text
+
+    If `speech` (a tts_pipeline.Utterance) is given, tokens are also fed to it so
+    the first sentence is spoken while the rest is still being generated.
+    """
+    message_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    first_token_ms = None
+    seq = 0
+    parts = []
+    try:
+        stream = llm_client.create_completion(
+            model=Model,
+            messages=[
+                {'role': "system", 'content': GENERAL_SYSTEM_PROMPT},
+                {'role': 'user', 'content': query}
+            ],
+            max_tokens=200,
+            stream=True
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+                metrics.observe('first_token', first_token_ms / 1000)
+            parts.append(delta)
+            if speech is not None:
+                speech.feed(delta)
+            emit_to(session, 'message_delta', {
+                'id': message_id, 'seq': seq, 'type': 'assistant', 'delta': delta, 'final': False
+            })
+            seq += 1
+    finally:
+        # Always close the message so the client stops showing it as in progress
+        total_ms = (time.perf_counter() - started) * 1000
+        answer = ''.join(parts)
+        emit_to(session, 'message_delta', {
+            'id': message_id, 'seq': seq, 'type': 'assistant', 'delta': '', 'final': True,
+            'content': answer, 'first_token_ms': first_token_ms, 'total_ms': total_ms
+        })
+        session.state['latency'] = {'first_token_ms': first_token_ms, 'completion_ms': total_ms}
+        if first_token_ms is not None:
+            print(f"Answer streamed: first token {first_token_ms:.0f} ms, complete {total_ms:.0f} ms")
+    return answer
+
+def capture_audio(_):
+    """Pipeline source: take the next phrase cut from the open microphone stream"""
+    session = voice_owner
+    if session is None:
+        time.sleep(0.1)
+        return None
+    set_status(session, 'listening', '#00d9ff')
+    emit_to(session, 'message', {'type': 'system', 'content': 'Listening...'})
+    while voice_pipeline.running and voice_owner is session:
+        phrase = microphone.listen(timeout=0.5)
+        if phrase is not None:
+            audio, started, ended = phrase
+            metrics.observe('capture', ended - started)
+            # Trim, resample and encode on the prep pool while capture carries on
+            return session, audio_prep.submit(audio), started, ended
+    return None
+
+def recognize_audio(captured):
+    """Pipeline stage: turn captured audio into text"""
+    session, prepared, started, ended = captured
+    if tts.overlaps(started, ended):
+        # The microphone picked up our own speech; drop it rather than answer ourselves
+        prepared.cancel()
+        return None
+    audio = prepared.result()
+    if audio is None:
+        # Silence or noise: not worth a recognition call
+        return None
     
-    if action == 'open_app':
-        result = sys_controller.open_application(params.get('app_name', ''))
-    elif action == 'open_website':
-        result = sys_controller.open_website(params.get('url', ''))
-    elif action == 'search_google':
-        result = sys_controller.search_google(params.get('query', ''))
-    elif action == 'create_folder':
-        result = sys_controller.create_folder(params.get('path', ''))
-    elif action == 'create_file':
-        result = sys_controller.create_file(params.get('path', ''))
-    elif action == 'take_screenshot':
-        result = sys_controller.take_screenshot()
-    elif action == 'close_app':
-        result = sys_controller.close_application(params.get('app_name', ''))
-    elif action == 'system_info':
-        info = sys_controller.get_system_info()
-        result = f"CPU: {info['cpu_usage']}, Memory: {info['memory_usage']}"
-    elif action == 'lock_screen':
-        result = sys_controller.lock_screen()
-    elif action == 'shutdown':
-        result = sys_controller.shutdown_system()
-    elif action == 'restart':
-        result = sys_controller.restart_system()
+    set_status(session, 'recognizing', '#ffa500')
     
-    return result
+    query = recognizers.recognize(audio)
+    emit_to(session, 'message', {'type': 'user', 'content': query})
+    return session, query
 
-def listen_and_process():
-    """Voice processing loop"""
-    r = sr.Recognizer()
+def dispatch_utterance(recognized):
+    """Pipeline stage: run the utterance on the listening session's worker and wait for it"""
+    session, query = recognized
+    try:
+        sessions.submit(session, process_query, session, query).result()
+    except SessionBusyError as e:
+        emit_to(session, 'message', {'type': 'system', 'content': str(e)})
+    return None
+
+@metrics.timed('completion')
+def request_general_answer(query):
+    """Answer a general question with one non-streamed request and cache the answer"""
+    completion = llm_client.create_completion(
+        model=Model,
+        messages=[
+            {'role': "system", 'content': GENERAL_SYSTEM_PROMPT},
+            {'role': 'user', 'content': query}
+        ],
+        max_tokens=200
+    )
+    answer = completion.choices[0].message.content
+    response_cache.put(query, Model, GENERAL_SYSTEM_PROMPT, answer)
+    return answer
+
+def handle_command(query, confirmed=False, dry_run=False):
+    """Parse, execute and answer one text command without touching the microphone or speaker
+
+    Returns a JSON-ready dict. Commands the parser wants confirmed only run
+    when `confirmed` is set; actions whose policy requires confirmation
+    (shutdown, restart) never run from text, only by voice at the machine.
+    `dry_run` parses without executing or answering.
+    """
+    started = time.perf_counter()
+    command_data, answer, source = parse_query(query)
+
+    item = {
+        'query': query,
+        'action': command_data.get('action'),
+        'parameters': command_data.get('parameters', {}),
+        'confirmation_needed': actions.needs_confirmation(command_data),
+        'source': source,
+        'status': 'ok',
+        'result': None,
+        'answer': None,
+    }
+    action = actions.registry.get(item['action'])
+    if dry_run:
+        item['status'] = 'parsed'
+    elif action is not None and action.confirm:
+        item['status'] = 'refused'
+        item['error'] = f"{action.name} is only run when confirmed by voice"
+    elif item['confirmation_needed'] and not confirmed:
+        item['status'] = 'needs_confirmation'
+    else:
+        try:
+            item['result'] = actions.dispatch(command_data, confirmed=True)
+            if not item['result']:
+                if not answer:
+                    answer = response_cache.get(query, Model, GENERAL_SYSTEM_PROMPT)
+                item['answer'] = answer if answer else request_general_answer(query)
+        except Exception as e:
+            item['status'] = 'error'
+            item['error'] = llm_client.describe_error(e)
+    item['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return item
+
+@metrics.timed('process')
+def process_query(session, query):
+    """Parse, execute and answer one utterance for a session"""
+    # Check for exit
+    if any(word in query.lower() for word in ['bye', 'goodbye', 'exit', 'stop']):
+        response = 'Goodbye! Have a great day!'
+        emit_to(session, 'message', {'type': 'assistant', 'content': response})
+        speak(session, response)
+        session.state['is_running'] = False
+        session.pinned = False
+        if voice_owner is session:
+            voice_pipeline.stop()
+            microphone.stop()
+        set_status(session, 'idle', '#555555')
+        return None
+    
+    # Parse and execute
+    set_status(session, 'processing', '#e94560')
+    
+    pending = session.state.pop('pending_confirmation', None)
+    if pending is not None:
+        # The previous utterance asked for a shutdown or restart; this one answers the question
+        result = actions.dispatch(pending, confirmed=True) if 'yes' in query.lower() else 'Action cancelled'
+        emit_to(session, 'message', {'type': 'assistant', 'content': result})
+        speak(session, result)
+        if session.state['is_running']:
+            set_status(session, 'ready', '#00ff00')
+        return None
+    
+    command_data, answer, source = parse_query(query)
+    if source == 'local':
+        emit_to(session, 'message', {'type': 'system', 'content': f'Action: {command_data.get("action")}'})
+    
+    if actions.needs_confirmation(command_data):
+        session.state['pending_confirmation'] = command_data
+    result = actions.dispatch(command_data)
     
-    while assistant_state['is_running']:
+    if result:
+        emit_to(session, 'message', {'type': 'assistant', 'content': result})
+        speak(session, result)
+    elif answer:
+        # Answered by the fused request
+        emit_to(session, 'message', {'type': 'assistant', 'content': answer})
+        speak(session, answer)
+    else:
+        # General query
         try:
-            with sr.Microphone() as source:
-                assistant_state['status'] = 'listening'
-                socketio.emit('status_update', {'status': 'listening', 'color': '#00d9ff'})
-                socketio.emit('message', {'type': 'system', 'content': 'Listening...'})
-                
-                r.pause_threshold = 1
-                audio = r.listen(source, timeout=5, phrase_time_limit=10)
-            
-            assistant_state['status'] = 'recognizing'
-            socketio.emit('status_update', {'status': 'recognizing', 'color': '#ffa500'})
-            
-            query = r.recognize_google(audio, language='en-in')
-            socketio.emit('message', {'type': 'user', 'content': query})
-            
-            # Check for exit
-            if any(word in query.lower() for word in ['bye', 'goodbye', 'exit', 'stop']):
-                response = 'Goodbye! Have a great day!'
-                socketio.emit('message', {'type': 'assistant', 'content': response})
-                speak(response)
-                assistant_state['is_running'] = False
-                assistant_state['status'] = 'idle'
-                socketio.emit('status_update', {'status': 'idle', 'color': '#555555'})
-                break
-            
-            # Parse and execute
-            assistant_state['status'] = 'processing'
-            socketio.emit('status_update', {'status': 'processing', 'color': '#e94560'})
-            
-            command_data = parse_command_locally(query)
-            
-            if command_data is None:
-                command_data = parse_command_with_gpt(query)
-            else:
-                socketio.emit('message', {'type': 'system', 'content': f'Action: {command_data.get("action")}'})
-            
-            result = execute_system_command(command_data)
-            
-            if result:
-                socketio.emit('message', {'type': 'assistant', 'content': result})
-                speak(result)
-            else:
-                # General query
+            answer = response_cache.get(query, Model, GENERAL_SYSTEM_PROMPT)
+            if answer is not None:
+                emit_to(session, 'message', {'type': 'assistant', 'content': answer})
+                speak(session, answer)
+            elif STREAM_RESPONSES:
+                speech = tts.begin() if session.local_audio else None
                 try:
-                    completion = client.chat.completions.create(
-                        model=Model,
-                        messages=[
-                            {'role': "system", 'content': "You are a helpful assistant"},
-                            {'role': 'user', 'content': query}
-                        ],
-                        max_tokens=200
-                    )
-                    answer = completion.choices[0].message.content
-                    socketio.emit('message', {'type': 'assistant', 'content': answer})
-                    speak(answer)
-                except Exception as e:
-                    error_msg = "API quota exceeded. Please check your OpenAI billing."
-                    socketio.emit('message', {'type': 'assistant', 'content': error_msg})
-                    speak(error_msg)
-            
-            assistant_state['status'] = 'ready'
-            socketio.emit('status_update', {'status': 'ready', 'color': '#00ff00'})
-            
-        except sr.WaitTimeoutError:
-            continue
-        except sr.UnknownValueError:
-            socketio.emit('message', {'type': 'system', 'content': 'Could not understand audio'})
+                    answer = stream_general_answer(session, query, speech)
+                finally:
+                    if speech is not None:
+                        speech.end()
+                response_cache.put(query, Model, GENERAL_SYSTEM_PROMPT, answer or None)
+            else:
+                answer = request_general_answer(query)
+                emit_to(session, 'message', {'type': 'assistant', 'content': answer})
+                speak(session, answer)
         except Exception as e:
-            socketio.emit('message', {'type': 'system', 'content': f'Error: {str(e)}'})
+            error_msg = llm_client.describe_error(e)
+            emit_to(session, 'message', {'type': 'assistant', 'content': error_msg})
+            speak(session, error_msg)
+    
+    if session.state['is_running']:
+        set_status(session, 'ready', '#00ff00')
+    return None
+
+def recognize_segment(session, segment):
+    """Session worker: recognise one utterance streamed from the browser and answer it"""
+    try:
+        # Preparing reads the pooled buffer in place and leaves a compact copy,
+        # so the buffer goes back for reuse before recognition starts
+        audio = audio_prep.prepare(sr.AudioData(segment.view, segment.sample_rate, segment.sample_width))
+    finally:
+        segment.release()
+    if audio is None:
+        return None
+    try:
+        set_status(session, 'recognizing', '#ffa500')
+        query = recognizers.recognize(audio)
+    except sr.UnknownValueError:
+        emit_to(session, 'message', {'type': 'system', 'content': 'Could not understand audio'})
+        set_status(session, 'listening', '#00d9ff')
+        return None
+    except Exception as e:
+        emit_to(session, 'message', {'type': 'system', 'content': f'Error: {str(e)}'})
+        set_status(session, 'listening', '#00d9ff')
+        return None
+    emit_to(session, 'message', {'type': 'user', 'content': query})
+    process_query(session, query)
+    if session.audio is not None and session.state['is_running']:
+        set_status(session, 'listening', '#00d9ff')
+    return None
+
+def submit_segments(session, segments):
+    for index, segment in enumerate(segments):
+        metrics.observe('capture', segment.duration)
+        try:
+            sessions.submit(session, recognize_segment, session, segment)
+        except (SessionBusyError, SessionLimitError) as e:
+            for skipped in segments[index:]:
+                skipped.release()
+            emit_to(session, 'message', {'type': 'system', 'content': str(e)})
+            return
+
+def report_pipeline_error(stage, job, error):
+    session = voice_owner
+    if session is None:
+        return
+    if isinstance(error, sr.UnknownValueError):
+        emit_to(session, 'message', {'type': 'system', 'content': 'Could not understand audio'})
+    else:
+        emit_to(session, 'message', {'type': 'system', 'content': f'Error: {str(error)}'})
+
+# Voice pipeline: the microphone keeps capturing while earlier utterances are
+# recognised and processed; speech output is the tts pipeline's own worker
+# The device stays open while the assistant runs; phrases are cut from it continuously
+microphone = MicrophoneStream()
+voice_pipeline = (
+    StagePipeline('voice', on_error=report_pipeline_error)
+    .add_source('capture', capture_audio)
+    .add_stage('recognize', recognize_audio, maxsize=4)
+    .add_stage('process', dispatch_utterance, maxsize=4)
+)
+
+def listen_and_process():
+    """Start the voice pipeline (returns immediately; stages run on their own threads)"""
+    microphone.start()
+    voice_pipeline.start()
+
+def get_pipeline_metrics():
+    """Queue depth and latency for every stage, including speech output"""
+    metrics = voice_pipeline.get_metrics()
+    tts_metrics = tts.get_metrics()
+    metrics['stages']['speak'] = {
+        'queue_depth': tts_metrics['queue_depth'],
+        'last_first_audio_ms': tts_metrics['last_first_audio_ms'],
+        'last_total_ms': tts_metrics['last_total_ms'],
+    }
+    return metrics
+
+def release_voice(session):
+    """Stop the microphone pipeline and speech if this session owns them"""
+    global voice_owner
+    with voice_lock:
+        if voice_owner is not session:
+            return
+        voice_owner = None
+        session.pinned = False
+    voice_pipeline.stop()
+    microphone.stop()
+    tts.cancel()
+
+def handle_session_closed(session, reason):
+    release_voice(session)
+    event_bus.drop(session.room)
+
+sessions = SessionManager(max_sessions=MAX_SESSIONS, workers=SESSION_WORKERS, max_pending=SESSION_MAX_PENDING,
+                          idle_timeout=SESSION_IDLE_TIMEOUT, on_close=handle_session_closed)
+sessions.start()
+
+def request_session():
+    """Session named by the X-Session-Token header or ?session=, opened on first use"""
+    key = request.headers.get('X-Session-Token') or request.args.get('session') or DEFAULT_SESSION_KEY
+    return sessions.open(key)
+
+
+@app.errorhandler(SessionLimitError)
+def session_limit_reached(e):
+    return jsonify({'error': str(e)}), 503
+
+@app.errorhandler(SessionBusyError)
+def session_busy(e):
+    return jsonify({'error': str(e)}), 429
 
 # REST API endpoints
+# Read when /metrics is scraped
+metrics.gauge('assistant_sessions_active', 'Sessions currently open', lambda: sessions.get_stats()['active'])
+metrics.gauge('assistant_tts_queue_depth', 'Sentences waiting to be spoken', lambda: tts.get_metrics()['queue_depth'])
+metrics.gauge('assistant_voice_pipeline_running', 'Whether the server microphone loop is running',
+              lambda: int(voice_pipeline.running))
+metrics.gauge('assistant_llm_circuit_open', 'Whether model calls are paused by the circuit breaker',
+              lambda: int(llm_client.breaker.get_stats()['state'] == 'open'))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latency histograms, parse sources, errors and in-flight gauges in Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    """Get current assistant status"""
+    """Get current assistant status for the calling session"""
+    session = request_session()
     return jsonify({
-        'is_running': assistant_state['is_running'],
-        'status': assistant_state['status']
+        'session': session.id,
+        'is_running': session.state['is_running'],
+        'status': session.state['status'],
+        'latency': session.state['latency'],
+        'audio': session.audio.get_stats() if session.audio is not None else None,
+        'microphone': microphone.get_stats(),
+        'sessions': sessions.get_stats(),
+        'tts': tts.get_metrics(),
+        'pipeline': get_pipeline_metrics(),
+        'response_cache': response_cache.get_stats(),
+        'command_cache': command_cache.get_stats(),
+        'llm': llm_client.get_stats(),
+        # Null until the recognizer subsystem is up, so the status request never builds it
+        'recognizer': recognizers.get_stats() if subsystems.ready('recognizer') else None,
+        'actions': actions.get_stats(),
+        'vad': vad.get_stats(),
+        'audio_prep': audio_prep.get_stats(),
+        'startup': subsystems.get_status(),
+        'events': event_bus.get_stats()
     })
 
+def push_system_info(info):
+    """Broadcast each new telemetry sample so clients don't have to poll"""
+    socketio.emit('system_info', info)
+
+def push_llm_status(breaker_stats):
+    """Tell clients when model calls are paused or resume"""
+    socketio.emit('llm_status', breaker_stats)
+
+llm_client.breaker.subscribe(push_llm_status)
+
+def system_unavailable():
+    """503 for system routes when the controller failed to start"""
+    error = subsystems.get_status()['subsystems']['system']['error']
+    return jsonify({'error': f'system monitoring is unavailable: {error}'}), 503
+
 @app.route('/api/system-info', methods=['GET'])
 def get_system_info():
     """Get system information"""
+    controller = system_controller()
+    if controller is None:
+        return system_unavailable()
     try:
-        info = sys_controller.get_system_info()
+        info = controller.get_system_info()
         return jsonify(info)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/system-info/history', methods=['GET'])
+def get_system_info_history():
+    """Downsampled telemetry history: ?from=&to= (epoch seconds) &step= (seconds)"""
+    try:
+        end = float(request.args.get('to', time.time()))
+        start = float(request.args.get('from', end - 3600))
+        step = float(request.args.get('step', 60))
+    except ValueError:
+        return jsonify({'error': 'from, to and step must be numbers'}), 400
+    if not all(math.isfinite(value) for value in (start, end, step)):
+        # float() accepts nan and inf, which would come back as invalid JSON
+        return jsonify({'error': 'from, to and step must be finite numbers'}), 400
+    if start >= end or step <= 0:
+        return jsonify({'error': 'expected from < to and step > 0'}), 400
+    if (end - start) / step > MAX_HISTORY_POINTS:
+        return jsonify({'error': f'too many points; use step >= {(end - start) / MAX_HISTORY_POINTS:.0f}'}), 400
+    controller = system_controller()
+    if controller is None:
+        return system_unavailable()
+    return jsonify(controller.get_system_history(start, end, step))
+
+@app.route('/api/processes', methods=['GET'])
+def get_processes():
+    """Top resource consumers: ?sort=cpu|memory|io|threads&n=20"""
+    sort = request.args.get('sort', 'cpu')
+    try:
+        n = int(request.args.get('n', 20))
+    except ValueError:
+        return jsonify({'error': 'n must be an integer'}), 400
+    if sort not in PROCESS_SORT_KEYS:
+        return jsonify({'error': f"sort must be one of {', '.join(PROCESS_SORT_KEYS)}"}), 400
+    if not 1 <= n <= MAX_TOP_PROCESSES:
+        return jsonify({'error': f'n must be between 1 and {MAX_TOP_PROCESSES}'}), 400
+    controller = system_controller()
+    if controller is None:
+        return system_unavailable()
+    return jsonify({'sort': sort, 'processes': controller.get_top_processes(sort, n)})
+
+def refuse_command_caller():
+    """A 403 response unless the caller may run text commands, else None
+
+    Without ASSISTANT_COMMAND_TOKEN only requests from this machine are taken,
+    and a browser page may only send them if it was itself served from this
+    machine: CORS is open, so any site the user visits could post here.
+    """
+    if COMMAND_API_TOKEN is not None:
+        if hmac.compare_digest(request.headers.get('X-Command-Token', ''), COMMAND_API_TOKEN):
+            return None
+        return jsonify({'error': 'missing or wrong X-Command-Token'}), 403
+    origin = request.headers.get('Origin')
+    if request.remote_addr not in LOOPBACK_HOSTS or \
+            (origin is not None and urlsplit(origin).hostname not in LOOPBACK_HOSTS):
+        return jsonify({'error': 'text commands are only accepted from this machine'}), 403
+    return None
+
+@app.route('/api/command', methods=['POST'])
+def run_command():
+    """Run one text command: {"text": "...", "confirm": false, "dry_run": false}"""
+    refused = refuse_command_caller()
+    if refused is not None:
+        return refused
+    data = request.get_json(silent=True) or {}
+    text = data.get('text')
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'error': 'expected a non-empty "text" string'}), 400
+    session = request_session()
+    future = sessions.submit(session, handle_command, text.strip(), bool(data.get('confirm')), bool(data.get('dry_run')))
+    done, _ = wait([future], timeout=COMMAND_TIMEOUT)
+    if not done:
+        return jsonify({'error': f'command did not finish within {COMMAND_TIMEOUT:.0f}s'}), 504
+    return jsonify(future.result())
+
+@app.route('/api/commands', methods=['POST'])
+def run_commands():
+    """Run a batch of text commands on the calling session, streaming one NDJSON line per item as it finishes
+
+    Body: {"commands": ["...", ...], "parallelism": 4, "confirm": false, "dry_run": false}.
+    Items run on the session's worker like its other commands; `parallelism`
+    caps how many are queued there at once (and never beyond the session's
+    pending-job limit). Each line carries the item's `index` in the batch.
+    """
+    refused = refuse_command_caller()
+    if refused is not None:
+        return refused
+    data = request.get_json(silent=True) or {}
+    commands = data.get('commands')
+    if not isinstance(commands, list) or not commands or \
+            not all(isinstance(text, str) and text.strip() for text in commands):
+        return jsonify({'error': 'expected "commands": a non-empty list of non-empty strings'}), 400
+    if len(commands) > MAX_BATCH_COMMANDS:
+        return jsonify({'error': f'at most {MAX_BATCH_COMMANDS} commands per batch'}), 413
+    try:
+        parallelism = int(data.get('parallelism', MAX_BATCH_PARALLELISM))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'parallelism must be an integer'}), 400
+    parallelism = max(1, min(parallelism, MAX_BATCH_PARALLELISM))
+    confirmed = bool(data.get('confirm'))
+    dry_run = bool(data.get('dry_run'))
+    session = request_session()
+    # Items go through the session's own queue, so its pending-job limit applies to them
+    window = max(1, min(parallelism, sessions.max_pending))
+
+    def generate():
+        queued = deque(enumerate(commands))
+        pending = {}
+
+        def submit_more():
+            """Queue items up to the window; returns lines for items the session refused"""
+            refused = []
+            while queued and len(pending) < window:
+                index, text = queued[0]
+                try:
+                    pending[sessions.submit(session, handle_command, text.strip(), confirmed, dry_run)] = index
+                except SessionBusyError as e:
+                    if pending:
+                        break  # other work holds the session's queue; retry as items finish
+                    refused.append(json.dumps({'query': text, 'status': 'rejected', 'error': str(e),
+                                               'index': index}) + '\n')
+                queued.popleft()
+            return refused
+
+        yield from submit_more()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    item = future.result()
+                except Exception as e:
+                    item = {'query': commands[index], 'status': 'error', 'error': str(e)}
+                item['index'] = index
+                yield json.dumps(item) + '\n'
+            yield from submit_more()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/start', methods=['POST'])
 def start_assistant():
-    """Start the voice assistant"""
-    if not assistant_state['is_running']:
-        assistant_state['is_running'] = True
-        assistant_state['status'] = 'starting'
-        
-        # Start listening thread
-        thread = threading.Thread(target=listen_and_process, daemon=True)
-        thread.start()
-        
-        socketio.emit('message', {'type': 'system', 'content': 'Voice assistant started!'})
-        speak('Hello! I am your AI assistant with full system control. How can I help you?')
-        
-        return jsonify({'success': True, 'message': 'Assistant started'})
-    return jsonify({'success': False, 'message': 'Already running'}), 400
+    """Start the voice assistant on the server's microphone for the calling session"""
+    global voice_owner
+    session = request_session()
+    if session.state['is_running']:
+        return jsonify({'success': False, 'message': 'Already running'}), 400
+    with voice_lock:
+        if voice_owner is not None and voice_owner is not session and voice_owner.state['is_running']:
+            return jsonify({'success': False, 'message': 'Microphone is in use by another session'}), 409
+        if voice_owner is not None:
+            voice_owner.pinned = False
+        voice_owner = session
+        # A REST-only session has no connection to keep it open while it listens
+        session.pinned = True
+    session.local_audio = True
+    session.state['is_running'] = True
+    session.state['status'] = 'starting'
+    
+    # Start the capture, recognition and processing workers
+    if not voice_pipeline.running:
+        listen_and_process()
+    
+    emit_to(session, 'message', {'type': 'system', 'content': 'Voice assistant started!'})
+    speak(session, 'Hello! I am your AI assistant with full system control. How can I help you?')
+    
+    return jsonify({'success': True, 'message': 'Assistant started'})
 
 @app.route('/api/stop', methods=['POST'])
 def stop_assistant():
-    """Stop the voice assistant"""
-    assistant_state['is_running'] = False
-    assistant_state['status'] = 'idle'
-    socketio.emit('message', {'type': 'system', 'content': 'Voice assistant stopped.'})
+    """Stop the voice assistant for the calling session"""
+    session = request_session()
+    session.state['is_running'] = False
+    session.state['status'] = 'idle'
+    release_voice(session)
+    emit_to(session, 'message', {'type': 'system', 'content': 'Voice assistant stopped.'})
     return jsonify({'success': True, 'message': 'Assistant stopped'})
 
 # WebSocket events
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
+    """Join the client's session room; clients may pass {token} to keep a session across reconnects"""
+    token = auth.get('token') if isinstance(auth, dict) else None
+    try:
+        session = sessions.attach(token or request.sid, request.sid)
+    except SessionLimitError as e:
+        raise ConnectionRefusedError(str(e))
+    join_room(session.room)
     print('Client connected')
-    emit('status_update', {'status': assistant_state['status'], 'color': '#555555'})
+    emit('session', {'id': session.id, 'token': session.key})
+    send_snapshot(session)
+    controller = subsystems.peek('system')
+    if controller is not None:
+        # Until the controller is up, clients get the first telemetry push instead
+        emit('system_info', controller.get_system_info())
+    emit('llm_status', llm_client.breaker.get_stats())
+
+@socketio.on('resync')
+def handle_resync(data=None):
+    """The client missed a frame: send it a fresh snapshot"""
+    session = sessions.for_connection(request.sid)
+    if session is not None:
+        send_snapshot(session)
+
+@socketio.on('audio_start')
+def handle_audio_start(data=None):
+    """Begin streaming microphone audio from this client: {sample_rate}"""
+    session = sessions.for_connection(request.sid)
+    if session is None:
+        return
+    sample_rate = (data or {}).get('sample_rate', 16000)
+    if sample_rate not in AUDIO_SAMPLE_RATES:
+        emit_to(session, 'message', {'type': 'system', 'content': f'Unsupported sample rate {sample_rate}'})
+        return
+    if session.audio is None or session.audio.sample_rate != sample_rate:
+        session.audio = AudioSegmenter(sample_rate)
+    session.state['is_running'] = True
+    set_status(session, 'listening', '#00d9ff')
+
+@socketio.on('audio_chunk')
+def handle_audio_chunk(data):
+    """One binary frame of 16-bit mono PCM from the client's microphone"""
+    session = sessions.for_connection(request.sid)
+    if session is None or session.audio is None or not isinstance(data, (bytes, bytearray)):
+        return
+    if len(data) > MAX_AUDIO_CHUNK_BYTES:
+        return
+    session.touch()
+    segments = session.audio.feed(data)
+    if segments:
+        submit_segments(session, segments)
+
+@socketio.on('audio_stop')
+def handle_audio_stop(data=None):
+    session = sessions.for_connection(request.sid)
+    if session is None or session.audio is None:
+        return
+    submit_segments(session, session.audio.flush())
+    session.state['is_running'] = False
+    set_status(session, 'idle', '#555555')
 
 @socketio.on('disconnect')
-def handle_disconnect():
+def handle_disconnect(*args):
+    sessions.detach(request.sid)
     print('Client disconnected')
 
 if __name__ == '__main__':
     print("🚀 Starting Flask backend server...")
     port = int(os.environ.get('PORT', 5000))
     print(f"📡 Server running on port {port}")
+    if not LAZY_START:
+        subsystems.start_all()
     socketio.run(app, host='0.0.0.0', port=port, allow_unsafe_werkzeug=True)
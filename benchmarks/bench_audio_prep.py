@@ -0,0 +1,80 @@
+"""Recognizer upload size and time: native-rate FLAC vs the prepared 16 kHz upload
+
+Builds speech-like captures at common device rates, encodes each the way the
+Google recognizer used to receive it (FLAC at the device rate, untrimmed) and
+the way audio_prep sends it now (silence trimmed, 16 kHz, gain normalised,
+FLAC), and reports payload size, encode time and the transfer time over an
+uplink of --uplink-kbps, i.e. what each upload adds to recognition latency.
+
+Usage: python benchmarks/bench_audio_prep.py [--uplink-kbps 256] [--rounds 5] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import speech_recognition as sr
+
+from audio_prep import AudioPreprocessor
+
+RATES = (16000, 44100, 48000)
+
+
+def capture(rate, rng):
+    """1 s of room noise, 1.5 s of voiced buzz, 1.5 s of room noise"""
+    t = np.arange(int(1.5 * rate)) / rate
+    voiced = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6)) * (0.55 + 0.45 * np.sin(2 * np.pi * 4 * t)) * 2500
+    samples = np.concatenate([rng.randn(rate) * 60, voiced + rng.randn(len(t)) * 60, rng.randn(int(1.5 * rate)) * 60])
+    return sr.AudioData(samples.astype('<i2').tobytes(), rate, 2)
+
+
+def timed(fn, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (time.perf_counter() - started) * 1000 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uplink-kbps', type=float, default=256, help='simulated upload bandwidth')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(3)
+    preprocessor = AudioPreprocessor(workers=1)
+    bytes_per_ms = args.uplink_kbps * 1000 / 8 / 1000
+    results = {}
+    for rate in RATES:
+        audio = capture(rate, rng)
+        native, native_ms = timed(lambda: audio.get_flac_data(convert_width=2), args.rounds)
+        prepared, prepared_ms = timed(lambda: preprocessor.prepare(audio), args.rounds)
+        upload = prepared.flac_data or prepared.frame_data
+        results[rate] = {
+            'native_bytes': len(native),
+            'native_encode_ms': round(native_ms, 1),
+            'native_upload_ms': round(len(native) / bytes_per_ms, 1),
+            'prepared_bytes': len(upload),
+            'prepared_encode_ms': round(prepared_ms, 1),
+            'prepared_upload_ms': round(len(upload) / bytes_per_ms, 1),
+        }
+
+    if args.json:
+        print(json.dumps({'uplink_kbps': args.uplink_kbps, 'rates': results}, indent=2))
+        return
+    print(f"4 s capture, uplink {args.uplink_kbps:.0f} kbit/s")
+    for rate, r in results.items():
+        before = r['native_encode_ms'] + r['native_upload_ms']
+        after = r['prepared_encode_ms'] + r['prepared_upload_ms']
+        print(f"  {rate:>5} Hz  native {r['native_bytes'] / 1024:6.1f} KiB ({before:6.0f} ms)   "
+              f"prepared {r['prepared_bytes'] / 1024:6.1f} KiB ({after:6.0f} ms)   "
+              f"encode {r['prepared_encode_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
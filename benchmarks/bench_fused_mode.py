@@ -0,0 +1,135 @@
+"""Fused parse-and-answer request vs the two-call parse-then-answer flow
+
+Runs every utterance through both flows against the configured OpenAI endpoint
+(OPENAI_API_KEY / OPENAI_BASE_URL) with the caches bypassed, and reports p50/p95
+latency to the final action or answer plus calls and tokens per utterance.
+
+Usage: python benchmarks/bench_fused_mode.py [--rounds N] [--file utterances.txt] [--json]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client
+from backend_server import (
+    Model, COMMAND_PARSER_PROMPT, GENERAL_SYSTEM_PROMPT, FUSED_PROMPT, FUSED_RESPONSE_FORMAT,
+    parse_fused_response,
+)
+
+# Utterances the local router does not handle, weighted towards general questions
+UTTERANCES = [
+    "what is the capital of france", "tell me a joke", "how far away is the moon",
+    "who wrote war and peace", "explain what an api is in one sentence", "how do i boil an egg",
+    "what's a good name for a cat", "give me a fun fact", "make a new folder called reports",
+    "create a file named notes.txt", "how busy is my machine right now", "go to wikipedia",
+]
+
+
+def _usage(completion):
+    usage = getattr(completion, 'usage', None)
+    return usage.total_tokens if usage is not None else 0
+
+
+def _chat(system_prompt, query, **options):
+    return llm_client.create_completion(
+        model=Model,
+        messages=[{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': query}],
+        **options
+    )
+
+
+def two_call(query):
+    """Parse first; answer with a second request for general questions. Returns (calls, tokens)"""
+    completion = _chat(COMMAND_PARSER_PROMPT, query, max_tokens=150)
+    tokens = _usage(completion)
+    try:
+        action = json.loads(completion.choices[0].message.content).get('action')
+    except (ValueError, AttributeError):
+        action = 'general_query'
+    if action != 'general_query':
+        return 1, tokens
+    completion = _chat(GENERAL_SYSTEM_PROMPT, query, max_tokens=200)
+    return 2, tokens + _usage(completion)
+
+
+def fused(query):
+    """One structured request that returns the action or the answer. Returns (calls, tokens)"""
+    completion = _chat(FUSED_PROMPT, query, response_format=FUSED_RESPONSE_FORMAT, max_tokens=300)
+    parse_fused_response(completion.choices[0].message.content)
+    return 1, _usage(completion)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def run(flow, utterances, rounds):
+    latencies, calls, tokens, errors = [], [], [], 0
+    for _ in range(rounds):
+        for query in utterances:
+            started = time.perf_counter()
+            try:
+                made, used = flow(query)
+            except Exception as e:
+                errors += 1
+                print(f"  {flow.__name__} failed on {query!r}: {e}", file=sys.stderr)
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            calls.append(made)
+            tokens.append(used)
+    if not latencies:
+        return {'utterances': 0, 'errors': errors}
+    return {
+        'utterances': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'calls_per_utterance': sum(calls) / len(calls),
+        'tokens_per_utterance': sum(tokens) / len(tokens),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--file', help='one utterance per line (defaults to a built-in set)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    if llm_client.get_client() is None:
+        sys.exit("No API key configured (set OPENAI_API_KEY)")
+
+    utterances = UTTERANCES
+    if args.file:
+        with open(args.file, encoding='utf-8') as handle:
+            utterances = [line.strip() for line in handle if line.strip()]
+
+    # Both flows share the pool; warm it so neither pays for the first TLS handshake
+    warm = llm_client.warm_up()
+    if warm is not None:
+        warm.join()
+
+    results = {'two_call': run(two_call, utterances, args.rounds), 'fused': run(fused, utterances, args.rounds)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{len(utterances)} utterances x {args.rounds} rounds, model {Model}")
+    for name, stats in results.items():
+        if not stats['utterances']:
+            print(f"  {name:<9} no successful requests ({stats['errors']} errors)")
+            continue
+        print(f"  {name:<9} p50 {stats['p50_ms']:7.0f} ms   p95 {stats['p95_ms']:7.0f} ms   "
+              f"{stats['calls_per_utterance']:.2f} calls   {stats['tokens_per_utterance']:6.1f} tokens/utterance"
+              f"   ({stats['errors']} errors)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Cold-start import time of the backend, with a regression budget
+
+Imports backend_server in fresh interpreters under `python -X importtime`,
+takes the fastest of --rounds runs as the cold-start time and lists the
+slowest of its direct imports. Exits non-zero if that time is over --budget-ms,
+or if any module that should load lazily (the OpenAI client, the TTS driver,
+psutil, pyautogui) is imported before the server could bind its port.
+
+Usage: python benchmarks/bench_import_time.py [--budget-ms 1000] [--rounds 3] [--top 10] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cold-start budget for importing backend_server (ms)
+BUDGET_MS = float(os.getenv('ASSISTANT_IMPORT_BUDGET_MS', '1000'))
+# Loaded in the background or on first use; importing any of these at startup is a regression
+LAZY_MODULES = ('openai', 'pyttsx3', 'psutil', 'pyautogui')
+
+
+def measure(module):
+    """(ms to import `module`, {its direct imports: cumulative ms}, every module imported) for one fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    total, children, imported = 0.0, {}, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # the column header
+        # Each nesting level indents the name by two more spaces; a module is
+        # listed after everything it imported
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        imported.add(name)
+        if depth == 1:
+            children[name] = int(cumulative) / 1000
+        elif depth == 0 and name == module:
+            total = int(cumulative) / 1000
+    return total, children, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='backend_server', help='module whose import is timed')
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+    parser.add_argument('--rounds', type=int, default=3, help='fresh interpreters; the fastest counts')
+    parser.add_argument('--top', type=int, default=10, help='slowest direct imports to list')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.rounds)]
+    total, children, imported = min(runs, key=lambda run: run[0])
+    slowest = sorted(children.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    eager = [name for name in LAZY_MODULES if name in imported]
+    over = total > args.budget_ms
+
+    if args.json:
+        print(json.dumps({
+            'module': args.module,
+            'total_ms': round(total, 1),
+            'runs_ms': [round(run[0], 1) for run in runs],
+            'budget_ms': args.budget_ms,
+            'slowest': {name: round(ms, 1) for name, ms in slowest},
+            'eager_lazy_modules': eager,
+            'ok': not over and not eager,
+        }, indent=2))
+    else:
+        print(f"import {args.module}: {total:.0f} ms (budget {args.budget_ms:.0f} ms, "
+              f"best of {args.rounds})")
+        for name, ms in slowest:
+            print(f"  {ms:8.1f} ms  {name}")
+        if eager:
+            print(f"Imported at startup but should load lazily: {', '.join(eager)}")
+        if over:
+            print(f"Over budget by {total - args.budget_ms:.0f} ms")
+    sys.exit(1 if over or eager else 0)
+
+
+if __name__ == '__main__':
+    main()
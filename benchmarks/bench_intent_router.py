@@ -0,0 +1,179 @@
+"""Micro-benchmark: compiled intent router vs the original cascaded parser
+
+Times both parsers on generated utterances, then scores them on a labelled
+set of real-world phrasings (inflections, run-together words, app names after
+"restart") that the generator does not produce.
+
+Usage: python benchmarks/bench_intent_router.py [--count N] [--seed S]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import IntentRouter
+
+
+def legacy_parse_command_locally(query):
+    """The substring-cascade parser that shipped before the intent router"""
+    query_lower = query.lower()
+
+    if "open" in query_lower or "launch" in query_lower or "start" in query_lower:
+        for app in ['chrome', 'calculator', 'notepad', 'paint', 'edge', 'explorer', 'vs code', 'word', 'excel']:
+            if app in query_lower:
+                return {"action": "open_app", "parameters": {"app_name": app}, "confirmation_needed": False}
+
+        if any(site in query_lower for site in ['youtube', 'google', 'facebook', 'twitter', 'instagram', '.com', '.org']):
+            words = query_lower.split()
+            for word in words:
+                if '.com' in word or '.org' in word or word in ['youtube', 'google', 'facebook']:
+                    return {"action": "open_website", "parameters": {"url": word}, "confirmation_needed": False}
+
+    if "search" in query_lower or "google" in query_lower:
+        search_query = query_lower.replace("search for", "").replace("search", "").replace("google", "").strip()
+        return {"action": "search_google", "parameters": {"query": search_query}, "confirmation_needed": False}
+
+    if "screenshot" in query_lower or "capture screen" in query_lower:
+        return {"action": "take_screenshot", "parameters": {}, "confirmation_needed": False}
+
+    if "close" in query_lower or "exit" in query_lower:
+        for app in ['chrome', 'calculator', 'notepad', 'paint', 'edge']:
+            if app in query_lower:
+                return {"action": "close_app", "parameters": {"app_name": app}, "confirmation_needed": False}
+
+    if "system" in query_lower and ("info" in query_lower or "status" in query_lower or "usage" in query_lower):
+        return {"action": "system_info", "parameters": {}, "confirmation_needed": False}
+
+    if "lock" in query_lower:
+        return {"action": "lock_screen", "parameters": {}, "confirmation_needed": False}
+
+    if "shutdown" in query_lower or "shut down" in query_lower:
+        return {"action": "shutdown", "parameters": {}, "confirmation_needed": True}
+    if "restart" in query_lower or "reboot" in query_lower:
+        return {"action": "restart", "parameters": {}, "confirmation_needed": True}
+
+    return None
+
+
+TEMPLATES = [
+    "open {app}", "please launch {app} for me", "can you start {app}", "open {site}",
+    "open {domain}", "search for {topic}", "google {topic}", "take a screenshot",
+    "capture screen now", "close {close_app}", "exit {close_app} please", "show system info",
+    "what is my system usage", "lock the computer", "shutdown the computer", "please shut down",
+    "restart my pc", "reboot", "what is the capital of {country}", "tell me a joke",
+    "how far away is the moon", "who wrote {book}", "what can you do", "play some music",
+]
+FILLERS = {
+    'app': ['chrome', 'calculator', 'notepad', 'paint', 'edge', 'explorer', 'vs code', 'word', 'excel'],
+    'close_app': ['chrome', 'calculator', 'notepad', 'paint', 'edge'],
+    'site': ['youtube', 'facebook', 'google'],
+    'domain': ['github.com', 'wikipedia.org', 'python.org', 'news.ycombinator.com'],
+    'topic': ['python tutorials', 'best restaurants near me', 'weather in delhi', 'react hooks'],
+    'country': ['france', 'india', 'japan', 'brazil'],
+    'book': ['hamlet', 'the hobbit', 'war and peace'],
+}
+
+# Real-world phrasings and the action each should route to (None: leave it to the model)
+LABELLED = [
+    ("show my system information", 'system_info'),
+    ("what are my system stats", 'system_info'),
+    ("launching chrome", 'open_app'),
+    ("opening notepad", 'open_app'),
+    ("lockscreen", 'lock_screen'),
+    ("lock my computer", 'lock_screen'),
+    ("googled it", 'search_google'),
+    ("searching for cheap flights", 'search_google'),
+    ("take a screen shot", 'take_screenshot'),
+    ("closing paint now", 'close_app'),
+    ("restart chrome", 'open_app'),
+    ("please restart spotify", None),
+    ("shut down notepad", 'close_app'),
+    ("shutdown chrome", 'close_app'),
+    ("shut down word", None),
+    ("turn off computer", 'shutdown'),
+    ("turn off the lights", None),
+    ("shut down spotify", None),
+    ("restart my pc", 'restart'),
+    ("restart the computer right now", 'restart'),
+    ("reboot", 'restart'),
+    ("please shut down", 'shutdown'),
+    ("shutting down the laptop", 'shutdown'),
+    ("power off the computer", 'shutdown'),
+    ("what time is it on the clock", None),
+    ("is the store open on sunday", None),
+]
+
+
+def score(parser):
+    """(correct, [(utterance, expected, got)] for the misses) on the labelled phrasings"""
+    misses = []
+    for utterance, expected in LABELLED:
+        result = parser(utterance)
+        got = result['action'] if result else None
+        if got != expected:
+            misses.append((utterance, expected, got))
+    return len(LABELLED) - len(misses), misses
+
+
+def make_utterances(count, seed):
+    rng = random.Random(seed)
+    utterances = []
+    for _ in range(count):
+        template = rng.choice(TEMPLATES)
+        values = {key: rng.choice(options) for key, options in FILLERS.items()}
+        utterances.append(template.format(**values))
+    return utterances
+
+
+def run(parser, utterances, repeat):
+    """Return (best total seconds, hit count) over `repeat` passes"""
+    best = float('inf')
+    hits = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = 0
+        for utterance in utterances:
+            if parser(utterance) is not None:
+                hits += 1
+        best = min(best, time.perf_counter() - start)
+    return best, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    utterances = make_utterances(args.count, args.seed)
+
+    build_start = time.perf_counter()
+    router = IntentRouter()
+    build_time = time.perf_counter() - build_start
+
+    results = {
+        'legacy': run(legacy_parse_command_locally, utterances, args.repeat),
+        'router': run(router.route, utterances, args.repeat),
+    }
+
+    agree = sum(1 for u in utterances if legacy_parse_command_locally(u) == router.route(u))
+
+    print(f"{len(utterances)} utterances, best of {args.repeat} runs (router build: {build_time * 1e3:.2f} ms)")
+    for name, (seconds, hits) in results.items():
+        per_query = seconds / len(utterances) * 1e6
+        print(f"  {name:<7} {per_query:8.2f} us/query   hit rate {hits / len(utterances):6.1%}")
+    print(f"  agreement with legacy parser: {agree / len(utterances):.1%}")
+    print(f"{len(LABELLED)} labelled real-world phrasings")
+    for name, fn in (('legacy', legacy_parse_command_locally), ('router', router.route)):
+        correct, misses = score(fn)
+        print(f"  {name:<7} {correct}/{len(LABELLED)} routed as expected")
+        for utterance, expected, got in misses:
+            print(f"    {utterance!r}: expected {expected}, got {got}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Cost of the stage probes on the hot path, and of rendering /metrics
+
+Times `with metrics.stage(...)` with metrics on and off, from one thread and
+from several at once, and how long a scrape of the registry takes. Compares
+the probe cost with an utterance's stage count: the voice loop passes through
+about ten stages, each taking milliseconds.
+
+Usage: python benchmarks/bench_metrics.py [--calls 200000] [--threads 4] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+STAGES = ('capture', 'prep', 'recognize', 'local_parse', 'model_parse', 'execute', 'completion',
+          'first_token', 'tts', 'process')
+
+
+def probe_ns(calls):
+    started = time.perf_counter()
+    for index in range(calls):
+        with metrics.stage(STAGES[index % len(STAGES)]):
+            pass
+    return (time.perf_counter() - started) * 1e9 / calls
+
+
+def threaded_probe_ns(calls, threads):
+    workers = [threading.Thread(target=probe_ns, args=(calls // threads,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) * 1e9 / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    metrics.METRICS_ENABLED = False
+    off_ns = probe_ns(args.calls)
+    metrics.METRICS_ENABLED = True
+    on_ns = probe_ns(args.calls)
+    threaded_ns = threaded_probe_ns(args.calls, args.threads)
+    for action in ('open_app', 'system_info', 'take_screenshot', 'top_processes'):
+        metrics.observe_action(action, 0.01)
+    started = time.perf_counter()
+    text = metrics.render()
+    render_ms = (time.perf_counter() - started) * 1000
+
+    results = {
+        'probe_off_ns': round(off_ns),
+        'probe_on_ns': round(on_ns),
+        'probe_threaded_ns': round(threaded_ns),
+        'per_utterance_us': round(on_ns * len(STAGES) / 1000, 1),
+        'render_ms': round(render_ms, 2),
+        'render_bytes': len(text),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"stage probe: {on_ns:.0f} ns on, {off_ns:.0f} ns off, {threaded_ns:.0f} ns per call "
+          f"across {args.threads} threads")
+    print(f"per utterance ({len(STAGES)} stages): {results['per_utterance_us']} us")
+    print(f"/metrics render: {render_ms:.2f} ms, {len(text)} bytes")
+
+
+if __name__ == '__main__':
+    main()
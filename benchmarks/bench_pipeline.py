@@ -0,0 +1,582 @@
+"""End-to-end voice pipeline benchmark, fully offline
+
+Drives the real backend voice loop (/api/start -> listen_and_process ->
+capture, recognize, process_query) with everything outside the process
+replaced by a stand-in:
+
+- a local OpenAI-compatible HTTP server with configurable latency, which
+  answers command parsing, fused and streamed general requests
+- WAV fixtures played into the pipeline in place of the microphone: synthetic
+  speech-like recordings by default, or a folder of recordings with .txt
+  transcripts (--fixtures)
+- the fake speech recognizer, which returns each fixture's transcript
+- a no-op TTS driver that takes --tts-ms per sentence
+- a sandboxed SystemController that records actions instead of running them
+
+Utterances are played one at a time: the next one starts when the previous
+answer has been spoken. Reports p50/p95/p99 for every stage and end to end,
+and throughput. Writes JSON results with --out. With --compare it exits
+non-zero if any p95 regressed by more than --tolerance against an earlier
+result.
+
+Usage: python benchmarks/bench_pipeline.py [--rounds 5] [--model-ms 300] [--out results.json]
+                                           [--compare baseline.json] [--json]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import speech_recognition as sr
+
+RATE = 16000
+# (transcript, what the fake model parses it to); None means a general question
+UTTERANCES = [
+    ('open notepad', None),
+    ('take a screenshot', None),
+    ('what is my system usage', None),
+    ('search google for pasta recipes', None),
+    ('could you make a folder called reports', {'action': 'create_folder', 'parameters': {'path': 'reports'}}),
+    ('which programs are hogging memory', {'action': 'top_processes', 'parameters': {'sort': 'memory'}}),
+    ('what is the capital of france', None),
+    ('tell me a joke about computers', None),
+    ('explain how a rainbow forms', None),
+]
+STAGES = ('capture', 'prep', 'recognize', 'local_parse', 'model_parse', 'execute', 'answer',
+          'process', 'first_audio', 'speak', 'end_to_end')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 2),
+        'p50': round(percentile(values, 0.50), 2),
+        'p95': round(percentile(values, 0.95), 2),
+        'p99': round(percentile(values, 0.99), 2),
+    }
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is normal
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeModelServer:
+    """OpenAI-compatible chat completions on 127.0.0.1 with simulated latency
+
+    Every request waits `latency_ms` (plus up to `jitter_ms`) before its first
+    byte; streamed answers then send one word every `token_ms`. Command
+    parsing requests get the command listed for the utterance in `commands`,
+    anything else is a general query.
+    """
+
+    def __init__(self, commands, latency_ms=300, jitter_ms=50, token_ms=15):
+        self.commands = commands
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_ms = token_ms
+        self.requests = 0
+        self._server = _QuietServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-model', daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}/v1'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def delay(self):
+        time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    def reply(self, body):
+        """Message content for one chat completion request"""
+        system = body['messages'][0]['content']
+        query = body['messages'][-1]['content']
+        command = self.commands.get(query)
+        if 'response_format' in body:
+            schema = body['response_format']['json_schema']['schema']
+            parameters = dict.fromkeys(schema['properties']['parameters']['properties'])
+            if command:
+                parameters.update(command['parameters'])
+            return json.dumps({
+                'action': command['action'] if command else 'general_query',
+                'parameters': parameters,
+                'confirmation_needed': False,
+                'answer': None if command else self.answer(query),
+            })
+        if system.startswith('You are a command parser'):
+            return json.dumps(command or {'action': 'general_query', 'parameters': {}})
+        return self.answer(query)
+
+    @staticmethod
+    def answer(query):
+        return f"Here is a short answer about {query}. It is made up for the benchmark."
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, data):
+                self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                self.wfile.flush()
+
+            def do_GET(self):
+                self._send_json({'object': 'list', 'data': [{'id': 'fake', 'object': 'model'}]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.requests += 1
+                content = server.reply(body)
+                server.delay()
+                if not body.get('stream'):
+                    self._send_json({
+                        'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': content}}],
+                        'usage': {'prompt_tokens': 50, 'completion_tokens': len(content.split()), 'total_tokens': 60},
+                    })
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                words = content.split(' ')
+                for index, word in enumerate(words):
+                    if index:
+                        time.sleep(server.token_ms / 1000)
+                    chunk = {'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': body['model'],
+                             'choices': [{'index': 0, 'finish_reason': None,
+                                          'delta': {'content': word if index == 0 else ' ' + word}}]}
+                    self._send_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+                self._send_chunk(b'data: [DONE]\n\n')
+                self._send_chunk(b'')
+
+        return Handler
+
+
+class NoopEngine:
+    """pyttsx3-compatible driver that plays nothing and takes `sentence_ms` per sentence"""
+
+    def __init__(self, recorder, sentence_ms=0):
+        self.recorder = recorder
+        self.sentence_ms = sentence_ms
+        self._pending = []
+
+    def say(self, text):
+        self.recorder.mark('first_audio')
+        self._pending.append(text)
+
+    def runAndWait(self):
+        for _ in self._pending:
+            time.sleep(self.sentence_ms / 1000)
+        self._pending = []
+
+
+def sandboxed_controller(directory):
+    """A SystemController whose side effects are recorded, and whose files go to `directory`"""
+    from system_controller import SystemController
+
+    class SandboxController(SystemController):
+        def __init__(self):
+            super().__init__()
+            self.calls = []
+
+        def _record(self, name, message):
+            self.calls.append(name)
+            return message
+
+        def open_application(self, app_name):
+            return self._record('open_application', f"Opening {app_name}")
+
+        def close_application(self, app_name):
+            return self._record('close_application', f"Closed {app_name}")
+
+        def open_website(self, url):
+            return self._record('open_website', f"Opening {url}")
+
+        def search_google(self, query):
+            return self._record('search_google', f"Searching Google for: {query}")
+
+        def take_screenshot(self, filename=None):
+            return self._record('take_screenshot', "Screenshot saved")
+
+        def create_folder(self, path):
+            return super().create_folder(os.path.join(directory, os.path.basename(path)))
+
+        def create_file(self, path, content=""):
+            return super().create_file(os.path.join(directory, os.path.basename(path)), content)
+
+        def lock_screen(self):
+            return self._record('lock_screen', "Screen locked")
+
+        def shutdown_system(self):
+            return self._record('shutdown_system', "System will shutdown in 10 seconds")
+
+        def restart_system(self):
+            return self._record('restart_system', "System will restart in 10 seconds")
+
+    return SandboxController()
+
+
+class FixtureMicrophone:
+    """Stands in for MicrophoneStream: `play` hands one recording to the capture stage"""
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self._phrases = queue.Queue()
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        self._running = True
+
+    def stop(self):
+        self._running = False
+
+    def play(self, audio):
+        # The recording has just finished: capture and end-to-end time start now
+        now = time.perf_counter()
+        self._phrases.put((audio, now, now))
+
+    def listen(self, timeout=None):
+        try:
+            phrase = self._phrases.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self.recorder.mark('capture')
+        return phrase
+
+    def get_stats(self):
+        return {'running': self._running, 'queued': self._phrases.qsize()}
+
+
+class Recorder:
+    """Stage timings for the utterance currently in flight (one at a time)"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.sources = {'local': 0, 'model': 0}
+        self.current = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.current = {'started': time.perf_counter(), 'marks': {}, 'stages': {}, 'outcome': None}
+            self.done.clear()
+
+    def mark(self, name):
+        """First time `name` happened, counted from the end of the recording"""
+        with self._lock:
+            if self.current is not None and name not in self.current['marks']:
+                self.current['marks'][name] = (time.perf_counter() - self.current['started']) * 1000
+
+    def add(self, stage, elapsed_ms):
+        with self._lock:
+            if self.current is not None:
+                self.current['stages'][stage] = self.current['stages'].get(stage, 0.0) + elapsed_ms
+
+    def finish(self, outcome):
+        with self._lock:
+            if self.current is not None and self.current['outcome'] is None:
+                self.current['outcome'] = outcome
+        self.done.set()
+
+    def commit(self, end_to_end_ms):
+        """Keep the finished utterance's timings; returns its outcome"""
+        with self._lock:
+            utterance, self.current = self.current, None
+        if utterance['outcome'] != 'ok':
+            return utterance['outcome']
+        for stage, elapsed_ms in utterance['stages'].items():
+            self.samples[stage].append(elapsed_ms)
+        for name, elapsed_ms in utterance['marks'].items():
+            self.samples[name].append(elapsed_ms)
+        self.samples['end_to_end'].append(end_to_end_ms)
+        self.sources['model' if 'model_parse' in utterance['stages'] else 'local'] += 1
+        return 'ok'
+
+    def timed(self, stage, fn, on_error=None):
+        """Wrap `fn` so every call adds to `stage`"""
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if on_error:
+                    on_error()
+                raise
+            finally:
+                self.add(stage, (time.perf_counter() - started) * 1000)
+        return wrapper
+
+
+def synthetic_fixtures(directory):
+    """One speech-like WAV per utterance (a buzz whose length follows the word count), with transcripts"""
+    rng = np.random.RandomState(11)
+    paths = []
+    for index, (transcript, _) in enumerate(UTTERANCES):
+        seconds = 0.3 + 0.25 * len(transcript.split())
+        t = np.arange(int(seconds * RATE)) / RATE
+        f0 = 110 + 12 * index
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        voiced *= (0.55 + 0.45 * np.sin(2 * np.pi * 4 * t)) * 3000
+        samples = np.concatenate([rng.randn(RATE // 2) * 60, voiced + rng.randn(len(t)) * 60, rng.randn(RATE) * 60])
+        path = os.path.join(directory, f'{index:02d}.wav')
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(RATE)
+            f.writeframes(np.clip(samples, -32768, 32767).astype('<i2').tobytes())
+        with open(path[:-4] + '.txt', 'w') as f:
+            f.write(transcript)
+        paths.append(path)
+    return paths
+
+
+def load_fixtures(directory):
+    """[(transcript, sr.AudioData)] for every WAV in `directory` that has a .txt transcript"""
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.lower().endswith('.wav') or not os.path.exists(path[:-4] + '.txt'):
+            continue
+        with open(path[:-4] + '.txt') as f:
+            transcript = f.read().strip()
+        with sr.AudioFile(path) as source:
+            fixtures.append((transcript, sr.Recognizer().record(source)))
+    return fixtures
+
+
+def compare(results, baseline_path, tolerance, min_delta_ms):
+    """Print p95 changes against an earlier run; returns the stages that regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressed = []
+    print(f"Against {baseline_path} (p95, tolerance {tolerance:.0f}%):")
+    for stage, summary in results['stages'].items():
+        before = (baseline.get('stages') or {}).get(stage)
+        if not summary or not before:
+            continue
+        change = (summary['p95'] - before['p95']) / before['p95'] * 100 if before['p95'] else 0.0
+        worse = change > tolerance and summary['p95'] - before['p95'] > min_delta_ms
+        if worse:
+            regressed.append(stage)
+        print(f"  {stage:12} {before['p95']:9.1f} -> {summary['p95']:9.1f} ms  {change:+6.1f}%"
+              f"{'  REGRESSED' if worse else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5, help='times every fixture is played')
+    parser.add_argument('--fixtures', help='folder of WAV recordings with .txt transcripts (default: synthetic)')
+    parser.add_argument('--model-ms', type=float, default=300, help='fake model latency to first byte')
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--token-ms', type=float, default=15, help='delay between streamed words')
+    parser.add_argument('--recognizer-ms', type=float, default=150, help='fake recognizer latency')
+    parser.add_argument('--tts-ms', type=float, default=0, help='no-op TTS time per sentence')
+    parser.add_argument('--fused', action='store_true', help='parse and answer in one request (ASSISTANT_FUSED=1)')
+    parser.add_argument('--no-stream', action='store_true', help='request whole answers (ASSISTANT_STREAM=0)')
+    parser.add_argument('--warm-cache', action='store_true', help='keep response caches between rounds')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds to wait for one utterance')
+    parser.add_argument('--out', help='write JSON results to this file')
+    parser.add_argument('--compare', help='earlier JSON results to check for p95 regressions')
+    parser.add_argument('--tolerance', type=float, default=20, help='allowed p95 increase in percent')
+    parser.add_argument('--min-delta-ms', type=float, default=5, help='smaller p95 increases never count')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    commands = {transcript: command for transcript, command in UTTERANCES if command}
+    model = FakeModelServer(commands, args.model_ms, args.jitter_ms, args.token_ms).start()
+    # Everything the backend reads at import time points at the stand-ins
+    os.environ.update({
+        'OPENAI_API_KEY': 'sk-benchmark',
+        'OPENAI_BASE_URL': model.url,
+        'ASSISTANT_CACHE_DIR': os.path.join(workdir, 'cache'),
+        'ASSISTANT_RECOGNIZERS': 'fake',
+        'ASSISTANT_FAKE_RECOGNIZER_MS': str(args.recognizer_ms),
+        'ASSISTANT_FUSED': '1' if args.fused else '0',
+        'ASSISTANT_STREAM': '0' if args.no_stream else '1',
+    })
+
+    import actions
+    import audio_prep
+    import backend_server as backend
+    import recognizers
+    from tts_pipeline import SpeechPipeline
+
+    recorder = Recorder()
+    controller = sandboxed_controller(os.path.join(workdir, 'sandbox'))
+    os.makedirs(os.path.join(workdir, 'sandbox'))
+    actions.set_controller(controller)
+    backend.microphone = FixtureMicrophone(recorder)
+    backend.tts = SpeechPipeline(lambda: NoopEngine(recorder, args.tts_ms))
+
+    # Time each stage by wrapping the functions the real pipeline calls
+    failed = lambda: recorder.finish('error')
+    preprocessor = audio_prep.preprocessor
+    prepare = recorder.timed('prep', preprocessor.prepare)
+
+    def prepare_or_drop(audio):
+        prepared = prepare(audio)
+        if prepared is None:
+            recorder.finish('dropped')
+        return prepared
+
+    preprocessor.prepare = prepare_or_drop
+    recognizers.recognize = recorder.timed('recognize', recognizers.recognize, failed)
+    backend.parse_command_locally = recorder.timed('local_parse', backend.parse_command_locally)
+    backend.parse_command_with_gpt = recorder.timed('model_parse', backend.parse_command_with_gpt)
+    backend.parse_and_answer_with_gpt = recorder.timed('model_parse', backend.parse_and_answer_with_gpt)
+    actions.dispatch = recorder.timed('execute', actions.dispatch)
+    backend.stream_general_answer = recorder.timed('answer', backend.stream_general_answer)
+    backend.request_general_answer = recorder.timed('answer', backend.request_general_answer)
+    process_query = recorder.timed('process', backend.process_query, failed)
+
+    def process_and_finish(session, query):
+        process_query(session, query)
+        recorder.finish('ok')
+
+    backend.process_query = process_and_finish
+
+    fixture_dir = args.fixtures or os.path.join(workdir, 'fixtures')
+    if not args.fixtures:
+        os.makedirs(fixture_dir)
+        synthetic_fixtures(fixture_dir)
+    fixtures = load_fixtures(fixture_dir)
+    if not fixtures:
+        sys.exit(f"No WAV fixtures with .txt transcripts in {fixture_dir}")
+    # The fake recognizer knows each fixture by its audio as it arrives after preprocessing
+    fake = recognizers.get_recognizer().backends[0]
+    reference = audio_prep.AudioPreprocessor(workers=1)
+    playable = []
+    for transcript, audio in fixtures:
+        prepared = reference.prepare(audio)
+        if prepared is None:
+            print(f"Warning: fixture '{transcript}' holds no detectable speech; skipping it")
+            continue
+        fake.add(prepared, transcript)
+        playable.append((transcript, audio))
+
+    backend.subsystems.get('llm')
+    backend.subsystems.get('system')
+    if not backend.subsystems.ready('llm'):
+        # Every model-routed utterance would "succeed" with an error reply and time nothing
+        model.stop()
+        sys.exit(f"model client did not start: {backend.subsystems.get_status()['subsystems']['llm']['error']}")
+    client = backend.app.test_client()
+    headers = {'X-Session-Token': 'bench'}
+    client.post('/api/start', headers=headers)
+    backend.tts.wait()
+
+    outcomes = {'ok': 0, 'dropped': 0, 'error': 0, 'timeout': 0}
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        if not args.warm_cache:
+            backend.response_cache.clear()
+            backend.command_cache.clear()
+        for transcript, audio in playable:
+            recorder.begin()
+            backend.microphone.play(audio)
+            if not recorder.done.wait(args.timeout):
+                recorder.finish('timeout')
+            # The turn ends when the answer has been spoken
+            speaking = time.perf_counter()
+            backend.tts.wait()
+            end = time.perf_counter()
+            recorder.add('speak', (end - speaking) * 1000)
+            outcome = recorder.commit((end - recorder.current['started']) * 1000)
+            outcomes[outcome] += 1
+    elapsed = time.perf_counter() - started
+    client.post('/api/stop', headers=headers)
+    model.stop()
+
+    results = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('out', 'compare', 'json')},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'utterances': sum(outcomes.values()),
+        'outcomes': outcomes,
+        'sources': recorder.sources,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(outcomes['ok'] / elapsed, 3) if elapsed else None,
+        'model_requests': model.requests,
+        'sandboxed_actions': len(controller.calls),
+        'stages': {stage: summarize(values) for stage, values in recorder.samples.items()},
+    }
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{results['utterances']} utterances in {elapsed:.1f} s: {outcomes}, "
+              f"{results['throughput_per_s']} per second; {recorder.sources['local']} parsed locally, "
+              f"{recorder.sources['model']} by the model ({model.requests} model requests)")
+        print(f"  {'stage':12} {'count':>5} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+        for stage, summary in results['stages'].items():
+            if summary:
+                print(f"  {stage:12} {summary['count']:5} {summary['p50']:9.1f} {summary['p95']:9.1f} "
+                      f"{summary['p99']:9.1f}")
+    # Utterances the model should have parsed never reached it: its timings mean nothing
+    unserved = recorder.sources['model'] and not model.requests
+    if unserved:
+        print(f"{recorder.sources['model']} utterances were routed to the model but it got no requests")
+    regressed = compare(results, args.compare, args.tolerance, args.min_delta_ms) if args.compare else []
+    sys.exit(1 if regressed or unserved or outcomes['ok'] < results['utterances'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Speech recognizer backends compared on the same recordings
+
+Transcribes every WAV file in --dir with each backend and reports p50/p95
+latency, failures and word error rate against the expected transcript, which
+is read from a .txt file next to each WAV (same name). Use it on each host to
+pick ASSISTANT_RECOGNIZERS: the fastest backend whose error rate is acceptable
+goes first. Without --dir, synthetic clips are run through the fake backend
+with --fake-ms of simulated latency, which exercises the chain and the race.
+
+Usage: python benchmarks/bench_recognizers.py [--dir recordings/] [--backends google,offline] [--json]
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import speech_recognition as sr
+
+import recognizers
+
+SYNTHETIC = ['open youtube', 'show system info', 'what is the capital of france', 'take a screenshot']
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] if ordered else None
+
+
+def load_recordings(directory):
+    """(name, AudioData, expected transcript) for every WAV with a matching .txt"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.wav'))):
+        transcript = os.path.splitext(path)[0] + '.txt'
+        if not os.path.exists(transcript):
+            print(f"Warning: {os.path.basename(path)} has no .txt transcript; skipping it")
+            continue
+        with sr.AudioFile(path) as source:
+            audio = sr.Recognizer().record(source)
+        with open(transcript, encoding='utf-8') as f:
+            samples.append((os.path.basename(path), audio, f.read().strip()))
+    return samples
+
+
+def synthetic_samples(fake):
+    """One distinct tone per phrase, registered with the fake backend"""
+    samples = []
+    for index, text in enumerate(SYNTHETIC):
+        t = np.arange(16000) / 16000
+        pcm = (np.sin(2 * np.pi * (300 + 100 * index) * t) * 8000).astype('<i2').tobytes()
+        audio = sr.AudioData(pcm, 16000, 2)
+        fake.add(audio, text)
+        samples.append((f'tone-{index}', audio, text))
+    return samples
+
+
+def run(backend, samples, rounds):
+    latencies, failures, word_errors = [], 0, []
+    for _ in range(rounds):
+        for _, audio, expected in samples:
+            started = time.perf_counter()
+            try:
+                text = backend.transcribe(audio)
+            except (sr.UnknownValueError, sr.RequestError):
+                failures += 1
+                word_errors.append(1.0)
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            word_errors.append(recognizers.word_error_rate(expected, text))
+    return {
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'failures': failures,
+        'wer': sum(word_errors) / len(word_errors) if word_errors else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', help='folder of WAV files with .txt transcripts')
+    parser.add_argument('--backends', default=None, help='comma-separated (default: all installed)')
+    parser.add_argument('--rounds', type=int, default=1)
+    parser.add_argument('--fake-ms', type=float, default=50, help='fake backend latency without --dir')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    fake = recognizers.FakeBackend(default='', latency_ms=args.fake_ms)
+    if args.dir:
+        samples = load_recordings(args.dir)
+        names = args.backends or 'google,offline'
+    else:
+        samples = synthetic_samples(fake)
+        names = args.backends or 'fake'
+    if not samples:
+        sys.exit("No recordings to run")
+
+    results = {}
+    for name in [n.strip() for n in names.split(',') if n.strip()]:
+        backend = fake if name == 'fake' else recognizers.BACKENDS[name]()
+        if not backend.available():
+            print(f"Warning: {name} is not installed; skipping it")
+            continue
+        results[name] = run(backend, samples, args.rounds)
+
+    if args.json:
+        print(json.dumps({'samples': len(samples), 'rounds': args.rounds, 'backends': results}, indent=2))
+        return
+    print(f"{len(samples)} recordings x {args.rounds} rounds")
+    for name, result in results.items():
+        p50 = f"{result['p50_ms']:.0f}" if result['p50_ms'] is not None else '-'
+        p95 = f"{result['p95_ms']:.0f}" if result['p95_ms'] is not None else '-'
+        wer = f"{result['wer']:.1%}" if result['wer'] is not None else '-'
+        print(f"  {name:8} p50 {p50:>6} ms   p95 {p95:>6} ms   failures {result['failures']:3}   WER {wer}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Voice-activity detection on synthetic WAV fixtures
+
+Writes a set of synthetic recordings (speech-like voiced audio padded with
+room noise, plus silence, hiss, a click and mains hum), reads them back as the
+microphone would deliver them, and checks that the VAD keeps the speech,
+rejects the rest, and how many bytes and recognition calls that saves. Exits
+non-zero if any fixture gets the wrong decision.
+
+Usage: python benchmarks/bench_vad.py [--out fixtures/] [--rounds 50] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import speech_recognition as sr
+
+from vad import VoiceActivityDetector
+
+RATE = 16000
+
+
+def _room(seconds, rng, level=60):
+    return rng.randn(int(seconds * RATE)) * level
+
+
+def _voiced(seconds, f0=140, syllables_per_second=4):
+    """Harmonic buzz with a syllable-rate envelope, roughly like vowels"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    wave_ = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+    envelope = 0.55 + 0.45 * np.sin(2 * np.pi * syllables_per_second * t)
+    return wave_ * envelope * 4000
+
+
+def fixtures():
+    """name -> (samples, should contain speech)"""
+    rng = np.random.RandomState(7)
+    t = np.arange(RATE) / RATE
+    click = _room(2, rng)
+    click[RATE:RATE + 400] += 12000 * rng.randn(400)
+    return {
+        'speech_padded': (np.concatenate([_room(1.5, rng), _voiced(1.2), _room(2.5, rng)]), True),
+        'speech_two_words': (np.concatenate([_room(0.8, rng), _voiced(0.5), _room(0.4, rng),
+                                             _voiced(0.6, f0=180), _room(1.5, rng)]), True),
+        'speech_unpadded': (_voiced(1.0) + _room(1.0, rng), True),
+        'silence': (_room(4, rng), False),
+        'hiss': (rng.randn(3 * RATE) * 3000, False),
+        'click': (click, False),
+        'hum': (np.sin(2 * np.pi * 50 * np.arange(3 * RATE) / RATE) * 2500 + _room(3, rng), False),
+        'tone_short': (np.concatenate([_room(1, rng), np.sin(2 * np.pi * 440 * t[:1600]) * 6000, _room(1, rng)]), False),
+    }
+
+
+def write_wav(path, samples):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(np.clip(samples, -32768, 32767).astype('<i2').tobytes())
+
+
+def read_wav(path):
+    with sr.AudioFile(path) as source:
+        return sr.Recognizer().record(source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', help='keep the generated WAV fixtures in this folder')
+    parser.add_argument('--rounds', type=int, default=50, help='timing repetitions per fixture')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    directory = args.out or tempfile.mkdtemp(prefix='vad-fixtures-')
+    os.makedirs(directory, exist_ok=True)
+    detector = VoiceActivityDetector()
+    results, wrong = {}, 0
+    for name, (samples, expected) in fixtures().items():
+        path = os.path.join(directory, f'{name}.wav')
+        write_wav(path, samples)
+        audio = read_wav(path)
+        kept = detector.filter(audio)
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            detector.find_speech(audio.frame_data, audio.sample_rate)
+        per_call_ms = (time.perf_counter() - started) * 1000 / args.rounds
+        ok = (kept is not None) == expected
+        wrong += not ok
+        results[name] = {
+            'expected_speech': expected,
+            'kept': kept is not None,
+            'seconds_in': round(len(audio.frame_data) / (2 * RATE), 2),
+            'seconds_out': round(len(kept.frame_data) / (2 * RATE), 2) if kept is not None else 0,
+            'ms': round(per_call_ms, 3),
+            'ok': ok,
+        }
+
+    stats = detector.get_stats()
+    if args.json:
+        print(json.dumps({'fixtures': results, 'stats': stats, 'directory': directory}, indent=2))
+    else:
+        print(f"Fixtures in {directory}")
+        for name, r in results.items():
+            verdict = 'kept' if r['kept'] else 'rejected'
+            print(f"  {name:18} {verdict:8} {r['seconds_in']:5.2f} s -> {r['seconds_out']:5.2f} s   "
+                  f"{r['ms']:.3f} ms   {'ok' if r['ok'] else 'WRONG'}")
+        print(f"Saved {stats['bytes_saved'] / 1024:.0f} KiB of {stats['bytes_in'] / 1024:.0f} KiB uploaded "
+              f"and {stats['calls_saved']} of {stats['captures']} recognition calls")
+    if not args.out:
+        for name in results:
+            os.remove(os.path.join(directory, f'{name}.wav'))
+        os.rmdir(directory)
+    sys.exit(1 if wrong else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Load test: hundreds of concurrent assistant sessions in one backend process
+
+Connects N Socket.IO test clients (each with its own session token), submits
+utterances to every session at once and checks that each client receives
+exactly its own replies. Model latency is simulated with --work-ms so the run
+needs no API key, microphone or network. Also checks admission control (the
+clients beyond --max-sessions must be refused) and idle reaping.
+
+Usage: python benchmarks/load_sessions.py [--sessions 300] [--utterances 5] [--workers 8]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+
+UTTERANCES = ['show system info', 'what is my system usage']
+
+
+def _payload(event):
+    args = event['args']
+    return args[0] if isinstance(args, list) else args
+
+
+def _events(received):
+    """(name, data) for every event in the batched frames a client received"""
+    for event in received:
+        if event['name'] == 'events':
+            for name, data in _payload(event)['events']:
+                yield name, data
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=300)
+    parser.add_argument('--utterances', type=int, default=5, help='utterances per session')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--max-sessions', type=int, default=None, help='defaults to --sessions')
+    parser.add_argument('--extra', type=int, default=10, help='clients to connect beyond the limit')
+    parser.add_argument('--work-ms', type=float, default=200, help='simulated model latency per utterance')
+    args = parser.parse_args()
+
+    max_sessions = args.max_sessions or args.sessions
+    os.environ['ASSISTANT_MAX_SESSIONS'] = str(max_sessions)
+    os.environ['ASSISTANT_SESSION_WORKERS'] = str(args.workers)
+    os.environ['ASSISTANT_SESSION_MAX_PENDING'] = str(max(args.utterances, 1))
+
+    import backend_server as backend
+
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+
+    connect_started = time.perf_counter()
+    clients, refused = [], 0
+    for index in range(args.sessions + args.extra):
+        client = backend.socketio.test_client(backend.app, auth={'token': f'load-{index}'})
+        if client.is_connected():
+            clients.append(client)
+        else:
+            refused += 1
+    connect_ms = (time.perf_counter() - connect_started) * 1000
+    for client in clients:
+        client.get_received()
+
+    work_seconds = args.work_ms / 1000
+
+    def handle(session, query):
+        time.sleep(work_seconds)  # stands in for the model round trip
+        backend.process_query(session, query)
+
+    started = time.perf_counter()
+    jobs = []
+    for index in range(len(clients)):
+        session = backend.sessions.get(f'load-{index}')
+        for n in range(args.utterances):
+            submitted = time.perf_counter()
+            future = backend.sessions.submit(session, handle, session, UTTERANCES[n % len(UTTERANCES)])
+            future.add_done_callback(lambda f, s=submitted: setattr(f, 'latency_ms', (time.perf_counter() - s) * 1000))
+            jobs.append(future)
+    for future in jobs:
+        future.result()
+    elapsed = time.perf_counter() - started
+    rss_peak = process.memory_info().rss
+
+    # Every client must see its own replies and nobody else's
+    backend.event_bus.flush_all()
+    leaked = 0
+    for client in clients:
+        replies = [data for name, data in _events(client.get_received())
+                   if name == 'message' and data.get('type') == 'assistant']
+        if len(replies) != args.utterances:
+            leaked += 1
+
+    latencies = [f.latency_ms for f in jobs]
+    ideal = len(jobs) * work_seconds / args.workers
+
+    for client in clients:
+        client.disconnect()
+    backend.sessions.idle_timeout = 0
+    reaped = len(backend.sessions.reap())
+    stats = backend.sessions.get_stats()
+
+    print(f"{len(clients)} sessions admitted, {refused} refused (limit {max_sessions}); connect {connect_ms:.0f} ms total")
+    print(f"{len(jobs)} utterances on {args.workers} workers, {args.work_ms:.0f} ms simulated model time each")
+    print(f"  wall {elapsed:.2f} s (ideal {ideal:.2f} s)   throughput {len(jobs) / elapsed:.0f} utterances/s")
+    print(f"  latency p50 {percentile(latencies, 0.5):.0f} ms   p95 {percentile(latencies, 0.95):.0f} ms   "
+          f"p99 {percentile(latencies, 0.99):.0f} ms")
+    print(f"  sessions with missing or foreign replies: {leaked}")
+    events = backend.event_bus.get_stats()
+    print(f"  events {events['published']} sent in {events['frames']} frames ({events['coalesced']} status updates coalesced)")
+    print(f"  RSS +{(rss_peak - rss_before) / 2**20:.1f} MiB ({(rss_peak - rss_before) / max(len(clients), 1) / 1024:.1f} KiB/session)")
+    print(f"  reaped after disconnect: {reaped}; active now {stats['active']}; job errors {stats['job_errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# How long events for one session are collected before they go out together
+# (milliseconds; 0 sends each event at once, still as a one-event frame)
+EVENT_WINDOW_MS = float(os.getenv('ASSISTANT_EVENT_WINDOW_MS', '30'))
+# Finished messages kept per session for the snapshot a reconnecting client resyncs from
+EVENT_HISTORY = int(os.getenv('ASSISTANT_EVENT_HISTORY', '100'))
+# Within one window only the latest of these events is sent
+COALESCED_EVENTS = ('status_update',)
+# Recently dropped rooms remembered so late publishes for them are discarded
+DROPPED_ROOMS = 1024
+
+
+class _Channel:
+    """Pending events, sequence number and snapshot state for one room"""
+
+    def __init__(self, history):
+        self.seq = 0
+        self.pending = []
+        self.scheduled = False
+        self.status = None
+        self.messages = deque(maxlen=history)
+        # Streamed answers still in progress: message id -> message so far
+        self.streams = {}
+        # Held while a frame or snapshot is sent, so the room sees them in seq order
+        self.send_lock = threading.Lock()
+
+    def add(self, event, data):
+        """Queue one event; returns 'coalesced' or 'merged' when it replaced or joined a pending one"""
+        if event in COALESCED_EVENTS:
+            for index, (name, _) in enumerate(self.pending):
+                if name == event:
+                    del self.pending[index]
+                    self.pending.append((event, data))
+                    return 'coalesced'
+        elif event == 'message_delta' and not data.get('final') and self.pending:
+            name, last = self.pending[-1]
+            if name == event and last['id'] == data['id'] and not last.get('final'):
+                # Consecutive tokens of one answer become one delta
+                self.pending[-1] = (event, dict(last, delta=last['delta'] + data['delta'], seq=data['seq']))
+                return 'merged'
+        self.pending.append((event, data))
+        return None
+
+    def record(self, events):
+        """Fold events that have been sent into the snapshot state"""
+        now = time.time()
+        for name, data in events:
+            if name == 'status_update':
+                self.status = data
+            elif name == 'message':
+                self.messages.append(dict(data, time=now))
+            elif name == 'message_delta' and data.get('final'):
+                stream = self.streams.pop(data['id'], None)
+                content = data.get('content')
+                self.messages.append({
+                    'id': data['id'],
+                    'type': data['type'],
+                    'content': content if content is not None else (stream['content'] if stream else ''),
+                    'first_token_ms': data.get('first_token_ms'),
+                    'time': stream['time'] if stream else now,
+                })
+            elif name == 'message_delta':
+                stream = self.streams.setdefault(data['id'], {
+                    'id': data['id'], 'type': data['type'], 'content': '', 'streaming': True, 'time': now,
+                })
+                stream['content'] += data['delta']
+                stream['seq'] = data['seq']
+
+    def snapshot(self):
+        messages = [dict(message) for message in self.messages]
+        messages.extend(dict(stream) for stream in self.streams.values())
+        return {'seq': self.seq, 'status': self.status, 'messages': messages}
+
+
+class EventBus:
+    """Per-session Socket.IO delivery: coalesced, batched and sequence-numbered
+
+    Events published for a room within `window_ms` of the first one go out as
+    a single frame, {seq, events: [[name, data], ...]}, through
+    `send(room, frame)`. Within a frame only the latest status update is kept,
+    and consecutive tokens of a streamed answer are merged into one delta.
+    Frame numbers increase by one per room, so a client that sees a gap (or
+    reconnects) asks for a snapshot of the status and recent messages, which
+    `resync` sends in order with the frames around it.
+    """
+
+    def __init__(self, send, window_ms=EVENT_WINDOW_MS, history=EVENT_HISTORY):
+        self._send = send
+        self.window = window_ms / 1000
+        self.history = history
+        self._channels = {}
+        # Rooms of closed sessions; a job still finishing for one must not recreate its channel
+        self._dropped = OrderedDict()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        # (due time, room); every window has the same length, so this stays in due order
+        self._due = deque()
+        self._thread = None
+        self.stats = {'published': 0, 'frames': 0, 'coalesced': 0, 'merged': 0, 'snapshots': 0, 'send_errors': 0,
+                      'discarded': 0}
+
+    def _channel(self, room):
+        channel = self._channels.get(room)
+        if channel is None:
+            channel = self._channels[room] = _Channel(self.history)
+        return channel
+
+    def publish(self, room, event, data):
+        """Queue an event for `room`; it goes out with the room's next frame (dropped rooms get nothing)"""
+        with self._lock:
+            if room in self._dropped:
+                self.stats['discarded'] += 1
+                return
+            channel = self._channel(room)
+            self.stats['published'] += 1
+            outcome = channel.add(event, data)
+            if outcome:
+                self.stats[outcome] += 1
+            send_now = self.window <= 0
+            if not send_now and not channel.scheduled:
+                channel.scheduled = True
+                self._due.append((time.monotonic() + self.window, room))
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='event-bus', daemon=True)
+                    self._thread.start()
+                self._ready.notify()
+        if send_now:
+            self.flush(room)
+
+    def flush(self, room):
+        """Send everything pending for `room` as one frame now"""
+        channel = self._channels.get(room)
+        if channel is None:
+            return
+        with channel.send_lock:
+            with self._lock:
+                channel.scheduled = False
+                if not channel.pending:
+                    return
+                events, channel.pending = channel.pending, []
+                channel.seq += 1
+                seq = channel.seq
+                channel.record(events)
+                self.stats['frames'] += 1
+            try:
+                self._send(room, {'seq': seq, 'events': [[name, data] for name, data in events]})
+            except Exception as e:
+                self.stats['send_errors'] += 1
+                print(f"Warning: could not deliver events to {room}: {e}")
+
+    def flush_all(self):
+        for room in list(self._channels):
+            self.flush(room)
+
+    def resync(self, room, send):
+        """Call `send(snapshot)` with {seq, status, messages} for `room`
+
+        Frames numbered up to `seq` are part of the snapshot; later ones follow it.
+        """
+        with self._lock:
+            if room in self._dropped:
+                # A late request from a closed session: answer it without reviving the room
+                self.stats['snapshots'] += 1
+                empty = {'seq': 0, 'status': None, 'messages': []}
+            else:
+                channel = self._channel(room)
+                empty = None
+        if empty is not None:
+            send(empty)
+            return
+        with channel.send_lock:
+            with self._lock:
+                snapshot = channel.snapshot()
+                self.stats['snapshots'] += 1
+            send(snapshot)
+
+    def drop(self, room):
+        """Forget a room whose session has closed and ignore anything published to it later"""
+        with self._lock:
+            self._channels.pop(room, None)
+            self._dropped[room] = True
+            if len(self._dropped) > DROPPED_ROOMS:
+                self._dropped.popitem(last=False)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._due:
+                    self._ready.wait()
+                due, room = self._due[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._ready.wait(delay)
+                    continue
+                self._due.popleft()
+            self.flush(room)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['rooms'] = len(self._channels)
+            stats['pending'] = sum(len(channel.pending) for channel in self._channels.values())
+        stats['window_ms'] = self.window * 1000
+        # Socket.IO frames saved by batching, coalescing and merging
+        stats['frames_saved'] = stats['published'] - stats['frames']
+        return stats
@@ -2,9 +2,23 @@ import { useState, useEffect, useRef } from 'react'
 import { io } from 'socket.io-client'
 import axios from 'axios'
 import './App.css'
+import { startMicStream } from './micStream'
+import { applyMessageEvents, lastStatus, messagesFromSnapshot } from './serverEvents'
 
 const API_URL = 'http://localhost:5000'
-const socket = io(API_URL)
+
+// One assistant session per browser tab; the token keeps it across reconnects
+const getSessionToken = () => {
+  let token = sessionStorage.getItem('assistantSessionToken')
+  if (!token) {
+    token = window.crypto?.randomUUID?.() ?? `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+    sessionStorage.setItem('assistantSessionToken', token)
+  }
+  return token
+}
+const SESSION_TOKEN = getSessionToken()
+axios.defaults.headers.common['X-Session-Token'] = SESSION_TOKEN
+const socket = io(API_URL, { auth: { token: SESSION_TOKEN } })
 
 function App() {
   const [isRunning, setIsRunning] = useState(false)
@@ -12,7 +26,12 @@ function App() {
   const [statusColor, setStatusColor] = useState('#555555')
   const [messages, setMessages] = useState([])
   const [systemInfo, setSystemInfo] = useState({})
+  const [llmStatus, setLlmStatus] = useState(null)
+  const [isStreaming, setIsStreaming] = useState(false)
+  const stopStreamRef = useRef(null)
   const messagesEndRef = useRef(null)
+  // Number of the last event frame applied; null while waiting for a snapshot
+  const lastSeqRef = useRef(null)
 
   useEffect(() => {
     // Socket event listeners
@@ -20,25 +39,55 @@ function App() {
       console.log('Connected to server')
     })
 
-    socket.on('status_update', (data) => {
-      setStatus(data.status)
-      setStatusColor(data.color)
+    // Status and chat events come batched; a gap in the frame numbers means
+    // one was missed, so the state is rebuilt from a snapshot instead
+    socket.on('events', (frame) => {
+      const last = lastSeqRef.current
+      if (last === null || frame.seq <= last) return
+      if (frame.seq !== last + 1) {
+        lastSeqRef.current = null
+        socket.emit('resync')
+        return
+      }
+      lastSeqRef.current = frame.seq
+      const statusUpdate = lastStatus(frame.events)
+      if (statusUpdate) {
+        setStatus(statusUpdate.status)
+        setStatusColor(statusUpdate.color)
+      }
+      setMessages(prev => applyMessageEvents(prev, frame.events))
+    })
+
+    // Sent on connect and on resync: frames up to snapshot.seq are already in it
+    socket.on('snapshot', (snapshot) => {
+      lastSeqRef.current = snapshot.seq
+      if (snapshot.status) {
+        setStatus(snapshot.status.status)
+        setStatusColor(snapshot.status.color)
+      }
+      setIsRunning(snapshot.is_running)
+      setMessages(messagesFromSnapshot(snapshot))
     })
 
-    socket.on('message', (data) => {
-      const timestamp = new Date().toLocaleTimeString()
-      setMessages(prev => [...prev, { ...data, timestamp }])
+    // The server pushes a new sample whenever system info changes
+    socket.on('system_info', (data) => {
+      setSystemInfo(data)
+    })
+
+    // Circuit breaker around model calls: pushed on connect and on every state change
+    socket.on('llm_status', (data) => {
+      setLlmStatus(data)
     })
 
-    // Fetch system info periodically
-    const interval = setInterval(fetchSystemInfo, 5000)
     fetchSystemInfo()
 
     return () => {
-      clearInterval(interval)
       socket.off('connect')
-      socket.off('status_update')
-      socket.off('message')
+      socket.off('events')
+      socket.off('snapshot')
+      socket.off('system_info')
+      socket.off('llm_status')
+      stopStreamRef.current?.()
     }
   }, [])
 
@@ -61,6 +110,11 @@ function App() {
       setIsRunning(true)
     } catch (error) {
       console.error('Error starting assistant:', error)
+      // e.g. the server's microphone is already in use by another session
+      const reason = error.response?.data?.message
+      if (reason) {
+        setMessages(prev => [...prev, { type: 'system', content: reason, timestamp: new Date().toLocaleTimeString() }])
+      }
     }
   }
 
@@ -75,6 +129,26 @@ function App() {
     }
   }
 
+  const addSystemMessage = (content) => {
+    setMessages(prev => [...prev, { type: 'system', content, timestamp: new Date().toLocaleTimeString() }])
+  }
+
+  const handleToggleBrowserMic = async () => {
+    if (stopStreamRef.current) {
+      stopStreamRef.current()
+      stopStreamRef.current = null
+      setIsStreaming(false)
+      return
+    }
+    try {
+      stopStreamRef.current = await startMicStream(socket)
+      setIsStreaming(true)
+    } catch (error) {
+      console.error('Error starting browser microphone:', error)
+      addSystemMessage(`Could not use this browser's microphone: ${error.message}`)
+    }
+  }
+
   const getMessageClass = (type) => {
     switch(type) {
       case 'user': return 'message-user'
@@ -108,6 +182,13 @@ function App() {
               </div>
               <p className="status-text">{status}</p>
             </div>
+            {llmStatus && (
+              <p className={`llm-status llm-status-${llmStatus.state}`}>
+                Model: {llmStatus.state === 'closed' ? 'available' : llmStatus.state === 'open' ? 'paused' : 'retrying'}
+                {llmStatus.trips > 0 && ` · ${llmStatus.trips} trip${llmStatus.trips === 1 ? '' : 's'}`}
+                {llmStatus.state === 'open' && llmStatus.last_trip_reason && ` (${llmStatus.last_trip_reason})`}
+              </p>
+            )}
           </div>
 
           {/* Control Buttons */}
@@ -126,6 +207,12 @@ function App() {
             >
               ⏹ Stop Assistant
             </button>
+            <button
+              className="btn btn-mic"
+              onClick={handleToggleBrowserMic}
+            >
+              {isStreaming ? "⏹ Stop Browser Mic" : "🎙 Use This Browser's Mic"}
+            </button>
           </div>
 
           {/* System Info */}
@@ -163,10 +250,13 @@ function App() {
               </div>
             ) : (
               messages.map((msg, index) => (
-                <div key={index} className={`message ${getMessageClass(msg.type)}`}>
+                <div key={msg.id || index} className={`message ${getMessageClass(msg.type)}${msg.streaming ? ' message-streaming' : ''}`}>
                   <span className="timestamp">[{msg.timestamp}]</span>
                   <span className="message-type">{msg.type}:</span>
                   <span className="message-content">{msg.content}</span>
+                  {msg.firstTokenMs != null && (
+                    <span className="message-meta">first token {Math.round(msg.firstTokenMs)} ms</span>
+                  )}
                 </div>
               ))
             )}
@@ -0,0 +1,37 @@
+// Streams this browser's microphone to the backend as binary Socket.IO frames
+// (16-bit mono PCM, ~100 ms per frame); the server segments utterances itself
+
+const CHUNK_MS = 100
+const PREFERRED_SAMPLE_RATE = 16000
+
+export async function startMicStream(socket) {
+  const stream = await navigator.mediaDevices.getUserMedia({
+    audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true }
+  })
+
+  let context
+  try {
+    context = new AudioContext({ sampleRate: PREFERRED_SAMPLE_RATE })
+  } catch {
+    // Some browsers only run at the hardware rate; the server accepts common rates
+    context = new AudioContext()
+  }
+  await context.audioWorklet.addModule(new URL('./pcmCaptureWorklet.js', import.meta.url))
+
+  const source = context.createMediaStreamSource(stream)
+  const capture = new AudioWorkletNode(context, 'pcm-capture', {
+    processorOptions: { chunkSamples: Math.round(context.sampleRate * CHUNK_MS / 1000) }
+  })
+  capture.port.onmessage = (event) => socket.emit('audio_chunk', event.data)
+
+  socket.emit('audio_start', { sample_rate: context.sampleRate })
+  source.connect(capture)
+
+  return () => {
+    source.disconnect()
+    capture.port.onmessage = null
+    stream.getTracks().forEach(track => track.stop())
+    context.close()
+    socket.emit('audio_stop')
+  }
+}
@@ -0,0 +1,27 @@
+// Runs on the audio thread: converts the first input channel to 16-bit PCM and
+// posts it in fixed-size chunks, transferring each buffer instead of copying it
+class PcmCapture extends AudioWorkletProcessor {
+  constructor(options) {
+    super()
+    this.chunkSamples = options.processorOptions.chunkSamples
+    this.buffer = new Int16Array(this.chunkSamples)
+    this.length = 0
+  }
+
+  process(inputs) {
+    const channel = inputs[0] && inputs[0][0]
+    if (!channel) return true
+    for (let i = 0; i < channel.length; i++) {
+      const sample = Math.max(-1, Math.min(1, channel[i]))
+      this.buffer[this.length++] = sample < 0 ? sample * 0x8000 : sample * 0x7fff
+      if (this.length === this.chunkSamples) {
+        this.port.postMessage(this.buffer.buffer, [this.buffer.buffer])
+        this.buffer = new Int16Array(this.chunkSamples)
+        this.length = 0
+      }
+    }
+    return true
+  }
+}
+
+registerProcessor('pcm-capture', PcmCapture)
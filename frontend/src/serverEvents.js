@@ -0,0 +1,55 @@
+// The server batches each session's events into sequence-numbered frames,
+// {seq, events: [[name, data], ...]}, and sends a snapshot on connect or resync
+
+const timeOf = (seconds) => (seconds ? new Date(seconds * 1000) : new Date()).toLocaleTimeString()
+
+// Applies every message and message_delta event in a frame to the list in one
+// pass; the list is copied once, not once per event
+export function applyMessageEvents(prev, events) {
+  let next = null
+  const timestamp = timeOf()
+  for (const [name, data] of events) {
+    if (name !== 'message' && name !== 'message_delta') continue
+    next = next ?? prev.slice()
+    if (name === 'message') {
+      next.push({ ...data, timestamp })
+      continue
+    }
+    // Streamed answers arrive as deltas and are appended to the message in place
+    const index = next.findIndex(msg => msg.id === data.id)
+    if (index === -1) {
+      next.push({
+        id: data.id,
+        type: data.type,
+        content: data.final ? data.content : data.delta,
+        seq: data.seq,
+        streaming: !data.final,
+        firstTokenMs: data.first_token_ms,
+        timestamp
+      })
+      continue
+    }
+    const current = next[index]
+    if (data.seq <= current.seq) continue
+    next[index] = data.final
+      ? { ...current, content: data.content ?? current.content, seq: data.seq, streaming: false, firstTokenMs: data.first_token_ms }
+      : { ...current, content: current.content + data.delta, seq: data.seq }
+  }
+  return next ?? prev
+}
+
+// The latest status update in a frame, or null if it has none
+export function lastStatus(events) {
+  for (let i = events.length - 1; i >= 0; i--) {
+    if (events[i][0] === 'status_update') return events[i][1]
+  }
+  return null
+}
+
+export function messagesFromSnapshot(snapshot) {
+  return snapshot.messages.map(({ time, first_token_ms, ...message }) => ({
+    ...message,
+    firstTokenMs: first_token_ms,
+    timestamp: timeOf(time)
+  }))
+}
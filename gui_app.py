@@ -3,17 +3,52 @@ from tkinter import ttk, scrolledtext
 import threading
 import queue
 from datetime import datetime
-from openai import OpenAI
-from apikey import api_data 
 import speech_recognition as sr
 import pyttsx3
 import json
+import time
 from system_controller import SystemController
+from intent_router import parse_command_locally
+from response_cache import ResponseCache, collapse_whitespace
+from tts_pipeline import SpeechPipeline
+from voice_pipeline import StagePipeline
+from audio_stream import MicrophoneStream
+import llm_client
+import actions
+import recognizers
+import audio_prep
 
 # Initialize
 Model = "gpt-4o"
-client = OpenAI(api_key=api_data)
+GENERAL_SYSTEM_PROMPT = "You are a helpful assistant"
 sys_controller = SystemController()
+actions.set_controller(sys_controller)
+response_cache = ResponseCache()
+
+# Actions and their parameters come from the shared action registry
+COMMAND_PARSER_PROMPT = f"""You are a command parser for a voice-controlled system assistant. 
+Analyze the user's voice command and determine what action to take.
+
+Available actions, with their parameters:
+{actions.registry.describe()}, {actions.GENERAL_QUERY} (a general question or conversation)
+Set "confirmation_needed" to true for {' and '.join(actions.registry.confirmed_actions())}.
+
+Respond ONLY with a JSON object:
+{{"action": "action_name", "parameters": {{"param1": "value1"}}, "confirmation_needed": true/false}}
+"""
+
+# Parsed commands are memoised across restarts and dropped whenever the prompt changes;
+# keyed on the utterance as said, since parameters are copied out of it
+command_cache = ResponseCache(table='gui_commands', ttl=None, max_disk_entries=2000,
+                              version=COMMAND_PARSER_PROMPT, bypass_time_sensitive=False,
+                              normalize=collapse_whitespace)
+
+def create_tts_engine():
+    """Build the TTS engine (called on the speech thread)"""
+    engine = pyttsx3.init('sapi5')
+    voices = engine.getProperty('voices')
+    engine.setProperty('voice', voices[0].id)
+    return engine
 
 class VoiceAssistantGUI:
     def __init__(self, root):
@@ -28,11 +63,20 @@ class VoiceAssistantGUI:
         # State variables
         self.is_listening = False
         self.is_running = False
-        
-        # Initialize text-to-speech
-        self.engine = pyttsx3.init('sapi5')
-        voices = self.engine.getProperty('voices')
-        self.engine.setProperty('voice', voices[0].id)
+        # Shutdown or restart waiting for the user to say yes
+        self.pending_confirmation = None
+        
+        # Initialize text-to-speech (sentences are spoken on a background thread)
+        self.tts = SpeechPipeline(create_tts_engine)
+        
+        # Capture, recognition and processing each run on their own worker
+        self.microphone = MicrophoneStream()
+        self.voice_pipeline = (
+            StagePipeline('voice', on_error=self.report_pipeline_error)
+            .add_source('capture', self.capture_audio)
+            .add_stage('recognize', self.recognize_audio, maxsize=4)
+            .add_stage('process', self.process_query, maxsize=4)
+        )
         
         self.create_widgets()
         self.check_message_queue()
@@ -205,15 +249,25 @@ class VoiceAssistantGUI:
             info_text += f"Disk: {info['disk_usage']}\n"
             info_text += f"Available RAM: {info['available_memory']}"
             
+            stages = self.voice_pipeline.get_metrics()['stages']
+            info_text += f"\n\nQueued: recognize {stages['recognize']['queue_depth']}, "
+            info_text += f"process {stages['process']['queue_depth']}, speak {self.tts.get_metrics()['queue_depth']}"
+
+            breaker = llm_client.breaker.get_stats()
+            info_text += f"\nModel: {breaker['state'].replace('_', ' ')} ({breaker['trips']} trips)"
+            speech = recognizers.get_stats()['backends']
+            info_text += "\nSpeech: " + ", ".join(
+                f"{name} {b['p50_ms']:.0f} ms" if b['p50_ms'] is not None else name for name, b in speech.items())
+            
             self.info_text.delete('1.0', 'end')
             self.info_text.insert('1.0', info_text)
         except Exception as e:
             self.info_text.delete('1.0', 'end')
             self.info_text.insert('1.0', f"Error: {str(e)}")
         
-        # Update every 5 seconds
+        # Reading the sampler's snapshot is cheap, so refresh at its own rate
         if self.is_running:
-            self.root.after(5000, self.update_system_info)
+            self.root.after(int(sys_controller.telemetry.interval * 1000), self.update_system_info)
     
     def add_message(self, sender, message, tag='user'):
         """Add message to chat display"""
@@ -224,203 +278,157 @@ class VoiceAssistantGUI:
         self.chat_display.see('end')
     
     def speak(self, text):
-        """Text to speech"""
-        try:
-            self.engine.say(text)
-            self.engine.runAndWait()
-        except Exception as e:
-            print(f"TTS Error: {e}")
+        """Queue text for speech without blocking the caller"""
+        return self.tts.say(text)
     
     def parse_command_locally(self, query):
         """Parse common commands locally without API"""
-        query_lower = query.lower()
-        
-        # Open application commands
-        if "open" in query_lower or "launch" in query_lower or "start" in query_lower:
-            for app in ['chrome', 'calculator', 'notepad', 'paint', 'edge', 'explorer', 'vs code', 'word', 'excel']:
-                if app in query_lower:
-                    return {"action": "open_app", "parameters": {"app_name": app}, "confirmation_needed": False}
-            
-            # Check for websites
-            if any(site in query_lower for site in ['youtube', 'google', 'facebook', 'twitter', 'instagram', '.com', '.org']):
-                # Extract URL
-                words = query_lower.split()
-                for word in words:
-                    if '.com' in word or '.org' in word or word in ['youtube', 'google', 'facebook']:
-                        return {"action": "open_website", "parameters": {"url": word}, "confirmation_needed": False}
-        
-        # Search commands
-        if "search" in query_lower or "google" in query_lower:
-            search_query = query_lower.replace("search for", "").replace("search", "").replace("google", "").strip()
-            return {"action": "search_google", "parameters": {"query": search_query}, "confirmation_needed": False}
-        
-        # Screenshot
-        if "screenshot" in query_lower or "capture screen" in query_lower:
-            return {"action": "take_screenshot", "parameters": {}, "confirmation_needed": False}
-        
-        # Close application
-        if "close" in query_lower or "exit" in query_lower:
-            for app in ['chrome', 'calculator', 'notepad', 'paint', 'edge']:
-                if app in query_lower:
-                    return {"action": "close_app", "parameters": {"app_name": app}, "confirmation_needed": False}
-        
-        # System info
-        if "system" in query_lower and ("info" in query_lower or "status" in query_lower or "usage" in query_lower):
-            return {"action": "system_info", "parameters": {}, "confirmation_needed": False}
-        
-        # Lock screen
-        if "lock" in query_lower:
-            return {"action": "lock_screen", "parameters": {}, "confirmation_needed": False}
-        
-        # Shutdown/Restart
-        if "shutdown" in query_lower or "shut down" in query_lower:
-            return {"action": "shutdown", "parameters": {}, "confirmation_needed": True}
-        if "restart" in query_lower or "reboot" in query_lower:
-            return {"action": "restart", "parameters": {}, "confirmation_needed": True}
-        
-        # If no local match, return general query
-        return None
+        return parse_command_locally(query)
     
     def parse_command_with_gpt(self, query):
         """Parse command using GPT (fallback if local parsing fails)"""
+        cached = command_cache.get(query, Model, COMMAND_PARSER_PROMPT)
+        if cached is not None:
+            return json.loads(cached)
         try:
-            system_prompt = """You are a command parser for a voice-controlled system assistant. 
-Analyze the user's voice command and determine what action to take.
-
-Available actions:
-- open_app: Open an application
-- open_website: Open a website
-- search_google: Search Google
-- create_folder: Create a folder
-- create_file: Create a file
-- take_screenshot: Take a screenshot
-- close_app: Close an application
-- system_info: Get system information
-- lock_screen: Lock the computer
-- shutdown: Shutdown computer
-- restart: Restart computer
-- general_query: General question or conversation
-
-Respond ONLY with a JSON object:
-{"action": "action_name", "parameters": {"param1": "value1"}, "confirmation_needed": true/false}
-"""
-            
-            completion = client.chat.completions.create(
+            completion = llm_client.create_completion(
                 model=Model,
                 messages=[
-                    {'role': "system", 'content': system_prompt},
+                    {'role': "system", 'content': COMMAND_PARSER_PROMPT},
                     {'role': 'user', 'content': query}
                 ],
-                max_tokens=150
+                max_tokens=150,
+                deadline=llm_client.COMMAND_DEADLINE
             )
             
             response = completion.choices[0].message.content
             command_data = json.loads(response)
+            command_cache.put(query, Model, COMMAND_PARSER_PROMPT, json.dumps(command_data))
             return command_data
         except Exception as e:
-            self.message_queue.put(('system', f"GPT Error: {str(e)}", 'system'))
+            self.message_queue.put(('system', f"GPT Error: {llm_client.describe_error(e)}", 'system'))
             return {"action": "general_query", "parameters": {}, "confirmation_needed": False}
     
-    def execute_system_command(self, command_data):
-        """Execute system commands"""
-        action = command_data.get('action')
-        params = command_data.get('parameters', {})
-        
-        result = None
-        
-        if action == 'open_app':
-            result = sys_controller.open_application(params.get('app_name', ''))
-        elif action == 'open_website':
-            result = sys_controller.open_website(params.get('url', ''))
-        elif action == 'search_google':
-            result = sys_controller.search_google(params.get('query', ''))
-        elif action == 'create_folder':
-            result = sys_controller.create_folder(params.get('path', ''))
-        elif action == 'create_file':
-            result = sys_controller.create_file(params.get('path', ''))
-        elif action == 'take_screenshot':
-            result = sys_controller.take_screenshot()
-        elif action == 'close_app':
-            result = sys_controller.close_application(params.get('app_name', ''))
-        elif action == 'system_info':
-            info = sys_controller.get_system_info()
-            result = f"CPU: {info['cpu_usage']}, Memory: {info['memory_usage']}"
-        elif action == 'lock_screen':
-            result = sys_controller.lock_screen()
-        elif action == 'shutdown':
-            result = sys_controller.shutdown_system()
-        elif action == 'restart':
-            result = sys_controller.restart_system()
-        
-        return result
+    def stream_answer(self, query):
+        """Stream a general answer into the TTS pipeline and return the full text"""
+        speech = self.tts.begin()
+        parts = []
+        try:
+            stream = llm_client.create_completion(
+                model=Model,
+                messages=[
+                    {'role': "system", 'content': GENERAL_SYSTEM_PROMPT},
+                    {'role': 'user', 'content': query}
+                ],
+                max_tokens=200,
+                stream=True
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    speech.feed(delta)
+        finally:
+            speech.end()
+        return ''.join(parts)
     
-    def listen_and_process(self):
-        """Main voice processing loop"""
-        r = sr.Recognizer()
-        
-        while self.is_running:
+    def capture_audio(self, _):
+        """Pipeline source: take the next phrase cut from the open microphone stream"""
+        self.message_queue.put(('status', 'Listening...', '#00d9ff'))
+        self.message_queue.put(('system', 'Listening...', 'system'))
+        while self.voice_pipeline.running:
+            phrase = self.microphone.listen(timeout=0.5)
+            if phrase is not None:
+                audio, started, ended = phrase
+                # Trim, resample and encode on the prep pool while capture carries on
+                return audio_prep.submit(audio), started, ended
+        return None
+    
+    def recognize_audio(self, captured):
+        """Pipeline stage: turn captured audio into text"""
+        prepared, started, ended = captured
+        if self.tts.overlaps(started, ended):
+            # The microphone picked up our own speech
+            prepared.cancel()
+            return None
+        audio = prepared.result()
+        if audio is None:
+            # Silence or noise: not worth a recognition call
+            return None
+        
+        self.message_queue.put(('status', 'Recognizing...', '#ffa500'))
+        
+        query = recognizers.recognize(audio)
+        self.message_queue.put(('user', query, 'user'))
+        return query
+    
+    def process_query(self, query):
+        """Pipeline stage: parse, execute and answer one utterance"""
+        # Check for exit
+        if any(word in query.lower() for word in ['bye', 'goodbye', 'exit', 'stop']):
+            self.message_queue.put(('assistant', 'Goodbye! Have a great day!', 'assistant'))
+            self.speak('Goodbye! Have a great day!')
+            self.voice_pipeline.stop()
+            self.microphone.stop()
+            self.tts.wait()  # stopping cancels pending speech, so let the goodbye finish
+            self.message_queue.put(('stop', None, None))
+            return None
+        
+        # Parse and execute - try local parsing first
+        self.message_queue.put(('status', 'Processing...', '#e94560'))
+        
+        if self.pending_confirmation is not None:
+            # The previous utterance asked for a shutdown or restart; this one answers the question
+            pending, self.pending_confirmation = self.pending_confirmation, None
+            result = actions.dispatch(pending, confirmed=True) if 'yes' in query.lower() else 'Action cancelled'
+            self.message_queue.put(('assistant', result, 'assistant'))
+            self.speak(result)
+            self.message_queue.put(('status', 'Ready', '#00ff00'))
+            return None
+        
+        command_data = self.parse_command_locally(query)
+        
+        # If local parsing didn't match, try GPT
+        if command_data is None:
+            command_data = self.parse_command_with_gpt(query)
+        else:
+            self.message_queue.put(('system', f'Action: {command_data.get("action")}', 'system'))
+        
+        if actions.needs_confirmation(command_data):
+            self.pending_confirmation = command_data
+        result = actions.dispatch(command_data)
+        
+        if result:
+            self.message_queue.put(('assistant', result, 'assistant'))
+            self.speak(result)
+        else:
+            # General query - get AI response
             try:
-                with sr.Microphone() as source:
-                    self.message_queue.put(('status', 'Listening...', '#00d9ff'))
-                    self.message_queue.put(('system', 'Listening...', 'system'))
-                    
-                    r.pause_threshold = 1
-                    audio = r.listen(source, timeout=5, phrase_time_limit=10)
-                
-                self.message_queue.put(('status', 'Recognizing...', '#ffa500'))
-                
-                query = r.recognize_google(audio, language='en-in')
-                self.message_queue.put(('user', query, 'user'))
-                
-                # Check for exit
-                if any(word in query.lower() for word in ['bye', 'goodbye', 'exit', 'stop']):
-                    self.message_queue.put(('assistant', 'Goodbye! Have a great day!', 'assistant'))
-                    self.speak('Goodbye! Have a great day!')
-                    self.message_queue.put(('stop', None, None))
-                    break
-                
-                # Parse and execute - try local parsing first
-                self.message_queue.put(('status', 'Processing...', '#e94560'))
-                command_data = self.parse_command_locally(query)
-                
-                # If local parsing didn't match, try GPT
-                if command_data is None:
-                    command_data = self.parse_command_with_gpt(query)
+                answer = response_cache.get(query, Model, GENERAL_SYSTEM_PROMPT)
+                if answer is None:
+                    answer = self.stream_answer(query)
+                    response_cache.put(query, Model, GENERAL_SYSTEM_PROMPT, answer or None)
                 else:
-                    self.message_queue.put(('system', f'Action: {command_data.get("action")}', 'system'))
-                
-                result = self.execute_system_command(command_data)
-                
-                if result:
-                    self.message_queue.put(('assistant', result, 'assistant'))
-                    self.speak(result)
-                else:
-                    # General query - get AI response
-                    try:
-                        completion = client.chat.completions.create(
-                            model=Model,
-                            messages=[
-                                {'role': "system", 'content': "You are a helpful assistant"},
-                                {'role': 'user', 'content': query}
-                            ],
-                            max_tokens=200
-                        )
-                        answer = completion.choices[0].message.content
-                        self.message_queue.put(('assistant', answer, 'assistant'))
-                        self.speak(answer)
-                    except Exception as e:
-                        error_msg = "API quota exceeded. Please check your OpenAI billing."
-                        self.message_queue.put(('assistant', error_msg, 'assistant'))
-                        self.speak(error_msg)
-                
-                self.message_queue.put(('status', 'Ready', '#00ff00'))
-                
-            except sr.WaitTimeoutError:
-                continue
-            except sr.UnknownValueError:
-                self.message_queue.put(('system', 'Could not understand audio', 'system'))
+                    self.speak(answer)
+                self.message_queue.put(('assistant', answer, 'assistant'))
             except Exception as e:
-                self.message_queue.put(('system', f'Error: {str(e)}', 'system'))
+                error_msg = llm_client.describe_error(e)
+                self.message_queue.put(('assistant', error_msg, 'assistant'))
+                self.speak(error_msg)
+        
+        self.message_queue.put(('status', 'Ready', '#00ff00'))
+        return None
+    
+    def report_pipeline_error(self, stage, job, error):
+        if isinstance(error, sr.UnknownValueError):
+            self.message_queue.put(('system', 'Could not understand audio', 'system'))
+        else:
+            self.message_queue.put(('system', f'Error: {str(error)}', 'system'))
+    
+    def listen_and_process(self):
+        """Start the voice pipeline (capture keeps running while earlier utterances are processed)"""
+        self.microphone.start()
+        self.voice_pipeline.start()
     
     def check_message_queue(self):
         """Check for messages from worker thread"""
@@ -448,9 +456,8 @@ Respond ONLY with a JSON object:
         self.add_message('System', 'Voice assistant started!', 'system')
         self.speak('Hello! I am your AI assistant with full system control. How can I help you?')
         
-        # Start listening thread
-        self.listen_thread = threading.Thread(target=self.listen_and_process, daemon=True)
-        self.listen_thread.start()
+        # Start the voice pipeline workers
+        self.listen_and_process()
         
         # Start system info updates
         self.update_system_info()
@@ -458,12 +465,17 @@ Respond ONLY with a JSON object:
     def stop_assistant(self):
         """Stop the voice assistant"""
         self.is_running = False
+        self.voice_pipeline.stop()
+        self.microphone.stop()
+        self.tts.cancel()
         self.start_button.config(state='normal')
         self.stop_button.config(state='disabled')
         self.update_status('Idle', '#555555')
         self.add_message('System', 'Voice assistant stopped.', 'system')
 
 def main():
+    # Open the pooled model connection while the window is built
+    llm_client.warm_up()
     root = tk.Tk()
     app = VoiceAssistantGUI(root)
     root.mainloop()
@@ -0,0 +1,207 @@
+import re
+
+# Trigger phrases grouped by the role they play when resolving an utterance
+OPEN_TRIGGERS = ['open', 'opening', 'launch', 'launching', 'start', 'starting']
+SEARCH_TRIGGERS = ['search for', 'search', 'searching for', 'searching', 'google', 'googled', 'googling']
+SCREENSHOT_TRIGGERS = ['screenshot', 'screenshots', 'screen shot', 'capture screen', 'capture the screen']
+CLOSE_TRIGGERS = ['close', 'closing', 'exit']
+SYSTEM_TRIGGERS = ['system', 'systems', "system's"]
+SYSTEM_DETAIL_TRIGGERS = ['info', 'information', 'status', 'stats', 'statistics', 'usage']
+LOCK_TRIGGERS = ['lock', 'locking', 'lockscreen']
+SHUTDOWN_TRIGGERS = ['shutdown', 'shut down', 'shutting down', 'power off', 'turn off']
+RESTART_TRIGGERS = ['restart', 'restarting', 'reboot', 'rebooting']
+# Words after a shutdown or restart trigger that still mean the whole machine
+# ("restart my pc now"); anything else names an app ("restart chrome") or another thing
+POWER_TARGETS = ['computer', 'pc', 'laptop', 'machine', 'system', 'device', 'windows']
+POWER_FILLERS = ['the', 'my', 'this', 'it', 'now', 'please', 'right', 'away', 'immediately', 'for', 'me']
+# Resource questions ("what's using my CPU"), phrase -> column to rank processes by
+TOP_PROCESS_TRIGGERS = {
+    'using my cpu': 'cpu', 'using the cpu': 'cpu', 'using cpu': 'cpu', 'top processes': 'cpu',
+    'slowing down my computer': 'cpu', 'using my memory': 'memory', 'using the memory': 'memory',
+    'using my ram': 'memory', 'using the most memory': 'memory', 'using memory': 'memory',
+}
+
+# Applications that can be opened or closed by voice
+OPEN_APPS = ['chrome', 'calculator', 'notepad', 'paint', 'edge', 'explorer', 'vs code', 'word', 'excel']
+CLOSE_APPS = ['chrome', 'calculator', 'notepad', 'paint', 'edge']
+
+# Websites recognised by name (name -> url passed to open_website)
+SITES = {'youtube': 'youtube', 'google': 'google', 'facebook': 'facebook'}
+DOMAIN_SUFFIXES = ('.com', '.org')
+
+_DOMAIN_PATTERN = r"[a-z0-9][a-z0-9\-]*(?:\.[a-z0-9\-]+)*(?:%s)" % '|'.join(
+    re.escape(suffix) for suffix in DOMAIN_SUFFIXES)
+
+
+def normalize_phrase(phrase):
+    """Lower-case a phrase and collapse runs of whitespace"""
+    return ' '.join(phrase.lower().split())
+
+
+class IntentRouter:
+    """Routes an utterance to a local command with a single pass over its text
+
+    Every trigger phrase, application name and site name is inserted into one
+    character trie, which is compiled once into a factorised regular expression
+    (a multi-pattern automaton run by the C regex engine). Routing makes a
+    single leftmost-longest scan over the utterance, records the first phrase
+    seen for each kind and then applies the priority rules in `resolve`.
+
+    A scan costs a couple of microseconds, about twice the old cascade of
+    substring tests (see benchmarks/bench_intent_router.py). Whole-word
+    matching is worth that: substrings sent "restart chrome" to `start` and
+    "what time is it on the clock" to `lock`, and either cost is tiny next to
+    the model round trip a local hit saves.
+    """
+
+    def __init__(self, open_apps=None, close_apps=None, sites=None):
+        self._tags = {}
+        self._sites = {}
+
+        self._add_all(OPEN_TRIGGERS, 'open')
+        self._add_all(SEARCH_TRIGGERS, 'search')
+        self._add_all(SCREENSHOT_TRIGGERS, 'screenshot')
+        self._add_all(CLOSE_TRIGGERS, 'close')
+        self._add_all(SYSTEM_TRIGGERS, 'system')
+        self._add_all(SYSTEM_DETAIL_TRIGGERS, 'system_detail')
+        self._add_all(LOCK_TRIGGERS, 'lock')
+        self._add_all(SHUTDOWN_TRIGGERS, 'shutdown')
+        self._add_all(RESTART_TRIGGERS, 'restart')
+        for phrase, sort in TOP_PROCESS_TRIGGERS.items():
+            self._add(phrase, 'top_processes', sort)
+        self._add_all(open_apps if open_apps is not None else OPEN_APPS, 'open_app')
+        self._add_all(close_apps if close_apps is not None else CLOSE_APPS, 'close_app')
+        for name, url in (sites if sites is not None else SITES).items():
+            self._add(name, 'site', url)
+            self._sites[normalize_phrase(name)] = url
+
+        self._pattern = _compile_phrases(self._tags)
+        self._search_pattern = _compile_phrases(SEARCH_TRIGGERS)
+        # Only needed once a shutdown or restart trigger is found
+        self._power_pattern = re.compile(
+            r"\b(?:%s)\b(?P<rest>.*)" % _trie_to_regex(_build_trie(SHUTDOWN_TRIGGERS + RESTART_TRIGGERS)))
+        self._power_targets = set(POWER_TARGETS)
+        self._power_fillers = set(POWER_FILLERS)
+        # Only needed once an open trigger has no app, so kept off the common path
+        self._site_pattern = re.compile(
+            r"\b(?:(?P<domain>%s)|(?P<site>%s))\b" % (_DOMAIN_PATTERN, _trie_to_regex(_build_trie(self._sites)))
+        )
+
+    def _add_all(self, phrases, kind):
+        for phrase in phrases:
+            self._add(phrase, kind, phrase)
+
+    def _add(self, phrase, kind, value):
+        self._tags.setdefault(normalize_phrase(phrase), []).append((kind, value))
+
+    def scan(self, text):
+        """Return {kind: value} for the earliest phrase of each kind in lower-cased text"""
+        found = {}
+        tags = self._tags
+        for phrase in self._pattern.findall(text):
+            entries = tags.get(phrase)
+            if entries is None:
+                entries = tags[normalize_phrase(phrase)]
+            for kind, value in entries:
+                if kind not in found:
+                    found[kind] = value
+        return found
+
+    def route(self, query):
+        """Parse an utterance into command data, or None if nothing local matches"""
+        text = query.lower()
+        return self.resolve(text, self.scan(text))
+
+    def resolve(self, text, found):
+        """Apply the priority rules to the phrases found in an utterance"""
+        if 'open' in found:
+            if 'open_app' in found:
+                return _command('open_app', {'app_name': found['open_app']})
+            match = self._site_pattern.search(text)
+            if match:
+                url = match.group('domain') or self._sites[normalize_phrase(match.group('site'))]
+                return _command('open_website', {'url': url})
+
+        if 'top_processes' in found:
+            return _command('top_processes', {'sort': found['top_processes']})
+
+        if 'search' in found:
+            search_query = ' '.join(self._search_pattern.sub(' ', text).split())
+            return _command('search_google', {'query': search_query})
+
+        if 'screenshot' in found:
+            return _command('take_screenshot', {})
+
+        if 'close' in found and 'close_app' in found:
+            return _command('close_app', {'app_name': found['close_app']})
+
+        if 'system' in found and 'system_detail' in found:
+            return _command('system_info', {})
+
+        if 'lock' in found:
+            return _command('lock_screen', {})
+
+        if 'shutdown' in found or 'restart' in found:
+            if self._targets_machine(text):
+                if 'shutdown' in found:
+                    return _command('shutdown', {}, confirmation_needed=True)
+                return _command('restart', {}, confirmation_needed=True)
+            if 'shutdown' in found:
+                # "shut down notepad": close the app, never the machine
+                if 'close_app' in found:
+                    return _command('close_app', {'app_name': found['close_app']})
+            elif 'open_app' in found:
+                # "restart chrome": bring the app up, never the machine down
+                return _command('open_app', {'app_name': found['open_app']})
+
+        return None
+
+    def _targets_machine(self, text):
+        """True if a shutdown/restart trigger is followed by nothing but the machine or filler words"""
+        match = self._power_pattern.search(text)
+        words = set(re.findall(r"[a-z']+", match.group('rest'))) if match else set()
+        return bool(words & self._power_targets) or words <= self._power_fillers
+
+
+def _build_trie(phrases):
+    """Character trie of normalised phrases; the '' key marks the end of a phrase"""
+    root = {}
+    for phrase in phrases:
+        node = root
+        for char in normalize_phrase(phrase):
+            node = node.setdefault(char, {})
+        node[''] = True
+    return root
+
+
+def _trie_to_regex(node):
+    """Compile a character trie into a regex that shares common prefixes"""
+    terminal = '' in node
+    branches = []
+    for char in sorted(key for key in node if key):
+        piece = r'\s+' if char == ' ' else re.escape(char)
+        branches.append(piece + _trie_to_regex(node[char]))
+    if not branches:
+        return ''
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+    pattern = '(?:' + '|'.join(branches) + ')'
+    return pattern + '?' if terminal else pattern
+
+
+def _compile_phrases(phrases):
+    """Whole-word, leftmost-longest matcher for a set of phrases"""
+    return re.compile(r"\b(?:%s)\b" % _trie_to_regex(_build_trie(phrases)))
+
+
+def _command(action, parameters, confirmation_needed=False):
+    return {"action": action, "parameters": parameters, "confirmation_needed": confirmation_needed}
+
+
+# Shared router compiled once at import time
+default_router = IntentRouter()
+
+
+def parse_command_locally(query):
+    """Parse common commands locally without API"""
+    return default_router.route(query)
@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from resilience import (
+    CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, backoff_delay, hedged,
+)
+
+# Try to import api_data from apikey.py (local dev), otherwise use env var
+try:
+    from apikey import api_data
+except ImportError:
+    api_data = os.getenv('OPENAI_API_KEY')
+
+# Connection pool and timeout tuning (seconds); each can be overridden from the environment
+CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('OPENAI_READ_TIMEOUT', '30'))
+MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '20'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE', '10'))
+# Idle connections are kept open this long, well past the gap between two voice commands
+KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', '300'))
+MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+# Total time budget per call across retries, and the tighter one for command parsing
+DEFAULT_DEADLINE = float(os.getenv('OPENAI_DEADLINE', '20'))
+COMMAND_DEADLINE = float(os.getenv('OPENAI_COMMAND_DEADLINE', '8'))
+# Send a second copy of a non-streaming request still unanswered after this long (0 = off)
+HEDGE_AFTER = float(os.getenv('OPENAI_HEDGE_AFTER', '0'))
+# Consecutive transient failures that open the breaker, and how long it stays open
+BREAKER_THRESHOLD = int(os.getenv('OPENAI_BREAKER_THRESHOLD', '5'))
+BREAKER_RESET = float(os.getenv('OPENAI_BREAKER_RESET', '30'))
+# Quota and auth errors do not clear up by retrying, so they pause model calls for longer
+BREAKER_FATAL_RESET = float(os.getenv('OPENAI_BREAKER_FATAL_RESET', '300'))
+
+# Errors worth retrying, and errors that open the breaker straight away
+RETRYABLE = ('rate_limit', 'connection', 'timeout', 'server')
+FATAL = ('quota', 'auth')
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised when a model call is made but no API key is configured"""
+
+
+def classify_error(error):
+    """Bucket a model call failure: quota, auth, rate_limit, timeout, connection, server, circuit_open or error"""
+    import openai
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, (DeadlineExceeded, openai.APITimeoutError)):
+        return 'timeout'
+    if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError, LLMUnavailable)):
+        return 'auth'
+    if isinstance(error, openai.RateLimitError):
+        code = getattr(error, 'code', None)
+        return 'quota' if code == 'insufficient_quota' or 'insufficient_quota' in str(error) else 'rate_limit'
+    if isinstance(error, openai.APIConnectionError):
+        return 'connection'
+    if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+        return 'server'
+    return 'error'
+
+
+def describe_error(error):
+    """A short message for the user explaining why the model could not answer"""
+    kind = classify_error(error)
+    if kind == 'circuit_open':
+        return (f"The language model is unavailable right now (retrying in {error.retry_after:.0f} seconds). "
+                "Local commands such as opening apps still work.")
+    if kind == 'quota':
+        return "API quota exceeded. Please check your OpenAI billing."
+    if kind == 'auth':
+        return "The OpenAI API key is missing or was rejected. Please check your configuration."
+    if kind == 'rate_limit':
+        return "The language model is busy right now. Please try again in a moment."
+    if kind == 'timeout':
+        return "The language model took too long to respond. Please try again."
+    if kind in ('connection', 'server'):
+        return "I couldn't reach the language model. Please check your internet connection."
+    return f"Sorry, something went wrong: {error}"
+
+
+# openai and httpx are imported where they are first needed: together they
+# take most of a second to load, which server startup should not wait for
+def _limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout():
+    # Reads cover the gap between streamed chunks, not the whole response
+    import httpx
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+_lock = threading.Lock()
+_client = None
+_stats = {'warmed_up': False, 'warmup_ms': None, 'warmup_error': None, 'requests': 0,
+          'retries': 0, 'hedged': 0, 'hedge_wins': 0, 'deadline_exceeded': 0, 'errors': {}}
+_hedge_executor = None
+
+breaker = CircuitBreaker('openai', failure_threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET)
+
+
+def get_client():
+    """Shared synchronous client over a pooled keep-alive connection, or None without an API key"""
+    global _client
+    if _client is None and api_data:
+        with _lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+                # Retries are done here, with jitter and within the call's deadline
+                _client = OpenAI(
+                    api_key=api_data,
+                    max_retries=0,
+                    timeout=_timeout(),
+                    http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+                )
+    return _client
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+def _attempt_timeout(budget):
+    """Per-request httpx timeout, capped by what is left of the call's budget"""
+    import httpx
+    read = budget.cap(READ_TIMEOUT)
+    if read <= 0:
+        _count('deadline_exceeded')
+        raise DeadlineExceeded(f"Model call exceeded its {budget.seconds:.0f}s deadline")
+    return httpx.Timeout(read, connect=min(CONNECT_TIMEOUT, read))
+
+
+def _handle_failure(error, attempt, budget):
+    """Update the breaker for a failed attempt; return the backoff delay, or raise if it is final"""
+    kind = classify_error(error)
+    with _lock:
+        _stats['errors'][kind] = _stats['errors'].get(kind, 0) + 1
+    if kind in FATAL:
+        breaker.record_failure(error, trip=True, reset_timeout=BREAKER_FATAL_RESET)
+        raise error
+    if kind not in RETRYABLE:
+        # The API answered (e.g. a bad request), so the dependency itself is healthy
+        breaker.record_success()
+        raise error
+    breaker.record_failure(error)
+    delay = backoff_delay(attempt)
+    remaining = budget.remaining()
+    if attempt >= MAX_RETRIES or (remaining is not None and delay >= remaining):
+        raise error
+    _count('retries')
+    return delay
+
+
+def _record_hedge(was_hedged, winner):
+    if was_hedged:
+        _count('hedged')
+        _count('hedge_wins', winner)
+
+
+def create_completion(deadline=None, hedge_after=None, **kwargs):
+    """client.chat.completions.create on the shared client, behind the circuit breaker
+
+    The whole call, retries included, must finish within `deadline` seconds
+    (DEFAULT_DEADLINE if None). Transient errors are retried with jittered
+    backoff; quota and auth errors open the breaker, after which calls raise
+    CircuitOpenError immediately. Non-streaming calls still unanswered after
+    `hedge_after` seconds (HEDGE_AFTER if None) are raced against a second copy.
+    For streams the deadline covers the request up to the first chunk.
+    """
+    global _hedge_executor
+    client = get_client()
+    if client is None:
+        raise LLMUnavailable("No API key configured")
+    budget = Deadline(DEFAULT_DEADLINE if deadline is None else deadline)
+    hedge_after = HEDGE_AFTER if hedge_after is None else hedge_after
+    if hedge_after and not kwargs.get('stream') and _hedge_executor is None:
+        with _lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS, thread_name_prefix='llm-hedge')
+    attempt = 0
+    while True:
+        timeout = _attempt_timeout(budget)
+        breaker.before_call()
+        scoped = client.with_options(timeout=timeout)
+        _count('requests')
+        try:
+            if hedge_after and not kwargs.get('stream'):
+                result, was_hedged, winner = hedged(
+                    lambda: scoped.chat.completions.create(**kwargs), hedge_after, _hedge_executor,
+                    timeout=budget.remaining()
+                )
+                _record_hedge(was_hedged, winner)
+            else:
+                result = scoped.chat.completions.create(**kwargs)
+        except Exception as e:
+            time.sleep(_handle_failure(e, attempt, budget))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+def _warm_up():
+    started = time.perf_counter()
+    try:
+        # A token-free authenticated request: resolves DNS and completes the TLS
+        # handshake so the connection is already in the pool for the first command
+        get_client().with_options(max_retries=0).models.list()
+        _stats['warmed_up'] = True
+    except Exception as e:
+        _stats['warmup_error'] = str(e)
+        print(f"Warning: LLM connection warm-up failed ({e})")
+    finally:
+        _stats['warmup_ms'] = (time.perf_counter() - started) * 1000
+
+
+def warm_up():
+    """Open a pooled connection in the background; returns the thread, or None without an API key"""
+    if get_client() is None:
+        return None
+    thread = threading.Thread(target=_warm_up, name='llm-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_stats():
+    """Pool settings, warm-up outcome, request and retry counts and breaker state"""
+    with _lock:
+        stats = dict(_stats)
+        stats['errors'] = dict(_stats['errors'])
+    stats['breaker'] = breaker.get_stats()
+    stats.update({
+        'configured': bool(api_data),
+        'connect_timeout': CONNECT_TIMEOUT,
+        'read_timeout': READ_TIMEOUT,
+        'max_connections': MAX_CONNECTIONS,
+        'max_keepalive_connections': MAX_KEEPALIVE_CONNECTIONS,
+        'deadline': DEFAULT_DEADLINE,
+        'hedge_after': HEDGE_AFTER,
+    })
+    return stats
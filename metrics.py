@@ -0,0 +1,285 @@
+import bisect
+import functools
+import os
+import threading
+import time
+
+# Record stage timings and counters (set ASSISTANT_METRICS=0 to make every probe a no-op)
+METRICS_ENABLED = os.getenv('ASSISTANT_METRICS', '1') != '0'
+# Histogram bucket upper bounds in seconds: from a local parse up to a slow model answer
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """A named metric family; `labels(...)` returns the child for one set of label values"""
+
+    kind = None
+    suffix = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """[(suffix, label string, value)] for the exposition format"""
+        with self._lock:
+            children = list(self._children.items())
+        lines = []
+        for values, child in children:
+            lines.extend(self._child_samples(values, child))
+        return lines
+
+    def _child_samples(self, values, child):
+        return [('', _labels(self.labelnames, values), child.value)]
+
+    # Unlabelled metrics are used directly
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    # Exposed as <name>_total, as Prometheus expects of counters
+    suffix = '_total'
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; with `function` it is read when scraped"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def _new_child(self):
+        return _Value()
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            value = self.function()
+        except Exception:
+            return []
+        return [] if value is None else [('', '', value)]
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One count per bucket plus one for +Inf, not cumulative; summed when scraped
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _child_samples(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = f'le="{_format(bound)}"'
+            lines.append(('_bucket', _labels(self.labelnames, values, le), cumulative))
+        lines.append(('_sum', _labels(self.labelnames, values), total))
+        lines.append(('_count', _labels(self.labelnames, values), cumulative))
+        return lines
+
+
+class Registry:
+    """Every metric family, rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            name = metric.name + metric.suffix
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{name}{suffix}{labels} {_format(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+stage_seconds = registry.register(Histogram(
+    'assistant_stage_seconds', 'Time spent in each stage of the assistant loop', ['stage']))
+stage_in_flight = registry.register(Gauge(
+    'assistant_stage_in_flight', 'Calls currently inside each stage', ['stage']))
+stage_errors = registry.register(Counter(
+    'assistant_stage_errors', 'Failures in each stage by error type', ['stage', 'error']))
+action_seconds = registry.register(Histogram(
+    'assistant_action_seconds', 'Time to execute each action', ['action']))
+parses = registry.register(Counter(
+    'assistant_parses', 'Commands parsed locally versus sent to the model', ['source']))
+
+
+class _Stage:
+    """Times one pass through a stage: in-flight while inside, an error count if it raises"""
+
+    __slots__ = ('name', 'histogram', 'gauge', 'started')
+
+    def __init__(self, name, histogram, gauge):
+        self.name = name
+        self.histogram = histogram
+        self.gauge = gauge
+
+    def __enter__(self):
+        self.gauge.inc()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        self.histogram.observe(time.perf_counter() - self.started)
+        self.gauge.dec()
+        if error is not None:
+            stage_errors.labels(self.name, kind.__name__).inc()
+        return False
+
+
+# stage name -> (histogram child, in-flight child), so a probe costs one dict lookup
+_stage_children = {}
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name):
+    """Context manager timing one pass through stage `name`"""
+    if not METRICS_ENABLED:
+        return _NO_STAGE
+    children = _stage_children.get(name)
+    if children is None:
+        children = _stage_children.setdefault(name, (stage_seconds.labels(name), stage_in_flight.labels(name)))
+    return _Stage(name, *children)
+
+
+def timed(name):
+    """Decorator: every call to the function is one pass through stage `name`"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe(name, seconds):
+    """Record a stage duration measured elsewhere (e.g. the length of a captured phrase)"""
+    if METRICS_ENABLED:
+        stage_seconds.labels(name).observe(seconds)
+
+
+def count_error(name, error):
+    """Count a failure a stage handled itself instead of raising"""
+    if METRICS_ENABLED:
+        stage_errors.labels(name, type(error).__name__).inc()
+
+
+def observe_action(name, seconds, error=None):
+    """Record one action's run time; `error` names a failure that was not raised (e.g. 'timeout')"""
+    if METRICS_ENABLED:
+        action_seconds.labels(name).observe(seconds)
+        if error is not None:
+            stage_errors.labels('execute', error).inc()
+
+
+def count_parse(source):
+    if METRICS_ENABLED:
+        parses.labels(source).inc()
+
+
+def gauge(name, documentation, function):
+    """Register a gauge that is read from `function` when scraped"""
+    return registry.register(Gauge(name, documentation, function=function))
+
+
+def render():
+    return registry.render()
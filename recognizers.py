@@ -0,0 +1,343 @@
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import speech_recognition as sr
+
+import metrics
+
+# Backends to use, most preferred first (any of: google, offline, fake)
+RECOGNIZERS = os.getenv('ASSISTANT_RECOGNIZERS', 'google,offline')
+LANGUAGE = os.getenv('ASSISTANT_LANGUAGE', 'en-in')
+# Start the next backend alongside the current one if it has not answered after
+# this many seconds; the first usable transcript wins (0 = only after a failure)
+FALLBACK_AFTER = float(os.getenv('ASSISTANT_RECOGNIZER_FALLBACK_AFTER', '1.5'))
+# Offline engine: vosk, sphinx, or auto (vosk when its model is present, else sphinx)
+OFFLINE_ENGINE = os.getenv('ASSISTANT_OFFLINE_ENGINE', 'auto')
+VOSK_MODEL_PATH = os.getenv('ASSISTANT_VOSK_MODEL', 'model')
+# Fake backend: transcript returned for unknown audio, and simulated latency
+FAKE_TRANSCRIPT = os.getenv('ASSISTANT_FAKE_TRANSCRIPT', '')
+FAKE_LATENCY_MS = float(os.getenv('ASSISTANT_FAKE_RECOGNIZER_MS', '0'))
+# Threads shared by all recognitions (each may run several backends at once)
+RECOGNIZER_WORKERS = int(os.getenv('ASSISTANT_RECOGNIZER_WORKERS', '8'))
+# Recent latencies kept per backend for the percentile figures
+LATENCY_HISTORY = 200
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance between two transcripts, divided by the reference length"""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        current = [i]
+        for j, other in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+class RecognizerBackend:
+    """One speech-to-text engine; `transcribe` returns text or raises sr.UnknownValueError / sr.RequestError"""
+
+    name = 'backend'
+
+    def available(self):
+        return True
+
+    def transcribe(self, audio):
+        raise NotImplementedError
+
+
+class GoogleBackend(RecognizerBackend):
+    """Google's web speech API (needs network)"""
+
+    name = 'google'
+
+    def __init__(self, language=LANGUAGE):
+        self.language = language
+        self._recognizer = sr.Recognizer()
+
+    def transcribe(self, audio):
+        return self._recognizer.recognize_google(audio, language=self.language)
+
+
+class OfflineBackend(RecognizerBackend):
+    """Local CPU-only recognition with Vosk or PocketSphinx; nothing leaves the host"""
+
+    name = 'offline'
+
+    def __init__(self, engine=OFFLINE_ENGINE, model_path=VOSK_MODEL_PATH):
+        if engine == 'auto':
+            vosk_ready = importlib.util.find_spec('vosk') is not None and os.path.isdir(model_path)
+            engine = 'vosk' if vosk_ready else 'sphinx'
+        self.engine = engine
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+        self._recognizer = sr.Recognizer()
+
+    def available(self):
+        if self.engine == 'vosk':
+            return importlib.util.find_spec('vosk') is not None and os.path.isdir(self.model_path)
+        return importlib.util.find_spec('pocketsphinx') is not None
+
+    def transcribe(self, audio):
+        if self.engine == 'sphinx':
+            return self._recognizer.recognize_sphinx(audio)
+        return self._transcribe_vosk(audio)
+
+    def _transcribe_vosk(self, audio):
+        import vosk
+        with self._lock:
+            if self._model is None:
+                # Loading the model takes seconds, so it is done once and shared
+                vosk.SetLogLevel(-1)
+                self._model = vosk.Model(self.model_path)
+        recognizer = vosk.KaldiRecognizer(self._model, 16000)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=16000, convert_width=2))
+        text = json.loads(recognizer.FinalResult()).get('text', '')
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class FakeBackend(RecognizerBackend):
+    """Deterministic backend for tests and benchmarks
+
+    Audio registered with `add` (keyed by a hash of its raw PCM) returns its
+    transcript; anything else returns `default`, or is "not understood" when
+    there is no default. `latency_ms` simulates a slow engine.
+    """
+
+    name = 'fake'
+
+    def __init__(self, default=FAKE_TRANSCRIPT, latency_ms=FAKE_LATENCY_MS, transcripts=None):
+        self.default = default
+        self.latency_ms = latency_ms
+        self._transcripts = dict(transcripts or {})
+
+    @staticmethod
+    def fingerprint(audio):
+        return hashlib.sha1(audio.get_raw_data()).hexdigest()
+
+    def add(self, audio, transcript):
+        self._transcripts[self.fingerprint(audio)] = transcript
+
+    def transcribe(self, audio):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        text = self._transcripts.get(self.fingerprint(audio), self.default)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+BACKENDS = {'google': GoogleBackend, 'offline': OfflineBackend, 'fake': FakeBackend}
+
+
+class BackendStats:
+    """Latency and outcome counters for one backend"""
+
+    def __init__(self):
+        self.calls = 0
+        self.recognized = 0
+        self.not_understood = 0
+        self.errors = 0
+        self.wins = 0
+        # Races this backend lost but still answered, and its word error rate against the winner
+        self.compared = 0
+        self.word_errors = 0.0
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+
+    def get_stats(self):
+        ordered = sorted(self.latencies)
+
+        def percentile(fraction):
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1) if ordered else None
+
+        return {
+            'calls': self.calls,
+            'recognized': self.recognized,
+            'not_understood': self.not_understood,
+            'errors': self.errors,
+            'wins': self.wins,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'compared': self.compared,
+            'agreement_wer': round(self.word_errors / self.compared, 3) if self.compared else None,
+        }
+
+
+class RecognizerChain:
+    """Tries speech backends in order of preference, racing them when one is slow
+
+    The first backend starts straight away. If it fails, or has not answered
+    after `fallback_after` seconds, the next one starts too and the first
+    transcript to come back is used. Backends that lose a race still finish in
+    the background; their transcripts are compared with the winner's to give a
+    word error rate per backend, a cheap accuracy signal that needs no labelled
+    audio. When every backend fails, the last error is raised (UnknownValueError
+    if any backend heard nothing intelligible).
+    """
+
+    def __init__(self, backends, fallback_after=FALLBACK_AFTER, workers=RECOGNIZER_WORKERS):
+        if not backends:
+            raise ValueError("At least one recognizer backend is required")
+        self.backends = list(backends)
+        self.fallback_after = fallback_after
+        self._stats = {backend.name: BackendStats() for backend in self.backends}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recognizer')
+
+    def recognize(self, audio, release=None):
+        """Transcribe `audio` (an sr.AudioData)
+
+        Backends that lose a race may still be reading `audio` after this
+        returns; `release`, if given, is called once none of them is.
+        """
+        pending = {}
+        started = []
+        remaining = list(self.backends)
+        error = None
+        try:
+            while remaining or pending:
+                if not pending:
+                    self._start(remaining.pop(0), audio, pending, started)
+                timeout = self.fallback_after if remaining and self.fallback_after > 0 else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # The current backend is slow: race the next one against it
+                    self._start(remaining.pop(0), audio, pending, started)
+                    continue
+                for future in done:
+                    backend = pending.pop(future)
+                    try:
+                        text = future.result()
+                    except (sr.UnknownValueError, sr.RequestError) as e:
+                        if error is None or isinstance(e, sr.UnknownValueError):
+                            error = e
+                        continue
+                    with self._lock:
+                        self._stats[backend.name].wins += 1
+                    for other, loser in pending.items():
+                        other.add_done_callback(lambda f, name=loser.name: self._compare(name, f, text))
+                    return text
+            raise error
+        finally:
+            if release is not None:
+                _call_when_done(started, release)
+
+    def _start(self, backend, audio, pending, started):
+        future = self._pool.submit(self._run, backend, audio)
+        pending[future] = backend
+        started.append(future)
+
+    def _run(self, backend, audio):
+        stats = self._stats[backend.name]
+        started = time.perf_counter()
+        try:
+            text = backend.transcribe(audio)
+        except sr.UnknownValueError:
+            with self._lock:
+                stats.calls += 1
+                stats.not_understood += 1
+            raise
+        except Exception as e:
+            with self._lock:
+                stats.calls += 1
+                stats.errors += 1
+            if isinstance(e, sr.RequestError):
+                raise
+            raise sr.RequestError(f"{backend.name}: {e}") from e
+        with self._lock:
+            stats.calls += 1
+            stats.recognized += 1
+            stats.latencies.append((time.perf_counter() - started) * 1000)
+        return text
+
+    def _compare(self, name, future, reference):
+        """Score a race loser's transcript against the one that was used"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            stats = self._stats[name]
+            stats.compared += 1
+            stats.word_errors += word_error_rate(reference, future.result())
+
+    def get_stats(self):
+        with self._lock:
+            backends = {name: stats.get_stats() for name, stats in self._stats.items()}
+        return {
+            'order': [backend.name for backend in self.backends],
+            'fallback_after': self.fallback_after,
+            'backends': backends,
+        }
+
+
+def _call_when_done(futures, callback):
+    """Run `callback` once, after every future in `futures` has finished"""
+    left = [len(futures)]
+    lock = threading.Lock()
+
+    def finished(_):
+        with lock:
+            left[0] -= 1
+            last = left[0] == 0
+        if last:
+            callback()
+
+    if not futures:
+        callback()
+    for future in futures:
+        future.add_done_callback(finished)
+
+
+def create_recognizer(names=RECOGNIZERS, fallback_after=FALLBACK_AFTER):
+    """Build a chain from a comma-separated list of backend names, skipping unusable ones"""
+    backends = []
+    for name in [n.strip() for n in names.split(',') if n.strip()]:
+        factory = BACKENDS.get(name)
+        if factory is None:
+            print(f"Warning: unknown speech recognizer '{name}' ignored")
+            continue
+        backend = factory()
+        if not backend.available():
+            print(f"Warning: speech recognizer '{name}' is not installed; skipping it")
+            continue
+        backends.append(backend)
+    if not backends:
+        print("Warning: no usable speech recognizer configured; falling back to google")
+        backends.append(GoogleBackend())
+    return RecognizerChain(backends, fallback_after=fallback_after)
+
+
+_recognizer = None
+_recognizer_lock = threading.Lock()
+
+
+def get_recognizer():
+    """The process-wide recognizer chain, built on first use from the environment"""
+    global _recognizer
+    if _recognizer is None:
+        with _recognizer_lock:
+            if _recognizer is None:
+                _recognizer = create_recognizer()
+    return _recognizer
+
+
+def recognize(audio, release=None):
+    """Transcribe with the configured backends"""
+    with metrics.stage('recognize'):
+        return get_recognizer().recognize(audio, release=release)
+
+
+def get_stats():
+    return get_recognizer().get_stats()
@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """The time budget for a call ran out before it succeeded"""
+
+
+class Deadline:
+    """A time budget shared by every attempt of one logical call"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.perf_counter() + seconds if seconds else None
+
+    def remaining(self):
+        """Seconds left, or None for an unlimited budget"""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.perf_counter()
+
+    def cap(self, seconds):
+        """`seconds`, shortened so it does not run past the deadline"""
+        remaining = self.remaining()
+        return seconds if remaining is None else max(0.0, min(seconds, remaining))
+
+    @property
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+def backoff_delay(attempt, base=0.25, cap=4.0):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency, then lets a single probe through after a pause
+
+    `failure_threshold` consecutive failures open the circuit for `reset_timeout`
+    seconds; errors that retrying cannot fix (quota, auth) open it immediately,
+    optionally for longer. While open, `before_call` raises CircuitOpenError so
+    callers fail fast. Afterwards one probe call is allowed (half-open): success
+    closes the circuit, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self.stats = {'trips': 0, 'rejected': 0, 'failures': 0, 'successes': 0,
+                      'last_error': None, 'last_trip_reason': None, 'opened_at': None}
+
+    def subscribe(self, callback):
+        """Call `callback(stats)` whenever the breaker changes state"""
+        self._subscribers.append(callback)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.time() >= self._open_until:
+            return self.HALF_OPEN
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                changed = self._set_state(self.HALF_OPEN)
+            else:
+                self.stats['rejected'] += 1
+                raise CircuitOpenError(self.name, max(0.0, self._open_until - time.time()))
+        self._notify(changed)
+
+    def record_success(self):
+        with self._lock:
+            self.stats['successes'] += 1
+            self._consecutive_failures = 0
+            self._probing = False
+            changed = self._set_state(self.CLOSED)
+        self._notify(changed)
+
+    def record_failure(self, error, trip=False, reset_timeout=None):
+        """Count a failure; `trip` opens the circuit regardless of the threshold"""
+        with self._lock:
+            self.stats['failures'] += 1
+            self.stats['last_error'] = str(error)
+            self._consecutive_failures += 1
+            probing, self._probing = self._probing, False
+            changed = None
+            if trip or probing or self._consecutive_failures >= self.failure_threshold:
+                self._open_until = time.time() + (reset_timeout or self.reset_timeout)
+                self.stats['trips'] += 1
+                self.stats['last_trip_reason'] = type(error).__name__
+                self.stats['opened_at'] = time.time()
+                changed = self._set_state(self.OPEN)
+        self._notify(changed)
+
+    def _set_state(self, state):
+        """Switch state (lock held); returns a snapshot for subscribers if it changed"""
+        if state == self._state and state != self.OPEN:
+            return None
+        self._state = state
+        return self._snapshot()
+
+    def _notify(self, snapshot):
+        if snapshot is None:
+            return
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Circuit breaker subscriber error: {e}")
+
+    def _snapshot(self):
+        stats = dict(self.stats)
+        stats['name'] = self.name
+        stats['state'] = self._current_state()
+        stats['consecutive_failures'] = self._consecutive_failures
+        stats['retry_after'] = max(0.0, self._open_until - time.time()) if stats['state'] == self.OPEN else 0.0
+        return stats
+
+    def get_stats(self):
+        """State, trip count and failure counters"""
+        with self._lock:
+            return self._snapshot()
+
+
+def hedged(call, hedge_after, executor, timeout=None):
+    """Run `call()`; if it has not finished after `hedge_after` seconds, race a second copy
+
+    Returns (result, hedged, winner) where winner is 0 for the first request and
+    1 for the hedge. The slower request is left to finish in the background. If
+    both fail the first request's error is raised.
+    """
+    first = executor.submit(call)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result(), False, 0
+    second = executor.submit(call)
+    futures = [first, second]
+    deadline = time.perf_counter() + timeout if timeout is not None else None
+    pending = set(futures)
+    while pending:
+        left = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded("hedged call timed out")
+        for future in done:
+            if future.exception() is None:
+                return future.result(), True, futures.index(future)
+    first.result()  # both failed: surface the original request's error
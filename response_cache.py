@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Where the on-disk tier lives; override with ASSISTANT_CACHE_DIR
+CACHE_DIR = os.getenv(
+    'ASSISTANT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.assistant_cache')
+)
+DEFAULT_TTL = 24 * 60 * 60
+
+# Questions whose answer depends on when they are asked are never cached
+TIME_SENSITIVE_RE = re.compile(
+    r"\b(now|today|tonight|tomorrow|yesterday|current|currently|latest|recent|news|weather|"
+    r"time|date|this (week|month|year)|score|scores|price|prices|stock|stocks)\b"
+)
+_PUNCTUATION_RE = re.compile(r"[^\w\s']")
+
+
+def normalize_query(query):
+    """Lower-case, drop punctuation and collapse whitespace so trivial variations share a cache entry"""
+    return ' '.join(_PUNCTUATION_RE.sub(' ', query.lower()).split())
+
+
+def collapse_whitespace(query):
+    """Keep the query as said, apart from runs of whitespace
+
+    For results that copy text out of the query (a parsed command's folder
+    name or search terms), where "my.project" and "my project" must differ.
+    """
+    return ' '.join(query.split())
+
+
+def _fingerprint(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_time_sensitive(query):
+    """True if the answer to this query is likely to change over time"""
+    return bool(TIME_SENSITIVE_RE.search(normalize_query(query)))
+
+
+class ResponseCache:
+    """Two-tier cache for model responses: an in-memory LRU in front of SQLite
+
+    Entries are keyed by the query as reduced by `normalize` (by default
+    normalize_query), the model and the system prompt and expire after `ttl`
+    seconds (never, if `ttl` is None). Both tiers are
+    size bounded; the disk tier evicts the least recently used rows once it
+    grows past `max_disk_entries`. When `version` is given, a table stamped
+    with a different version is emptied on open, so cached results cannot
+    outlive the prompt that produced them.
+    """
+
+    def __init__(self, path=None, table='responses', max_memory_entries=256,
+                 max_disk_entries=5000, ttl=DEFAULT_TTL, persistent=True,
+                 version=None, bypass_time_sensitive=True, normalize=normalize_query):
+        self.table = table
+        self.normalize = normalize
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        # Keys made by another normalisation must not be read back either
+        self.version = _fingerprint(json.dumps([version, normalize.__name__])) if version is not None else None
+        self.bypass_time_sensitive = bypass_time_sensitive
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0}
+
+        if persistent:
+            self._open(path or os.path.join(CACHE_DIR, 'responses.sqlite3'))
+
+    def _open(self, path):
+        """Open the SQLite tier, falling back to memory only if that is not possible"""
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, last_access REAL NOT NULL)'
+            )
+            self._db.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_lru ON {self.table} (last_access)')
+            if self.version is not None:
+                self._check_version()
+        except sqlite3.Error as e:
+            print(f"Warning: response cache running in memory only ({e})")
+            self._db = None
+
+    def _check_version(self):
+        """Empty the table if it was filled under a different version"""
+        self._db.execute('CREATE TABLE IF NOT EXISTS cache_versions (name TEXT PRIMARY KEY, version TEXT NOT NULL)')
+        row = self._db.execute('SELECT version FROM cache_versions WHERE name = ?', (self.table,)).fetchone()
+        if row is None or row[0] != self.version:
+            if row is not None:
+                print(f"Response cache '{self.table}' invalidated (version changed)")
+            self._db.execute(f'DELETE FROM {self.table}')
+            self._db.execute(
+                'INSERT OR REPLACE INTO cache_versions (name, version) VALUES (?, ?)', (self.table, self.version)
+            )
+
+    def make_key(self, query, model, system_prompt):
+        return _fingerprint(json.dumps([self.normalize(query), model, system_prompt]))
+
+    def _bypassed(self, query):
+        return self.bypass_time_sensitive and is_time_sensitive(query)
+
+    def get(self, query, model, system_prompt):
+        """Return the cached response or None on a miss or bypass"""
+        if self._bypassed(query):
+            with self._lock:
+                self.stats['bypassed'] += 1
+            return None
+
+        key = self.make_key(query, model, system_prompt)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats['hits'] += 1
+                    self.stats['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+                    ).fetchone()
+                    if row is not None:
+                        value, expires_at = row
+                        if expires_at is None or expires_at > now:
+                            self._db.execute(
+                                f'UPDATE {self.table} SET last_access = ? WHERE key = ?', (now, key)
+                            )
+                            self._remember(key, value, expires_at)
+                            self.stats['hits'] += 1
+                            self.stats['disk_hits'] += 1
+                            return value
+                        self._db.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                except sqlite3.Error as e:
+                    print(f"Response cache read error: {e}")
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, query, model, system_prompt, value, ttl=None):
+        """Store a response; time-sensitive queries are never stored"""
+        if value is None or self._bypassed(query):
+            return
+
+        key = self.make_key(query, model, system_prompt)
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) '
+                        'VALUES (?, ?, ?, ?)',
+                        (key, value, expires_at, now)
+                    )
+                    self._evict_disk()
+                except sqlite3.Error as e:
+                    print(f"Response cache write error: {e}")
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _evict_disk(self):
+        count = self._db.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                f'DELETE FROM {self.table} WHERE key IN '
+                f'(SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)',
+                (excess,)
+            )
+            self.stats['evictions'] += excess
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f'DELETE FROM {self.table}')
+
+    def get_stats(self):
+        """Snapshot of the hit/miss counters and tier sizes"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,260 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class SessionLimitError(RuntimeError):
+    """Raised when opening a session would exceed the session limit"""
+
+
+class SessionBusyError(RuntimeError):
+    """Raised when a session already has as much queued work as it may hold"""
+
+
+class Session:
+    """One client: its own assistant state, Socket.IO room and serial work queue"""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.room = f'session-{self.id}'
+        self.created = time.time()
+        self.last_active = self.created
+        self.connections = set()
+        self.state = {'is_running': False, 'status': 'idle', 'latency': {}}
+        # Whether replies are also spoken on the server's own speakers
+        self.local_audio = False
+        # Segmenter for audio streamed from the client, created when streaming starts
+        self.audio = None
+        self.closed = False
+        # Never reaped while set, e.g. while the session runs the server's microphone
+        self.pinned = False
+        self.processed = 0
+        self.rejected = 0
+        self._pending = deque()
+        self._scheduled = False
+
+    def touch(self):
+        self.last_active = time.time()
+
+    @property
+    def busy(self):
+        return self._scheduled or bool(self._pending)
+
+    def get_info(self):
+        return {
+            'id': self.id,
+            'connections': len(self.connections),
+            'state': dict(self.state),
+            'local_audio': self.local_audio,
+            'pinned': self.pinned,
+            'pending': len(self._pending),
+            'processed': self.processed,
+            'rejected': self.rejected,
+            'idle_seconds': round(time.time() - self.last_active, 1),
+        }
+
+
+class SessionManager:
+    """Admits, schedules and reaps client sessions
+
+    Sessions are looked up by key (a client token, or the Socket.IO sid for
+    clients without one). Work submitted to a session runs on a shared pool of
+    `workers` threads, one job at a time per session and in submission order;
+    after each job the session goes to the back of the pool's queue, so a busy
+    session cannot starve the others. At most `max_sessions` sessions exist at
+    once and each may hold `max_pending` queued jobs; beyond that callers get
+    SessionLimitError / SessionBusyError instead of unbounded queueing. Sessions
+    with no connection that stay idle for `idle_timeout` seconds are closed by
+    a background reaper.
+    """
+
+    def __init__(self, max_sessions=200, workers=8, max_pending=8, idle_timeout=600,
+                 reap_interval=30, on_close=None):
+        self.max_sessions = max_sessions
+        self.max_pending = max_pending
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.on_close = on_close
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='session-worker')
+        self._sessions = {}
+        self._by_id = {}
+        self._by_connection = {}
+        self._lock = threading.Lock()
+        self._active_workers = 0
+        self._queued = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'opened': 0, 'closed': 0, 'reaped': 0, 'admission_rejected': 0,
+                      'busy_rejected': 0, 'jobs': 0, 'job_errors': 0}
+
+    def start(self):
+        """Start the idle reaper (idempotent)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_reaper, name='session-reaper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def open(self, key=None):
+        """Return the session for `key`, creating it if there is room; raises SessionLimitError"""
+        with self._lock:
+            session = self._sessions.get(key) if key is not None else None
+            if session is not None:
+                session.touch()
+                return session
+            if len(self._sessions) >= self.max_sessions:
+                self.stats['admission_rejected'] += 1
+                raise SessionLimitError(f"Session limit reached ({self.max_sessions})")
+            session = Session(key)
+            if key is None:
+                session.key = session.id
+            self._sessions[session.key] = session
+            self._by_id[session.id] = session
+            self.stats['opened'] += 1
+        return session
+
+    def get(self, key):
+        """Session by key or id, or None"""
+        with self._lock:
+            return self._sessions.get(key) or self._by_id.get(key)
+
+    def for_connection(self, sid):
+        """Session a live connection belongs to, or None"""
+        with self._lock:
+            return self._by_connection.get(sid)
+
+    def attach(self, key, sid):
+        """Open (or reuse) the session for `key` and record a live connection to it"""
+        session = self.open(key)
+        with self._lock:
+            session.connections.add(sid)
+            self._by_connection[sid] = session
+        return session
+
+    def detach(self, sid):
+        """Forget a connection; a session keyed by that connection closes with it"""
+        with self._lock:
+            session = self._by_connection.pop(sid, None)
+            if session is None:
+                return None
+            session.connections.discard(sid)
+        session.touch()
+        if session.key == sid:
+            self.close(session, reason='disconnected')
+        return session
+
+    def close(self, session, reason='closed'):
+        """Remove a session and cancel its queued work"""
+        with self._lock:
+            if session.closed:
+                return
+            session.closed = True
+            self._sessions.pop(session.key, None)
+            self._by_id.pop(session.id, None)
+            self.stats['closed'] += 1
+            if reason == 'idle':
+                self.stats['reaped'] += 1
+            for sid in session.connections:
+                self._by_connection.pop(sid, None)
+            pending = list(session._pending)
+            session._pending.clear()
+        for future, _, _, _ in pending:
+            future.cancel()
+        if self.on_close is not None:
+            try:
+                self.on_close(session, reason)
+            except Exception as e:
+                print(f"Session close handler failed: {e}")
+
+    def submit(self, session, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` on the session; returns a Future. Raises SessionBusyError"""
+        future = Future()
+        with self._lock:
+            if session.closed:
+                raise SessionLimitError("Session is closed")
+            if len(session._pending) >= self.max_pending:
+                session.rejected += 1
+                self.stats['busy_rejected'] += 1
+                raise SessionBusyError(f"Session has {self.max_pending} commands queued already")
+            session._pending.append((future, fn, args, kwargs))
+            self._schedule(session)
+        session.touch()
+        return future
+
+    def _schedule(self, session):
+        """Hand the session to the pool if it is not already queued there (lock held)"""
+        if session._scheduled or not session._pending:
+            return
+        session._scheduled = True
+        self._queued += 1
+        self._pool.submit(self._run_next, session)
+
+    def _run_next(self, session):
+        with self._lock:
+            self._queued -= 1
+            self._active_workers += 1
+            job = session._pending.popleft() if session._pending else None
+        failed = False
+        try:
+            if job is not None:
+                future, fn, args, kwargs = job
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except Exception as e:
+                        failed = True
+                        future.set_exception(e)
+                session.processed += 1
+                session.touch()
+        finally:
+            with self._lock:
+                self._active_workers -= 1
+                if job is not None:
+                    self.stats['jobs'] += 1
+                    if failed:
+                        self.stats['job_errors'] += 1
+                session._scheduled = False
+                if not session.closed:
+                    self._schedule(session)
+
+    def reap(self):
+        """Close sessions that have no connection and have been idle too long (pinned ones are kept)"""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            idle = [s for s in self._sessions.values()
+                    if not s.connections and not s.busy and not s.pinned and s.last_active < cutoff]
+        for session in idle:
+            self.close(session, reason='idle')
+        return idle
+
+    def _run_reaper(self):
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Session reaper error: {e}")
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def get_stats(self):
+        """Session counts, admission and pool figures"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                'active': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'connections': sum(len(s.connections) for s in self._sessions.values()),
+                'workers': self.workers,
+                'busy_workers': self._active_workers,
+                'queued_sessions': self._queued,
+                'pending_jobs': sum(len(s._pending) for s in self._sessions.values()),
+            })
+        return stats
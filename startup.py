@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+# Start every subsystem in the background as soon as the server binds
+# (set ASSISTANT_LAZY_START=1 to initialise each one only when it is first used)
+LAZY_START = os.getenv('ASSISTANT_LAZY_START', '0') == '1'
+
+PENDING = 'pending'
+STARTING = 'starting'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class Subsystem:
+    """One slow-to-initialise part of the assistant, built on its own thread
+
+    `init` runs at most once, on a daemon thread, either when `start` is
+    called or on the first `get`. Its return value is kept as `value`; an
+    exception marks the subsystem failed and is reported, not raised, so the
+    server keeps serving what does work.
+    """
+
+    def __init__(self, name, init):
+        self.name = name
+        self._init = init
+        self.state = PENDING
+        self.value = None
+        self.error = None
+        self.elapsed_ms = None
+        self._started = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self):
+        """Begin initialising in the background; later calls do nothing"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name=f'init-{self.name}', daemon=True).start()
+
+    def _run(self):
+        self.state = STARTING
+        started = time.perf_counter()
+        try:
+            self.value = self._init()
+            self.state = READY
+        except Exception as e:
+            self.error = str(e)
+            self.state = FAILED
+            print(f"Warning: {self.name} could not be initialized: {e}")
+        finally:
+            self.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            self._done.set()
+
+    def get(self, timeout=None):
+        """The initialised value, waiting up to `timeout` seconds; None if failed or not ready in time"""
+        self.start()
+        self._done.wait(timeout)
+        return self.value
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def get_status(self):
+        return {'state': self.state, 'elapsed_ms': self.elapsed_ms, 'error': self.error}
+
+
+class Subsystems:
+    """Named subsystems with per-subsystem readiness, for non-blocking startup"""
+
+    def __init__(self):
+        self._subsystems = {}
+
+    def add(self, name, init):
+        subsystem = Subsystem(name, init)
+        self._subsystems[name] = subsystem
+        return subsystem
+
+    def start_all(self):
+        for subsystem in self._subsystems.values():
+            subsystem.start()
+
+    def get(self, name, timeout=None):
+        return self._subsystems[name].get(timeout)
+
+    def peek(self, name):
+        """The value if the subsystem is ready, else None; never waits or starts anything"""
+        subsystem = self._subsystems[name]
+        return subsystem.value if subsystem.ready else None
+
+    def ready(self, name):
+        return self._subsystems[name].ready
+
+    def get_status(self):
+        status = {name: subsystem.get_status() for name, subsystem in self._subsystems.items()}
+        return {
+            'ready': all(s['state'] == READY for s in status.values()),
+            'lazy': LAZY_START,
+            'subsystems': status,
+        }
@@ -2,13 +2,475 @@ import subprocess
 import os
 import shutil
 import psutil
-try:
-    import pyautogui
-except (ImportError, KeyError):
-    # KeyError can happen on headless systems (no DISPLAY)
-    pyautogui = None
+import numpy as np
 from datetime import datetime
 import json
+import threading
+import time
+import bisect
+import heapq
+import re
+
+# Seconds between telemetry samples; override with TELEMETRY_INTERVAL
+TELEMETRY_INTERVAL = float(os.getenv('TELEMETRY_INTERVAL', '2'))
+# Formatted values shown to users; subscribers are only notified when one of these changes
+DISPLAY_KEYS = ('cpu_usage', 'memory_usage', 'disk_usage', 'available_memory')
+
+# Seconds between process index refreshes; override with PROCESS_REFRESH_INTERVAL
+PROCESS_REFRESH_INTERVAL = float(os.getenv('PROCESS_REFRESH_INTERVAL', '5'))
+# Per-process usage older than this is re-sampled before answering a top-N query
+PROCESS_USAGE_MAX_AGE = 1.0
+# Columns top-N queries can rank by
+PROCESS_SORT_KEYS = ('cpu', 'memory', 'io', 'threads')
+# How a top-N answer is spoken for each sort key: (heading, format of one process's figure)
+PROCESS_SUMMARIES = {
+    'cpu': ("Using the most CPU", "{cpu_percent:.0f}%"),
+    'memory': ("Using the most memory", "{memory_mb:.0f} megabytes"),
+    'io': ("Reading and writing the most data", "{io_kb_per_s:.0f} kilobytes a second"),
+    'threads': ("Running the most threads", "{threads} threads"),
+}
+# Metrics kept in the telemetry history, as (column name, sample key)
+HISTORY_METRICS = (('cpu', 'cpu_percent'), ('memory', 'memory_percent'), ('disk', 'disk_percent'))
+# History tiers: (name, bucket seconds, rows kept); the raw tier keeps every sample
+HISTORY_TIERS = (('raw', 0, 3600), ('1m', 60, 1440), ('1h', 3600, 24 * 90))
+
+_pyautogui = None
+
+
+def _load_pyautogui():
+    """Import pyautogui on first use (slow, and it needs a display); None when unavailable"""
+    global _pyautogui
+    if _pyautogui is None:
+        try:
+            import pyautogui
+            _pyautogui = pyautogui
+        except Exception:
+            # KeyError can happen on headless systems (no DISPLAY)
+            _pyautogui = False
+    return _pyautogui or None
+
+
+class RollupRing:
+    """Fixed-capacity ring of rows: timestamp, count, then min/avg/max per metric
+
+    Storage is a single preallocated float64 NumPy array, so memory use is set
+    at construction and never grows. Rows are not kept in time order; queries
+    select by timestamp mask, which makes the wrap-around irrelevant.
+    """
+    
+    def __init__(self, capacity, metric_count):
+        self.capacity = capacity
+        self.metric_count = metric_count
+        self.rows = np.full((capacity, 2 + 3 * metric_count), np.nan)
+        self.size = 0
+        self._next = 0
+    
+    def append(self, timestamp, count, mins, avgs, maxs):
+        row = self.rows[self._next]
+        row[0] = timestamp
+        row[1] = count
+        row[2::3] = mins
+        row[3::3] = avgs
+        row[4::3] = maxs
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def oldest(self):
+        if self.size == 0:
+            return None
+        return np.nanmin(self.rows[:self.size, 0])
+    
+    def select(self, start, end):
+        """Rows with start <= timestamp < end"""
+        rows = self.rows[:self.size]
+        timestamps = rows[:, 0]
+        return rows[(timestamps >= start) & (timestamps < end)]
+
+class TelemetryHistory:
+    """Constant-memory metric history with raw, 1-minute and 1-hour rollups
+    
+    Every sample goes into the raw ring and into running min/sum/max
+    accumulators; when a sample crosses a bucket boundary the finished bucket
+    is written to that tier's ring. Range queries pick the finest tier that
+    still covers the start of the range and downsample it with vectorised
+    NumPy bucketing.
+    """
+    
+    def __init__(self, metrics=HISTORY_METRICS, tiers=HISTORY_TIERS):
+        self.metrics = metrics
+        self.tiers = []
+        for name, seconds, capacity in tiers:
+            self.tiers.append({
+                'name': name,
+                'seconds': seconds,
+                'ring': RollupRing(capacity, len(metrics)),
+                'bucket': None,
+                'acc': None,
+            })
+        self._lock = threading.Lock()
+    
+    def append(self, sample):
+        """Record one telemetry sample (a TelemetrySampler snapshot)"""
+        timestamp = sample['timestamp']
+        values = np.array([float(sample[key]) for _, key in self.metrics])
+        with self._lock:
+            for tier in self.tiers:
+                if tier['seconds'] == 0:
+                    tier['ring'].append(timestamp, 1, values, values, values)
+                    continue
+                bucket = timestamp - timestamp % tier['seconds']
+                if tier['bucket'] is not None and bucket != tier['bucket']:
+                    self._flush(tier)
+                if tier['acc'] is None:
+                    tier['bucket'] = bucket
+                    tier['acc'] = [0, np.zeros(len(values)), values.copy(), values.copy()]
+                acc = tier['acc']
+                acc[0] += 1
+                acc[1] += values
+                np.minimum(acc[2], values, out=acc[2])
+                np.maximum(acc[3], values, out=acc[3])
+    
+    def _flush(self, tier):
+        count, total, mins, maxs = tier['acc']
+        tier['ring'].append(tier['bucket'], count, mins, total / count, maxs)
+        tier['acc'] = None
+    
+    def query(self, start, end, step):
+        """Downsample [start, end) into buckets of `step` seconds
+        
+        Returns bucket start times plus min/avg/max series per metric; buckets
+        without data are left out.
+        """
+        with self._lock:
+            tier = self._pick_tier(start, step)
+            rows = tier['ring'].select(start, end)
+            # Include the bucket still being accumulated so recent data shows up
+            if tier['acc'] is not None and start <= tier['bucket'] < end:
+                count, total, mins, maxs = tier['acc']
+                pending = np.empty((1, rows.shape[1]))
+                pending[0, 0] = tier['bucket']
+                pending[0, 1] = count
+                pending[0, 2::3] = mins
+                pending[0, 3::3] = total / count
+                pending[0, 4::3] = maxs
+                rows = np.vstack([rows, pending])
+        
+        result = {'from': start, 'to': end, 'step': step, 'resolution': tier['name'], 'timestamps': []}
+        for name, _ in self.metrics:
+            result[name] = {'min': [], 'avg': [], 'max': []}
+        if len(rows) == 0:
+            return result
+        
+        buckets = ((rows[:, 0] - start) // step).astype(np.int64)
+        used, inverse = np.unique(buckets, return_inverse=True)
+        counts = rows[:, 1]
+        weight = np.bincount(inverse, weights=counts)
+        result['timestamps'] = (start + used * step).tolist()
+        for index, (name, _) in enumerate(self.metrics):
+            mins = np.full(len(used), np.inf)
+            maxs = np.full(len(used), -np.inf)
+            np.minimum.at(mins, inverse, rows[:, 2 + 3 * index])
+            np.maximum.at(maxs, inverse, rows[:, 4 + 3 * index])
+            avgs = np.bincount(inverse, weights=rows[:, 3 + 3 * index] * counts) / weight
+            result[name] = {
+                'min': np.round(mins, 2).tolist(),
+                'avg': np.round(avgs, 2).tolist(),
+                'max': np.round(maxs, 2).tolist(),
+            }
+        return result
+    
+    def _pick_tier(self, start, step):
+        """Finest tier that reaches back to `start`, preferring buckets no coarser than `step`
+        
+        A rollup floors its first bucket, so it can look older than the raw
+        samples by up to one bucket without holding any more data (e.g. on a
+        server up for less than an hour); only tiers that lost data beyond
+        that, or that do not reach `start`, are passed over.
+        """
+        filled = [tier for tier in self.tiers if tier['ring'].oldest() is not None]
+        if not filled:
+            return self.tiers[0]
+        first = min(filled, key=lambda tier: tier['ring'].oldest())
+        reach = max(start, first['ring'].oldest() + first['seconds'])
+        covering = [tier for tier in filled if tier['ring'].oldest() <= reach]
+        for tier in covering:
+            if tier['seconds'] <= step:
+                return tier
+        return covering[0]
+
+class ProcessIndex:
+    """Incrementally maintained table of running processes
+    
+    Holds pid -> record and a sorted list of lower-cased name keys (process
+    name, exe basename, both without extension, and the words of the name,
+    e.g. "calculator" for gnome-calculator and "edge" for msedge.exe) for
+    prefix lookups with bisect. A refresh diffs the current pid set against the known one and
+    only inspects new pids, so its cost follows process churn rather than the
+    total number of processes.
+    """
+    
+    def __init__(self, refresh_interval=PROCESS_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.records = {}
+        self._by_key = {}
+        self._keys = []
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {'refreshes': 0, 'added': 0, 'removed': 0, 'last_refresh_ms': None,
+                      'last_usage_sample_ms': None}
+        self._usage_sampled_at = None
+    
+    def start(self):
+        """Build the index once and keep it fresh on a background thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.refresh()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='process-index', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Process index refresh error: {e}")
+    
+    def refresh(self):
+        """Apply the difference between the live pid set and the indexed one"""
+        started = time.perf_counter()
+        live = set(psutil.pids())
+        with self._lock:
+            known = self.records.keys()
+            gone = known - live
+            new = live - known
+            for pid in gone:
+                self._remove(pid)
+            for pid in new:
+                self._add(pid)
+            self.stats['refreshes'] += 1
+            self.stats['added'] += len(new)
+            self.stats['removed'] += len(gone)
+            self.stats['last_refresh_ms'] = (time.perf_counter() - started) * 1000
+    
+    def _add(self, pid):
+        try:
+            process = psutil.Process(pid)
+            with process.oneshot():
+                name = process.name()
+                try:
+                    exe = process.exe()
+                except (psutil.AccessDenied, psutil.ZombieProcess, OSError):
+                    exe = ''
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        record = {'pid': pid, 'name': name, 'exe': exe, 'process': process}
+        record['keys'] = _process_keys(name, exe)
+        self.records[pid] = record
+        for key in record['keys']:
+            pids = self._by_key.get(key)
+            if pids is None:
+                self._by_key[key] = {pid}
+                bisect.insort(self._keys, key)
+            else:
+                pids.add(pid)
+    
+    def _remove(self, pid):
+        record = self.records.pop(pid, None)
+        if record is None:
+            return
+        for key in record['keys']:
+            pids = self._by_key.get(key)
+            if pids is None:
+                continue
+            pids.discard(pid)
+            if not pids:
+                del self._by_key[key]
+                index = bisect.bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    del self._keys[index]
+    
+    def find(self, prefix):
+        """Records whose name, executable or a word of either starts with `prefix` (case-insensitive)
+        
+        Falls back to a substring scan of the keys when nothing starts with it.
+        """
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        with self._lock:
+            pids = set()
+            index = bisect.bisect_left(self._keys, prefix)
+            while index < len(self._keys) and self._keys[index].startswith(prefix):
+                pids.update(self._by_key[self._keys[index]])
+                index += 1
+            if not pids:
+                for key in self._keys:
+                    if prefix in key:
+                        pids.update(self._by_key[key])
+            return [self.records[pid] for pid in sorted(pids)]
+    
+    def all(self):
+        with self._lock:
+            return list(self.records.values())
+    
+    def sample_usage(self):
+        """Read CPU, memory, IO and thread counts for every indexed process
+        
+        cpu_percent(None) measures since the previous call on the same Process
+        object, so the first call only primes the counters: the first sample
+        ever taken does a short second phase to get real values.
+        """
+        with self._lock:
+            first = self._usage_sampled_at is None
+            self._read_usage()
+            if first:
+                time.sleep(0.2)
+                self._read_usage()
+    
+    def _read_usage(self):
+        started = time.perf_counter()
+        for record in list(self.records.values()):
+            process = record['process']
+            try:
+                with process.oneshot():
+                    cpu = process.cpu_percent(None)
+                    memory = process.memory_info().rss
+                    threads = process.num_threads()
+                    try:
+                        io = process.io_counters()
+                        io_bytes = io.read_bytes + io.write_bytes
+                    except (AttributeError, psutil.AccessDenied, NotImplementedError):
+                        io_bytes = None
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                continue
+            except psutil.AccessDenied:
+                record['usage'] = None
+                continue
+            previous = record.get('usage')
+            io_rate = 0.0
+            if io_bytes is not None and previous and previous['io_bytes'] is not None:
+                elapsed = started - previous['sampled_at']
+                if elapsed > 0:
+                    io_rate = max(0.0, (io_bytes - previous['io_bytes']) / elapsed)
+            record['usage'] = {
+                'cpu': cpu, 'memory': memory, 'threads': threads,
+                'io': io_rate, 'io_bytes': io_bytes, 'sampled_at': started,
+            }
+        self._usage_sampled_at = time.perf_counter()
+        self.stats['last_usage_sample_ms'] = (self._usage_sampled_at - started) * 1000
+    
+    def top(self, sort='cpu', n=10, max_age=PROCESS_USAGE_MAX_AGE):
+        """The n heaviest processes by `sort`, selected with a heap instead of a full sort"""
+        with self._lock:
+            if self._usage_sampled_at is None or time.perf_counter() - self._usage_sampled_at > max_age:
+                self.refresh()
+                self.sample_usage()
+            sampled = [record for record in self.records.values() if record.get('usage')]
+            return heapq.nlargest(n, sampled, key=lambda record: record['usage'][sort])
+
+def _process_keys(name, exe):
+    keys = set()
+    for value in (name, os.path.basename(exe) if exe else ''):
+        value = value.lower()
+        if value:
+            stem = os.path.splitext(value)[0]
+            keys.add(value)
+            keys.add(stem)
+            for word in re.split(r'[-_.\s]+', stem):
+                keys.add(word)
+                # Windows ships msedge.exe, mspaint.exe, ...
+                if word.startswith('ms') and len(word) > 4:
+                    keys.add(word[2:])
+            keys.discard('')
+    return keys
+
+class TelemetrySampler:
+    """Samples CPU, memory and disk on one background thread into a shared snapshot
+
+    Readers get the latest snapshot without touching psutil, so nothing on a
+    request path or UI thread ever waits for a CPU measurement window.
+    Subscribers are called (from the sampler thread) whenever the values change.
+    """
+    
+    def __init__(self, interval=TELEMETRY_INTERVAL, disk_path=None, history=None):
+        self.interval = interval
+        self.disk_path = disk_path or os.path.abspath(os.sep)
+        self.history = history
+        self._snapshot = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Take a first sample and start the background thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # cpu_percent measures since the previous call, so the first reading
+            # needs a short window of its own; later samples are non-blocking
+            self._snapshot = self._sample(cpu_interval=0.1)
+            if self.history is not None:
+                self.history.append(self._snapshot)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._thread = None
+    
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+    
+    def snapshot(self):
+        """Latest sample; starts the sampler on first use"""
+        if self._thread is None:
+            self.start()
+        return dict(self._snapshot)
+    
+    def _sample(self, cpu_interval=None):
+        cpu_percent = psutil.cpu_percent(interval=cpu_interval)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        return {
+            'cpu_usage': f"{cpu_percent}%",
+            'memory_usage': f"{memory.percent}%",
+            'disk_usage': f"{disk.percent}%",
+            'available_memory': f"{memory.available / (1024**3):.2f} GB",
+            'cpu_percent': cpu_percent,
+            'memory_percent': memory.percent,
+            'disk_percent': disk.percent,
+            'available_memory_bytes': memory.available,
+            'timestamp': time.time(),
+        }
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                sample = self._sample()
+            except Exception as e:
+                print(f"Telemetry sampling error: {e}")
+                continue
+            previous = self._snapshot
+            self._snapshot = sample
+            if self.history is not None:
+                self.history.append(sample)
+            if previous is None or any(sample[key] != previous[key] for key in DISPLAY_KEYS):
+                for callback in list(self._subscribers):
+                    try:
+                        callback(dict(sample))
+                    except Exception as e:
+                        print(f"Telemetry subscriber error: {e}")
 
 class SystemController:
     """Handles all system-level operations for the voice assistant"""
@@ -42,6 +504,13 @@ class SystemController:
         # Operations that require confirmation
         self.critical_operations = ['delete', 'shutdown', 'restart', 'format', 'remove']
         
+        # Shared background sampler behind get_system_info, recording into a fixed-size history
+        self.telemetry_history = TelemetryHistory()
+        self.telemetry = TelemetrySampler(history=self.telemetry_history)
+        
+        # Process table shared by close_application and process queries (built on first use)
+        self.processes = ProcessIndex()
+        
     def open_application(self, app_name):
         """Open an application by name"""
         try:
@@ -130,6 +599,7 @@ class SystemController:
     def take_screenshot(self, filename=None):
         """Take a screenshot"""
         try:
+            pyautogui = _load_pyautogui()
             if not pyautogui:
                 return "Screenshot not available (headless environment)"
                 
@@ -172,28 +642,61 @@ class SystemController:
             return f"Could not unmute volume: {str(e)}"
     
     def get_running_processes(self):
-        """Get list of running processes"""
+        """Get list of running processes (the 10 using the most CPU)"""
         try:
-            processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent']):
-                try:
-                    processes.append(proc.info)
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
-            return processes[:10]  # Return top 10 processes
+            return [{'pid': p['pid'], 'name': p['name'], 'cpu_percent': p['cpu_percent']}
+                    for p in self.get_top_processes('cpu', 10)]
         except Exception as e:
             return f"Could not get processes: {str(e)}"
     
+    def get_top_processes(self, sort='cpu', n=10):
+        """Top resource consumers, e.g. get_top_processes('memory', 5)"""
+        if sort not in PROCESS_SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(PROCESS_SORT_KEYS)}")
+        self.processes.start()
+        cpu_count = psutil.cpu_count() or 1
+        top = []
+        for record in self.processes.top(sort, n):
+            usage = record['usage']
+            top.append({
+                'pid': record['pid'],
+                'name': record['name'],
+                'cpu_percent': round(usage['cpu'], 1),
+                # cpu_percent is per core; also give the share of the whole machine
+                'cpu_share': round(usage['cpu'] / cpu_count, 1),
+                'memory_mb': round(usage['memory'] / (1024**2), 1),
+                'io_kb_per_s': round(usage['io'] / 1024, 1),
+                'threads': usage['threads'],
+            })
+        return top
+    
+    def describe_top_processes(self, sort='cpu', n=3):
+        """Spoken summary of the top consumers"""
+        try:
+            top = self.get_top_processes(sort, n)
+            if not top:
+                return "I couldn't read any process usage"
+            heading, figure = PROCESS_SUMMARIES[sort]
+            parts = [f"{p['name']} {figure.format(**p)}" for p in top]
+            return f"{heading}: " + ", ".join(parts)
+        except Exception as e:
+            return f"Could not get top processes: {str(e)}"
+    
     def close_application(self, app_name):
         """Close an application by name"""
         try:
             app_name = app_name.lower()
             closed = False
-            for proc in psutil.process_iter(['pid', 'name']):
+            self.processes.start()
+            matches = self.processes.find(app_name)
+            if not matches:
+                # The app may have started since the last background refresh
+                self.processes.refresh()
+                matches = self.processes.find(app_name)
+            for record in matches:
                 try:
-                    if app_name in proc.info['name'].lower():
-                        proc.terminate()
-                        closed = True
+                    record['process'].terminate()
+                    closed = True
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     pass
             
@@ -205,22 +708,17 @@ class SystemController:
             return f"Could not close application: {str(e)}"
     
     def get_system_info(self):
-        """Get system information"""
+        """Get system information (latest background sample, never blocks on psutil)"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            info = {
-                'cpu_usage': f"{cpu_percent}%",
-                'memory_usage': f"{memory.percent}%",
-                'disk_usage': f"{disk.percent}%",
-                'available_memory': f"{memory.available / (1024**3):.2f} GB"
-            }
-            return info
+            return self.telemetry.snapshot()
         except Exception as e:
             return f"Could not get system info: {str(e)}"
     
+    def get_system_history(self, start, end, step):
+        """Downsampled CPU/memory/disk history between two epoch times"""
+        self.telemetry.start()
+        return self.telemetry_history.query(start, end, step)
+    
     def shutdown_system(self):
         """Shutdown the system"""
         try:
@@ -0,0 +1,197 @@
+import itertools
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+import metrics
+
+# A sentence ends at . ! or ? followed by whitespace, or at a line break
+_SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+
+_END = object()
+
+
+class Utterance:
+    """One spoken response, fed incrementally and spoken sentence by sentence"""
+
+    def __init__(self, pipeline, utterance_id, started):
+        self.id = utterance_id
+        self.started = started
+        self.first_audio_at = None
+        self.finished_at = None
+        self.sentences = 0
+        # Set when cancel() dropped some of its sentences; later text is dropped too
+        self.cancelled = False
+        self.done = threading.Event()
+        self._pipeline = pipeline
+        self._buffer = ''
+        self._closed = False
+
+    def feed(self, text):
+        """Add text; every complete sentence is queued for playback immediately"""
+        if self._closed or not text:
+            return
+        self._buffer += text
+        parts = _SENTENCE_BOUNDARY_RE.split(self._buffer)
+        self._buffer = parts.pop()
+        for sentence in parts:
+            self._queue_sentence(sentence)
+
+    def end(self):
+        """Flush any trailing partial sentence and mark the utterance complete"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue_sentence(self._buffer)
+        self._buffer = ''
+        self._pipeline._queue.put((self, _END))
+
+    def wait(self, timeout=None):
+        """Block until the utterance has been spoken or cancelled; False on timeout"""
+        return self.done.wait(timeout)
+
+    def _queue_sentence(self, sentence):
+        sentence = sentence.strip()
+        if sentence and not self.cancelled:
+            self.sentences += 1
+            self._pipeline._queue.put((self, sentence))
+
+    @property
+    def first_audio_ms(self):
+        if self.first_audio_at is None:
+            return None
+        return (self.first_audio_at - self.started) * 1000
+
+
+class SpeechPipeline:
+    """Text-to-speech stage that overlaps text generation with playback
+
+    Text is fed in as it is produced and split at sentence boundaries; a single
+    worker thread owns the TTS engine and speaks each sentence as soon as it is
+    queued, so callers never block on playback. The engine is created on the
+    worker thread by `engine_factory`, as some drivers require; `ready` is set
+    once that has happened. Without `autostart` the thread, and the engine,
+    wait for `start` or the first utterance.
+    """
+
+    def __init__(self, engine_factory, history=50, autostart=True):
+        self._engine_factory = engine_factory
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        # Recent (start, end) playback spans, used to discard audio we captured of ourselves
+        self._playback = deque(maxlen=32)
+        self._speaking_since = None
+        # Set once the engine has been created, or has failed to be (see engine_error)
+        self.ready = threading.Event()
+        self.engine_error = None
+        self._thread = threading.Thread(target=self._run, name='tts', daemon=True)
+        if autostart:
+            self.start()
+
+    def start(self):
+        """Start the speech thread (and so create the engine); later calls do nothing"""
+        with self._lock:
+            if self._thread.ident is None:
+                self._thread.start()
+
+    def begin(self, started=None):
+        """Start a new utterance; `started` (perf_counter) defaults to now"""
+        self.start()
+        return Utterance(self, next(self._ids), started if started is not None else time.perf_counter())
+
+    def say(self, text, started=None):
+        """Queue a complete piece of text and return without waiting for playback"""
+        utterance = self.begin(started)
+        utterance.feed(text)
+        utterance.end()
+        return utterance
+
+    def wait(self):
+        """Block until everything queued so far has been spoken"""
+        self._queue.join()
+
+    def cancel(self):
+        """Drop every sentence that has not started playing yet
+
+        End markers are queued again, so cancelled utterances still finish:
+        they reach the history and metrics and their waiters return.
+        """
+        ends = []
+        try:
+            while True:
+                utterance, item = self._queue.get_nowait()
+                if item is _END:
+                    ends.append((utterance, item))
+                else:
+                    utterance.cancelled = True
+                self._queue.task_done()
+        except queue.Empty:
+            pass
+        for end in ends:
+            self._queue.put(end)
+
+    def _run(self):
+        try:
+            engine = self._engine_factory()
+        except Exception as e:
+            print(f"Warning: TTS engine could not be initialized ({e}). Voice output disabled.")
+            self.engine_error = str(e)
+            engine = None
+        self.ready.set()
+
+        while True:
+            utterance, item = self._queue.get()
+            try:
+                if item is _END:
+                    utterance.finished_at = time.perf_counter()
+                    with self._lock:
+                        self._history.append(utterance)
+                    utterance.done.set()
+                    continue
+                if utterance.first_audio_at is None:
+                    utterance.first_audio_at = time.perf_counter()
+                if engine is None:
+                    print(f"[TTS Placeholder]: {item}")
+                    continue
+                self._speaking_since = time.perf_counter()
+                try:
+                    with metrics.stage('tts'):
+                        engine.say(item)
+                        engine.runAndWait()
+                except Exception as e:
+                    print(f"TTS Error: {e}")
+                finally:
+                    self._playback.append((self._speaking_since, time.perf_counter()))
+                    self._speaking_since = None
+            finally:
+                self._queue.task_done()
+
+    @property
+    def is_speaking(self):
+        return self._speaking_since is not None
+
+    def overlaps(self, start, end):
+        """True if audio was being played at any point between two perf_counter times"""
+        speaking_since = self._speaking_since
+        if speaking_since is not None and speaking_since < end:
+            return True
+        return any(played_from < end and played_to > start for played_from, played_to in list(self._playback))
+
+    def get_metrics(self):
+        """Time-to-first-audio and playback figures for recent utterances"""
+        with self._lock:
+            recent = list(self._history)
+        first_audio = [u.first_audio_ms for u in recent if u.first_audio_ms is not None]
+        last = recent[-1] if recent else None
+        return {
+            'queue_depth': self._queue.qsize(),
+            'utterances': len(recent),
+            'cancelled': sum(1 for u in recent if u.cancelled),
+            'last_first_audio_ms': last.first_audio_ms if last else None,
+            'avg_first_audio_ms': sum(first_audio) / len(first_audio) if first_audio else None,
+            'last_total_ms': (last.finished_at - last.started) * 1000 if last else None,
+        }
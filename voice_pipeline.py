@@ -0,0 +1,200 @@
+import itertools
+import queue
+import threading
+import time
+
+# How often idle workers wake up to check whether the pipeline was stopped
+_POLL_INTERVAL = 0.1
+
+
+class Job:
+    """An item moving through the pipeline, numbered in capture order"""
+
+    def __init__(self, seq, payload):
+        self.seq = seq
+        self.payload = payload
+        self.created = time.perf_counter()
+        self.timings = {}
+
+
+class Stage:
+    """One pipeline stage: a bounded input queue drained by a dedicated worker"""
+
+    def __init__(self, name, handler, maxsize=4):
+        self.name = name
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=maxsize) if maxsize is not None else None
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = None
+
+    def record(self, elapsed_ms):
+        self.processed += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.last_ms = elapsed_ms
+
+    def get_metrics(self):
+        return {
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'queue_size': self.queue.maxsize if self.queue is not None else 0,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'avg_ms': self.total_ms / self.processed if self.processed else None,
+            'max_ms': self.max_ms,
+            'last_ms': self.last_ms,
+        }
+
+
+class StagePipeline:
+    """Runs capture -> ... -> final stage concurrently over bounded queues
+
+    The first stage is a source: its handler is called repeatedly with no input
+    and returns a payload (or None when nothing was captured). Every other stage
+    receives the previous stage's output and returns its own, or None to end
+    the job there. Each stage has exactly one worker and FIFO queues, so jobs
+    leave every stage in capture order. Intermediate stages block when the next
+    queue is full (back-pressure); the source never blocks for longer than
+    `source_put_timeout` and drops the capture instead, so it keeps listening.
+    """
+
+    def __init__(self, name='voice', on_error=None, source_put_timeout=0.5):
+        self.name = name
+        self.on_error = on_error
+        self.source_put_timeout = source_put_timeout
+        self.stages = []
+        self._seq = itertools.count(1)
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._end_to_end_total = 0.0
+        self._end_to_end_last = None
+
+    def add_source(self, name, handler):
+        self.stages.insert(0, Stage(name, handler, maxsize=None))
+        return self
+
+    def add_stage(self, name, handler, maxsize=4):
+        self.stages.append(Stage(name, handler, maxsize))
+        return self
+
+    @property
+    def running(self):
+        return bool(self._threads) and not self._stop.is_set()
+
+    def start(self):
+        # A fresh event per run, so workers of a previous run that are still
+        # finishing a blocking call cannot be revived by a restart
+        self._stop = stop = threading.Event()
+        self._threads = []
+        for index, stage in enumerate(self.stages):
+            target = self._run_source if index == 0 else self._run_stage
+            thread = threading.Thread(
+                target=target, args=(index, stop), name=f'{self.name}-{stage.name}', daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def stop(self, drain=False):
+        """Stop all workers; safe to call from inside a stage handler"""
+        self._stop.set()
+        if drain:
+            return
+        for stage in self.stages[1:]:
+            try:
+                while True:
+                    stage.queue.get_nowait()
+                    stage.dropped += 1
+            except queue.Empty:
+                pass
+
+    def _run_source(self, index, stop):
+        stage = self.stages[index]
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                payload = stage.handler(None)
+            except Exception as e:
+                stage.errors += 1
+                self._report(stage, None, e)
+                continue
+            if payload is None:
+                continue
+            job = Job(next(self._seq), payload)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            job.timings[stage.name] = elapsed_ms
+            stage.record(elapsed_ms)
+            self._forward(index, job, stop, timeout=self.source_put_timeout)
+
+    def _run_stage(self, index, stop):
+        stage = self.stages[index]
+        while not stop.is_set():
+            try:
+                job = stage.queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            started = time.perf_counter()
+            try:
+                output = stage.handler(job.payload)
+            except Exception as e:
+                stage.errors += 1
+                self._report(stage, job, e)
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            job.timings[stage.name] = elapsed_ms
+            stage.record(elapsed_ms)
+            if output is None or index == len(self.stages) - 1:
+                self._complete(job)
+                continue
+            job.payload = output
+            self._forward(index, job, stop)
+
+    def _forward(self, index, job, stop, timeout=None):
+        """Hand a job to the next stage, waiting while its queue is full"""
+        target = self.stages[index + 1]
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        while not stop.is_set():
+            try:
+                target.queue.put(job, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    target.dropped += 1
+                    return False
+        return False
+
+    def _complete(self, job):
+        elapsed_ms = (time.perf_counter() - job.created) * 1000
+        with self._lock:
+            self._completed += 1
+            self._end_to_end_total += elapsed_ms
+            self._end_to_end_last = elapsed_ms
+
+    def _report(self, stage, job, error):
+        if self.on_error is not None:
+            try:
+                self.on_error(stage.name, job, error)
+            except Exception as e:
+                print(f"Pipeline error handler failed: {e}")
+        else:
+            print(f"Pipeline stage '{stage.name}' error: {error}")
+
+    def get_metrics(self):
+        """Per-stage queue depth and latency plus end-to-end figures"""
+        with self._lock:
+            completed = self._completed
+            end_to_end = {
+                'completed': completed,
+                'avg_ms': self._end_to_end_total / completed if completed else None,
+                'last_ms': self._end_to_end_last,
+            }
+        return {
+            'running': self.running,
+            'stages': {stage.name: stage.get_metrics() for stage in self.stages},
+            'end_to_end': end_to_end,
+        }